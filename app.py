@@ -1,556 +1,166 @@
+import functools
+import threading
+
+import altair as alt
 import streamlit as st
 from datetime import date, datetime
-from io import BytesIO
-from statistics import mean
-
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-
-try:
-    from PIL import Image
-except Exception:
-    Image = None
-
-
-AGENCE = "LA PRIORITE IMMOBILIERE"
-EMAIL = "sbelhmira@gmail.com"
-LOGO_PATH = "assets/logo.png"
-
-
-# -----------------------------
-# Helpers
-# -----------------------------
-def euro(x: float) -> str:
-    s = f"{x:,.0f}".replace(",", " ")
-    return f"{s} €"
 
-
-def safe_text(x: str, max_len: int = 120) -> str:
-    return (x or "").strip()[:max_len]
-
-
-def draw_header(c: canvas.Canvas, title: str, subtitle: str):
-    w, h = A4
-    try:
-        if Image is not None:
-            img = Image.open(LOGO_PATH)
-            c.drawImage(ImageReader(img), 40, h - 120, width=140, height=80, mask="auto")
-    except Exception:
-        pass
-
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(200, h - 55, title)
-    c.setFont("Helvetica", 10)
-    c.drawString(200, h - 72, AGENCE)
-    c.drawString(200, h - 86, f"Contact: {EMAIL}")
-    c.drawString(200, h - 100, f"Date: {date.today().strftime('%d/%m/%Y')}")
-    c.setFont("Helvetica-Oblique", 9)
-    c.drawString(200, h - 114, subtitle)
-    c.line(40, h - 130, w - 40, h - 130)
-
-
-# -----------------------------
-# Defaults (référentiel + paramètres)
-# -----------------------------
-DEFAULT_ZONES = [
-    {"zone": "Namur - Centre", "type": "Maison", "base_eur_m2": 2150, "terrain_eur_m2": 20, "commerce_eur_m2": 0},
-    {"zone": "Namur - Centre", "type": "Appartement", "base_eur_m2": 2350, "terrain_eur_m2": 0, "commerce_eur_m2": 0},
-    {"zone": "Charleroi", "type": "Maison", "base_eur_m2": 1550, "terrain_eur_m2": 12, "commerce_eur_m2": 0},
-    {"zone": "Charleroi", "type": "Appartement", "base_eur_m2": 1700, "terrain_eur_m2": 0, "commerce_eur_m2": 0},
-    {"zone": "Liege - Axe commercial", "type": "Commerce", "base_eur_m2": 0, "terrain_eur_m2": 0, "commerce_eur_m2": 2400},
-]
-
-DEFAULT_PARAMS = {
-    # Dégressivité surface
-    "seuil_degressif_m2": 160,
-    "degressif_pct": 0.06,
-
-    # Fourchette "neutre" (sera modulée par l'indice)
-    "fourchette_neutre_pct": 0.06,
-
-    # Toiture (forfait + option grenier)
-    "toit_forfait_sans_grenier": 18000,
-    "toit_base_avec_grenier": 10000,
-    "toit_eur_m2_grenier": 130,
-    "toit_impact_factor": 0.70,
-    "toit_etat_moyen_coeff": 0.50,
-
-    # Chauffage (impacts)
-    "chauff_pac": 8000,
-    "chauff_gaz_cond": 3000,
-    "chauff_mazout": -5000,
-    "chauff_electrique": -8000,
-    "chauff_ancien": -10000,
-
-    # Cuisine (impacts)
-    "cuisine_bonne": 0,
-    "cuisine_moderniser": -5000,
-    "cuisine_remplacer": -12000,
-
-    # Salle de bain état (impacts)
-    "sdb_bonne": 0,
-    "sdb_moderniser": -4000,
-    "sdb_remplacer": -9000,
-
-    # Châssis / vitrages (impacts)
-    "vitrage_simple": -8000,
-    "vitrage_double_ancien": -3000,
-    "vitrage_double_recent": 0,
-    "vitrage_triple": 4000,
-
-    # PEB (impacts)
-    "peb_A": 6000,
-    "peb_B": 3000,
-    "peb_C": 0,
-    "peb_D": -3000,
-    "peb_E": -6000,
-    "peb_F": -9000,
-    "peb_G": -12000,
-
-    # Chambres
-    "impact_par_chambre": 8000,
-
-    # Nombre de salles de bain (référence 1)
-    "impact_par_sdb_supp": 6000,
-
-    # Étage appartement (étage + ascenseur)
-    "etage_avec_ascenseur_bonus": 4000,
-    "etage_sans_ascenseur_malus_par_niveau": -2500,
-    "etage_rdc_malus": 0,
-
-    # Parking / Garage
-    "impact_par_place_parking": 8000,
-    "impact_garage": 15000,
-
-    # Balcon / Terrasse
-    "impact_balcon": 5000,
-    "impact_terrasse": 10000,
-
-    # Jardin / Cave
-    "impact_jardin": 12000,
-    "impact_cave": 4000,
-
-    # Grenier aménageable (surface)
-    "grenier_amenageable_base": 5000,
-    "grenier_amenageable_eur_m2": 120,
-
-    # Coefficient expert
-    "coef_expert_min": -3.0,
-    "coef_expert_max": 3.0,
-}
+from calibration import PARAMS_CALIBRABLES, REGULARISATION_DEFAUT, Calibrateur, evaluer
+from calculs import (
+    CHAUFFAGE_TYPES,
+    ETATS_PIECE,
+    PEB_LETTRES,
+    TOITURE_ETATS,
+    TYPES_BIEN,
+    VITRAGE_TYPES,
+    build_record,
+    calc_marche_memo,
+    cles_surcharges,
+    dependances,
+    euro,
+    safe_text,
+    valoriser,
+)
+from comparables import POIDS_DEFAUT, IndexComparables
+from historique import COLONNES_TRI, HistoriqueSQLite, parse_prix
+from incertitude import simuler
+from precision import DIMENSIONS, AgregatsPrecision
+from profilage import JOURNAL_DEFAUT, Profileur, etape
+from rapport import empreinte_rapport, rapport_pdf
+from referentiel import DepotReferentiel, surcharges
+from renovation import COUTS_DEFAUT, POSTES, optimiser
+from revalorisation import synchroniser
+from sensibilite import ECART_ABSOLU, balayer, grille, plage, tornado
 
 
 # -----------------------------
-# Calculs
+# Streamlit UI
 # -----------------------------
-def apply_degressivity(base_eur_m2: float, surface: float, params: dict) -> float:
-    if surface > float(params["seuil_degressif_m2"]):
-        return base_eur_m2 * (1.0 - float(params["degressif_pct"]))
-    return base_eur_m2
-
-
-def calc_marche(zone_row: dict, bien: dict, params: dict) -> dict:
-    base_m2 = apply_degressivity(float(zone_row["base_eur_m2"]), float(bien["surface"]), params)
-    valeur_batie = float(bien["surface"]) * base_m2
-
-    valeur_terrain = 0.0
-    if bien["type"] == "Maison":
-        valeur_terrain = float(bien["terrain"]) * float(zone_row["terrain_eur_m2"])
-
-    # Commerce : si base_eur_m2 = 0, on prend commerce_eur_m2
-    if bien["type"] == "Commerce" and float(zone_row.get("base_eur_m2", 0)) == 0:
-        base_m2 = float(zone_row.get("commerce_eur_m2", 0))
-        valeur_batie = float(bien["surface"]) * base_m2
-
-    valeur_marche = valeur_batie + valeur_terrain
-    return {
-        "base_eur_m2": base_m2,
-        "valeur_batie": valeur_batie,
-        "valeur_terrain": valeur_terrain,
-        "valeur_marche": valeur_marche
-    }
-
-
-def calc_toiture_impact(bien: dict, params: dict) -> float:
-    etat = bien["toiture_etat"]
-    if etat == "Parfaite":
-        return 0.0
-
-    has_grenier = bool(bien["toiture_grenier"])
-    if not has_grenier:
-        calc = float(params["toit_forfait_sans_grenier"])
-    else:
-        surf = float(bien["toiture_surface_grenier"])
-        calc = float(params["toit_base_avec_grenier"]) + surf * float(params["toit_eur_m2_grenier"])
-
-    if etat == "Moyenne":
-        calc = calc * float(params["toit_etat_moyen_coeff"])
-
-    impact = calc * float(params["toit_impact_factor"])
-    return -abs(impact)
+st.set_page_config(page_title="Estimateur Expert - La Priorite Immobiliere", layout="wide")
+st.title("Estimateur Expert - La Priorite Immobiliere (outil interne)")
 
+# Faux a la fin du script : les fragments savent ainsi s'ils tournent seuls (rerun partiel)
+rerun_complet = True
 
-def calc_chauffage_impact(bien: dict, params: dict) -> float:
-    mapping = {
-        "Pompe a chaleur": float(params["chauff_pac"]),
-        "Gaz condensation": float(params["chauff_gaz_cond"]),
-        "Mazout": float(params["chauff_mazout"]),
-        "Electrique": float(params["chauff_electrique"]),
-        "Ancien systeme / poele seul": float(params["chauff_ancien"]),
-    }
-    return float(mapping.get(bien["chauffage_type"], 0.0))
+# Profilage des reruns (debug) : actif tant que la case de la barre laterale est cochee
+if st.session_state.get("profilage"):
+    if "profileur" not in st.session_state:
+        st.session_state["profileur"] = Profileur(journal=JOURNAL_DEFAUT)
+    st.session_state["profileur"].demarrer()
 
 
-def calc_cuisine_impact(bien: dict, params: dict) -> float:
-    mapping = {
-        "Bonne": float(params["cuisine_bonne"]),
-        "A moderniser": float(params["cuisine_moderniser"]),
-        "A remplacer": float(params["cuisine_remplacer"]),
-    }
-    return float(mapping.get(bien["cuisine_etat"], 0.0))
+@st.cache_resource
+def _historique() -> HistoriqueSQLite:
+    return HistoriqueSQLite()
 
 
-def calc_sdb_etat_impact(bien: dict, params: dict) -> float:
-    mapping = {
-        "Bonne": float(params["sdb_bonne"]),
-        "A moderniser": float(params["sdb_moderniser"]),
-        "A remplacer": float(params["sdb_remplacer"]),
-    }
-    return float(mapping.get(bien["sdb_etat"], 0.0))
+historique = _historique()
 
 
-def calc_vitrage_impact(bien: dict, params: dict) -> float:
-    mapping = {
-        "Simple": float(params["vitrage_simple"]),
-        "Double ancien": float(params["vitrage_double_ancien"]),
-        "Double recent": float(params["vitrage_double_recent"]),
-        "Triple": float(params["vitrage_triple"]),
-    }
-    return float(mapping.get(bien["vitrage_type"], 0.0))
-
-
-def calc_peb_impact(bien: dict, params: dict) -> float:
-    l = (bien.get("peb_lettre") or "C").strip().upper()
-    mapping = {
-        "A": float(params["peb_A"]),
-        "B": float(params["peb_B"]),
-        "C": float(params["peb_C"]),
-        "D": float(params["peb_D"]),
-        "E": float(params["peb_E"]),
-        "F": float(params["peb_F"]),
-        "G": float(params["peb_G"]),
-    }
-    return float(mapping.get(l, 0.0))
+@st.cache_resource
+def _depot() -> DepotReferentiel:
+    """Referentiel et parametres publies : une copie par processus, rechargee quand le fichier change."""
+    return DepotReferentiel()
 
 
-def calc_chambres_impact(bien: dict, params: dict) -> float:
-    if bien["type"] == "Commerce":
-        return 0.0
-    ref = 3 if bien["type"] == "Maison" else 2
-    nb = int(bien.get("nb_chambres", ref))
-    delta = nb - ref
-    return float(delta) * float(params["impact_par_chambre"])
+# Chaque session ne garde qu'un pointeur de version et ses modifications privees
+depot = _depot()
+version = depot.actuelle()
+if st.session_state.get("version_referentiel") not in (None, version.numero):
+    st.toast(f"Referentiel mis a jour (version {version.numero}).")
+st.session_state["version_referentiel"] = version.numero
 
 
-def calc_sdb_count_impact(bien: dict, params: dict) -> float:
-    ref = 1
-    nb = int(bien.get("nb_sdb", ref))
-    delta = nb - ref
-    return float(delta) * float(params["impact_par_sdb_supp"])
+@st.cache_resource
+def _synchronisation() -> dict:
+    """Derniere version du referentiel (objet recharge) appliquee a l'historique par ce processus, et son verrou."""
+    return {"version": None, "verrou": threading.Lock()}
 
 
-def calc_etage_appart_impact(bien: dict, params: dict) -> float:
-    # Uniquement pour appartement
-    if bien["type"] != "Appartement":
-        return 0.0
+@st.cache_resource
+def _precision() -> AgregatsPrecision:
+    """Agregats de precision des ventes (partages entre sessions), tenus a jour vente par vente."""
+    agregats = AgregatsPrecision()
+    agregats.ajouter_ventes(historique.colonnes(vendu=True))
+    return agregats
 
-    etage = int(bien.get("etage", 0))
-    asc = bool(bien.get("ascenseur", False))
 
-    if etage == 0:
-        return float(params["etage_rdc_malus"])
+# Nouvelle version : seules les estimations qui en dependent sont revalorisees
+synchronisation = _synchronisation()
+nb_revalorisees = 0
+with synchronisation["verrou"]:
+    # Une seule session du processus synchronise ; synchroniser ecarte aussi les autres processus
+    if synchronisation["version"] is not version:
+        nb_revalorisees = synchroniser(historique, version)
+        synchronisation["version"] = version
+if nb_revalorisees:
+    # Valeurs finales / fourchettes changees : agregats reconstruits au prochain affichage
+    _precision.clear()
+    st.toast(f"{nb_revalorisees} estimation(s) de l'historique revalorisee(s).")
 
-    if asc:
-        return float(params["etage_avec_ascenseur_bonus"])
+params_prives = st.session_state.setdefault("params_prives", {})
+lignes_privees = st.session_state.setdefault("lignes_privees", [])
 
-    return float(params["etage_sans_ascenseur_malus_par_niveau"]) * float(etage)
 
+@st.cache_resource
+def _index_comparables() -> tuple:
+    """(verrou, {"index": index des ventes comparables}), partages entre sessions.
 
-def calc_parking_garage_impact(bien: dict, params: dict) -> float:
-    nb = int(bien.get("nb_places_parking", 0))
-    impact = nb * float(params["impact_par_place_parking"])
-    if bool(bien.get("garage", False)):
-        impact += float(params["impact_garage"])
-    return float(impact)
+    Un seul index pour l'historique : les poids d'une session sont appliques
+    par ``reponderer`` au moment de la recherche, sous le verrou.
+    """
+    return threading.Lock(), {"index": None}
 
 
-def calc_balcon_terrasse_impact(bien: dict, params: dict) -> float:
-    impact = 0.0
-    if bool(bien.get("balcon", False)):
-        impact += float(params["impact_balcon"])
-    if bool(bien.get("terrasse", False)):
-        impact += float(params["impact_terrasse"])
-    return float(impact)
+def chercher_comparables(poids: dict, caracteristiques: dict, k: int) -> list:
+    verrou, etat = _index_comparables()
+    with verrou:
+        index = etat["index"]
+        if index is None:
+            index = etat["index"] = IndexComparables(historique.lister(vendu=True), poids)
+        elif index.poids != {**POIDS_DEFAUT, **poids}:
+            index.reponderer(poids)
+        return index.chercher(caracteristiques, k)
 
 
-def calc_jardin_cave_grenier_impact(bien: dict, params: dict) -> float:
-    impact = 0.0
-    if bool(bien.get("jardin", False)):
-        impact += float(params["impact_jardin"])
-    if bool(bien.get("cave", False)):
-        impact += float(params["impact_cave"])
-    if bool(bien.get("grenier_amenageable", False)):
-        s = float(bien.get("grenier_amenageable_surface_m2", 0.0))
-        impact += float(params["grenier_amenageable_base"]) + s * float(params["grenier_amenageable_eur_m2"])
-    return float(impact)
+def ajouter_vente_comparables(vente: dict):
+    """Reporte une vente (nouvelle, corrigee ou retiree) dans l'index s'il est construit."""
+    verrou, etat = _index_comparables()
+    with verrou:
+        if etat["index"] is not None:
+            etat["index"].ajouter([vente])
 
 
-def calc_indice(bien: dict) -> float:
-    # Indice /10 basé sur : toiture, chauffage, cuisine, sdb, vitrage, PEB
-    toiture_map = {"Parfaite": 10, "Moyenne": 6, "Mauvaise": 2}
-    chauff_map = {
-        "Pompe a chaleur": 9,
-        "Gaz condensation": 8,
-        "Mazout": 5,
-        "Electrique": 3,
-        "Ancien systeme / poele seul": 2,
-    }
-    cuisine_map = {"Bonne": 8, "A moderniser": 5, "A remplacer": 2}
-    sdb_map = {"Bonne": 8, "A moderniser": 5, "A remplacer": 2}
-    vitrage_map = {"Simple": 2, "Double ancien": 5, "Double recent": 8, "Triple": 9}
-    peb_map = {"A": 10, "B": 9, "C": 8, "D": 6, "E": 4, "F": 3, "G": 2}
-
-    notes = [
-        float(toiture_map.get(bien["toiture_etat"], 6)),
-        float(chauff_map.get(bien["chauffage_type"], 6)),
-        float(cuisine_map.get(bien["cuisine_etat"], 5)),
-        float(sdb_map.get(bien["sdb_etat"], 5)),
-        float(vitrage_map.get(bien["vitrage_type"], 6)),
-        float(peb_map.get((bien.get("peb_lettre") or "C").upper(), 6)),
-    ]
-    return float(mean(notes))
-
-
-def fourchette_from_indice(valeur_finale: float, indice: float, params: dict):
-    neutre = float(params["fourchette_neutre_pct"])
-    if indice >= 8.0:
-        low_pct, high_pct = 0.05, 0.08
-    elif indice >= 6.0:
-        low_pct, high_pct = neutre, neutre
-    elif indice >= 4.0:
-        low_pct, high_pct = 0.08, 0.05
-    else:
-        low_pct, high_pct = 0.10, 0.04
-
-    low = valeur_finale * (1.0 - low_pct)
-    high = valeur_finale * (1.0 + high_pct)
-    return low, high, low_pct, high_pct
-
-
-def build_pdf_3pages(bien: dict, zone_row: dict, marche: dict, impacts: dict, indice: float,
-                     coef_expert_pct: float, valeur_tech: float, valeur_finale: float,
-                     low: float, high: float, low_pct: float, high_pct: float) -> bytes:
-    buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    w, h = A4
-
-    # PAGE 1 - Synthèse
-    draw_header(c, "Rapport d'estimation - Vente", "Synthese vendeur (page 1/3)")
-    y = h - 165
-
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, "Bien")
-    y -= 18
-
-    c.setFont("Helvetica", 10)
-    c.drawString(55, y, f"Client: {safe_text(bien['client'], 60) or '-'}"); y -= 14
-    c.drawString(55, y, f"Adresse: {safe_text(bien['adresse'], 80) or '-'}"); y -= 14
-    c.drawString(55, y, f"Commune: {safe_text(bien['commune'], 40) or '-'}"); y -= 14
-    c.drawString(55, y, f"Zone: {zone_row['zone']}  |  Type: {bien['type']}"); y -= 14
-    c.drawString(55, y, f"Surface: {bien['surface']:.0f} m2" + (f"  |  Terrain: {bien['terrain']:.0f} m2" if bien["type"] == "Maison" else "")); y -= 14
-    c.drawString(55, y, f"Chambres: {int(bien.get('nb_chambres', 0))}  |  Salles de bain: {int(bien.get('nb_sdb', 0))}"); y -= 14
-
-    if bien["type"] == "Appartement":
-        c.drawString(55, y, f"Etage: {int(bien.get('etage', 0))}  |  Ascenseur: {'Oui' if bien.get('ascenseur') else 'Non'}"); y -= 14
-
-    c.drawString(55, y, f"PEB: {bien['peb_lettre']}" + (f" ({bien['peb_kwh']:.0f} kWh/m2.an)" if bien['peb_kwh'] else "")); y -= 14
-    c.drawString(55, y, f"Vitrage: {bien['vitrage_type']}"); y -= 14
-
-    c.drawString(55, y, f"Parking: {int(bien.get('nb_places_parking', 0))}  |  Garage: {'Oui' if bien.get('garage') else 'Non'}"); y -= 14
-    c.drawString(55, y, f"Balcon: {'Oui' if bien.get('balcon') else 'Non'}  |  Terrasse: {'Oui' if bien.get('terrasse') else 'Non'}"); y -= 14
-    c.drawString(
-        55, y,
-        "Jardin: " + ("Oui" if bien.get("jardin") else "Non")
-        + "  |  Cave: " + ("Oui" if bien.get("cave") else "Non")
-        + "  |  Grenier amenageable: " + ("Oui" if bien.get("grenier_amenageable") else "Non")
-        + (f" ({bien.get('grenier_amenageable_surface_m2', 0):.0f} m2)" if bien.get("grenier_amenageable") else "")
-    )
-    y -= 14
-
-    # Surfaces par étage (infos)
-    sp = bien.get("surfaces_etages", [])
-    if sp and sum(sp) > 0:
-        c.drawString(55, y, "Surfaces par etage: " + " / ".join([f"{s:.0f} m2" for s in sp]))
-        y -= 14
-
-    y -= 6
-    c.setFont("Helvetica-Bold", 13)
-    c.drawString(40, y, f"Indice global d'etat: {indice:.1f} / 10")
-    y -= 22
-
-    c.setFont("Helvetica-Bold", 18)
-    c.drawString(55, y, f"Valeur finale estimee: {euro(valeur_finale)}")
-    y -= 22
-    c.setFont("Helvetica", 11)
-    c.drawString(55, y, f"Fourchette recommandee: {euro(low)}  ->  {euro(high)}")
-    y -= 16
-    c.setFont("Helvetica-Oblique", 9)
-    c.drawString(55, y, f"Fourchette ajustee par l'indice: -{int(low_pct*100)}% / +{int(high_pct*100)}%")
-    y -= 18
-
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, f"Coefficient d'appreciation experte: {coef_expert_pct:+.1f}%")
-    y -= 14
-    c.setFont("Helvetica", 10)
-    c.drawString(55, y, f"Justification: {safe_text(bien['justif_coef'], 95) or '-'}")
-    y -= 18
-
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(40, 40, "Document indicatif - base sur un referentiel interne et une analyse technique (outil interne).")
-    c.showPage()
-
-    # PAGE 2 - Détail
-    draw_header(c, "Detail des calculs", "Marche + impacts (page 2/3)")
-    y = h - 165
-
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, "Marche (referentiel)")
-    y -= 18
-    c.setFont("Helvetica", 10)
-    c.drawString(55, y, f"Base zone/type: {euro(marche['base_eur_m2'])} par m2"); y -= 14
-    c.drawString(55, y, f"Valeur batie: {euro(marche['valeur_batie'])}"); y -= 14
-    if bien["type"] == "Maison":
-        c.drawString(55, y, f"Valeur terrain: {euro(marche['valeur_terrain'])}"); y -= 14
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(55, y, f"Valeur marche theorique: {euro(marche['valeur_marche'])}")
-    y -= 22
-
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, "Impacts appliques automatiquement")
-    y -= 18
-    c.setFont("Helvetica", 10)
-
-    lines = [
-        (f"Toiture ({bien['toiture_etat']})", impacts["toiture"]),
-        (f"Chauffage ({bien['chauffage_type']})", impacts["chauffage"]),
-        (f"Chassis/Vitrage ({bien['vitrage_type']})", impacts["vitrage"]),
-        (f"PEB ({bien['peb_lettre']})", impacts["peb"]),
-        (f"Cuisine ({bien['cuisine_etat']})", impacts["cuisine"]),
-        (f"Salle de bain - etat ({bien['sdb_etat']})", impacts["sdb_etat"]),
-        (f"Chambres (nb={int(bien.get('nb_chambres', 0))})", impacts["chambres"]),
-        (f"Nb salles de bain (nb={int(bien.get('nb_sdb', 0))})", impacts["sdb_count"]),
-        (f"Etage/Ascenseur (etage={int(bien.get('etage', 0))}, asc={'Oui' if bien.get('ascenseur') else 'Non'})", impacts["etage_appart"]),
-        ("Parking/Garage", impacts["parking_garage"]),
-        ("Balcon/Terrasse", impacts["balcon_terrasse"]),
-        ("Jardin/Cave/Grenier amenageable", impacts["jardin_cave_grenier"]),
-    ]
-
-    for label, val in lines:
-        if bien["type"] != "Appartement" and label.startswith("Etage/Ascenseur"):
-            continue
-        c.drawString(55, y, f"{label}: {euro(val)}")
-        y -= 14
-
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(55, y, f"Total impacts: {euro(impacts['total'])}")
-    y -= 18
-
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(40, y, "Synthese calcul")
-    y -= 18
-    c.setFont("Helvetica", 10)
-    c.drawString(55, y, f"Valeur technique = Valeur marche + impacts = {euro(valeur_tech)}"); y -= 14
-    c.drawString(55, y, f"Valeur finale = Valeur technique x (1 + coef expert) = {euro(valeur_finale)}"); y -= 18
-
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(40, 40, "Les impacts et coefficients sont parametrables dans l'outil interne.")
-    c.showPage()
-
-    # PAGE 3 - Méthodologie
-    draw_header(c, "Methodologie", "Explications (page 3/3)")
-    y = h - 165
-
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, "Approche")
-    y -= 18
-    c.setFont("Helvetica", 10)
-    lines3 = [
-        "1) Valeur marche: referentiel interne (zone/type) applique a la surface (degressivite si grande surface).",
-        "2) Terrain (maisons): valorisation par m2 selon la zone.",
-        "3) Impacts: technique + caracteristiques (chambres, sdb, annexes) appliques automatiquement.",
-        "4) Indice global (/10): calcule sur toiture, chauffage, cuisine, sdb, vitrage, PEB; il influence la fourchette.",
-        "5) Coefficient d'appreciation experte: ajustement final (quartier, nuisances, vue, attractivite).",
-    ]
-    for ln in lines3:
-        c.drawString(55, y, ln)
-        y -= 14
-
-    y -= 8
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, "Notes")
-    y -= 18
-    c.setFont("Helvetica", 10)
-    notes = [
-        "Le referentiel est a mettre a jour regulierement selon ton marche local.",
-        "Les impacts representent l'effet sur la valeur, pas un devis.",
-        "La fourchette depend aussi de la demande au moment de la mise en vente.",
-    ]
-    for ln in notes:
-        c.drawString(55, y, f"- {ln}")
-        y -= 14
-
-    c.setFont("Helvetica-Oblique", 8)
-    c.drawString(40, 40, "Outil interne - La Priorite Immobiliere.")
-    c.save()
+tabs = st.tabs(["1) Marche", "2) Technique", "3) Synthese", "4) Historique"])
 
-    buf.seek(0)
-    return buf.getvalue()
+params = version.params_avec(params_prives)
 
 
-# -----------------------------
-# Streamlit UI
-# -----------------------------
-st.set_page_config(page_title="Estimateur Expert - La Priorite Immobiliere", layout="wide")
-st.title("Estimateur Expert - La Priorite Immobiliere (outil interne)")
+def params_compiles():
+    """Parametres de la session pour les calculs : compiles une fois par (version, surcharges privees).
 
-if "zones" not in st.session_state:
-    st.session_state["zones"] = DEFAULT_ZONES.copy()
-if "params" not in st.session_state:
-    st.session_state["params"] = DEFAULT_PARAMS.copy()
-if "history" not in st.session_state:
-    st.session_state["history"] = []
+    ``params`` reste le dict modifie par les widgets ; ``params_prives`` est
+    tenu a jour juste apres chaque modification.
+    """
+    return version.params_compiles(st.session_state["params_prives"])
 
-tabs = st.tabs(["1) Marche", "2) Technique", "3) Synthese", "4) Historique"])
 
-params = st.session_state["params"]
-zones = st.session_state["zones"]
+zones = version.referentiel_avec(lignes_privees)
 
 # Sidebar
-with st.sidebar:
+with st.sidebar, etape("barre_laterale"):
     st.subheader("Identite dossier")
     client = st.text_input("Client (interne)", value="")
     adresse = st.text_input("Adresse", value="")
     commune = st.text_input("Commune", value="")
 
     st.subheader("Bien")
-    type_bien = st.selectbox("Type", ["Maison", "Appartement", "Commerce"])
+    type_bien = st.selectbox("Type", list(TYPES_BIEN))
 
-    zone_names = sorted(list({z["zone"] for z in zones}))
-    zone_sel = st.selectbox("Zone", zone_names)
+    zone_sel = st.selectbox("Zone", zones.zones)
 
-    candidates = [z for z in zones if z["zone"] == zone_sel and z["type"] == type_bien]
-    zone_row = candidates[0] if candidates else None
+    with etape("referentiel"):
+        zone_row = zones.trouver(zone_sel, type_bien)
     if zone_row is None:
         st.error("Aucune ligne referentiel pour cette zone + ce type. Ajoute-la dans l'onglet Marche > Referentiel.")
 
@@ -602,6 +212,49 @@ with st.sidebar:
     )
     justif_coef = st.text_area("Justification", value="", height=80)
 
+    st.subheader("Debug")
+    st.checkbox(
+        "Profilage des reruns", key="profilage",
+        help=f"Temps par etape du dernier rerun et percentiles glissants ; chaque rerun est ajoute a {JOURNAL_DEFAUT}.",
+    )
+    panneau_profil = st.empty()
+
+
+def fin_rerun():
+    """Clot le profilage du rerun et remplit le panneau de debug (a appeler avant tout st.stop)."""
+    profileur = st.session_state.get("profileur")
+    if not st.session_state.get("profilage") or profileur is None:
+        return
+    etapes = profileur.terminer()
+    with panneau_profil.container():
+        st.caption(
+            f"Rerun {profileur.reruns} ({profileur.portee}) : {max(etapes.values(), default=0.0):.1f} ms. "
+            f"Percentiles sur les {profileur.fenetre} derniers reruns ; journal {profileur.journal}."
+        )
+        st.dataframe(profileur.tableau(), use_container_width=True, hide_index=True)
+        # Pas de widget hors du corps d'un fragment : bouton sur les reruns complets seulement
+        if rerun_complet and st.button("Reinitialiser les mesures", key="profil_reinit"):
+            profileur.reinitialiser()
+
+
+def fragment(fn):
+    """``st.experimental_fragment`` dont les reruns partiels sont profiles a part (portee = nom de la fonction)."""
+    @st.experimental_fragment
+    @functools.wraps(fn)
+    def executer(*args, **kwargs):
+        partiel = not rerun_complet
+        profileur = st.session_state.get("profileur")
+        if partiel and st.session_state.get("profilage") and profileur is not None:
+            profileur.demarrer(portee=fn.__name__)
+        with etape(fn.__name__):
+            resultat = fn(*args, **kwargs)
+        if partiel:
+            fin_rerun()
+        return resultat
+
+    return executer
+
+
 # Bien dict
 bien = {
     "client": client,
@@ -640,33 +293,38 @@ bien = {
     "peb_kwh": 0.0,
 }
 
+# Etat partage avec les fragments (Technique, Synthese, Historique), relu a chacun de leurs reruns
+st.session_state["bien"] = bien
+st.session_state["zone_row"] = zone_row
+
 
 # ---------------- TAB 1 : MARCHE ----------------
-with tabs[0]:
+with tabs[0], etape("onglet_marche"):
     st.subheader("Referentiel (ta grille)")
 
     col1, col2 = st.columns([2, 1])
     with col1:
         st.write("Grille actuelle (modifiable).")
-        st.dataframe(st.session_state["zones"], use_container_width=True)
+        st.dataframe(zones.lignes, use_container_width=True)
 
     with col2:
         st.write("Ajouter une ligne referentiel")
         nz = st.text_input("Nouvelle zone", value="")
-        nt = st.selectbox("Type (referentiel)", ["Maison", "Appartement", "Commerce"], key="ref_type")
+        nt = st.selectbox("Type (referentiel)", list(TYPES_BIEN), key="ref_type")
         nb = st.number_input("Base €/m2 (habitable)", min_value=0, value=0, step=50)
         ntm2 = st.number_input("Terrain €/m2 (maison)", min_value=0, value=0, step=1)
         ncm2 = st.number_input("Commerce €/m2", min_value=0, value=0, step=50)
         if st.button("Ajouter au referentiel"):
             if nz.strip():
-                st.session_state["zones"].append({
+                # Ligne privee a la session tant qu'elle n'est pas publiee
+                lignes_privees.append({
                     "zone": nz.strip(),
                     "type": nt,
                     "base_eur_m2": int(nb),
                     "terrain_eur_m2": int(ntm2),
                     "commerce_eur_m2": int(ncm2),
                 })
-                st.success("Ligne ajoutee.")
+                st.success("Ligne ajoutee (privee a cette session jusqu'a publication).")
 
     st.markdown("---")
     st.subheader("Parametres (base)")
@@ -679,14 +337,39 @@ with tabs[0]:
     with cC:
         params["coef_expert_min"] = st.number_input("Coef expert min (%)", value=float(params["coef_expert_min"]), step=0.5)
         params["coef_expert_max"] = st.number_input("Coef expert max (%)", value=float(params["coef_expert_max"]), step=0.5)
-    st.session_state["params"] = params
+    st.session_state["params_prives"] = surcharges(params, version.params)
+
+    st.markdown("---")
+    st.subheader("Version partagee")
+    nb_prives = len(st.session_state["params_prives"]) + len(lignes_privees)
+    st.write(
+        f"Referentiel et parametres : version {version.numero} ({depot.chemin}), "
+        f"{nb_prives} modification(s) propre(s) a cette session."
+    )
+    if depot.erreur:
+        st.warning(f"Fichier partage illisible, version {version.numero} conservee : {depot.erreur}")
+    cP1, cP2 = st.columns(2)
+    with cP1:
+        if st.button("Publier pour tous les postes", disabled=not nb_prives):
+            version = depot.publier(st.session_state["params_prives"], lignes_privees)
+            st.session_state["params_prives"] = {}
+            st.session_state["lignes_privees"] = []
+            st.session_state["version_referentiel"] = version.numero
+            st.rerun()
+    with cP2:
+        if st.button("Abandonner mes modifications", disabled=not nb_prives):
+            st.session_state["params_prives"] = {}
+            st.session_state["lignes_privees"] = []
+            st.rerun()
 
     st.markdown("---")
     st.subheader("Calcul marche (dossier actuel)")
     if zone_row is None:
+        fin_rerun()
         st.stop()
 
-    marche = calc_marche(zone_row, bien, params)
+    with etape("marche"):
+        marche = calc_marche_memo(zone_row, bien, params_compiles())
     m1, m2, m3 = st.columns(3)
     m1.metric("Base €/m2 appliquee", euro(marche["base_eur_m2"]))
     m2.metric("Valeur batie", euro(marche["valeur_batie"]))
@@ -696,7 +379,10 @@ with tabs[0]:
 
 
 # ---------------- TAB 2 : TECHNIQUE ----------------
-with tabs[1]:
+@fragment
+def champs_techniques():
+    """Champs techniques du bien : leur modification ne relance que ce fragment."""
+    bien = st.session_state["bien"]
     st.subheader("Analyse technique (details)")
 
     st.markdown("### Toiture")
@@ -706,27 +392,24 @@ with tabs[1]:
     with t2:
         toiture_surface_grenier = st.number_input("Surface grenier (toiture) (m2)", min_value=0.0, value=0.0, step=5.0, disabled=not toiture_grenier)
     with t3:
-        toiture_etat = st.selectbox("Etat toiture", ["Parfaite", "Moyenne", "Mauvaise"])
+        toiture_etat = st.selectbox("Etat toiture", list(TOITURE_ETATS))
 
     st.markdown("### Chauffage")
-    chauffage_type = st.selectbox(
-        "Type de chauffage",
-        ["Pompe a chaleur", "Gaz condensation", "Mazout", "Electrique", "Ancien systeme / poele seul"]
-    )
+    chauffage_type = st.selectbox("Type de chauffage", list(CHAUFFAGE_TYPES))
 
     st.markdown("### Chassis / vitrages")
-    vitrage_type = st.selectbox("Type de vitrage", ["Simple", "Double ancien", "Double recent", "Triple"])
+    vitrage_type = st.selectbox("Type de vitrage", list(VITRAGE_TYPES))
 
     st.markdown("### PEB (Belgique)")
-    peb_lettre = st.selectbox("PEB (lettre)", ["A", "B", "C", "D", "E", "F", "G"], index=2)
+    peb_lettre = st.selectbox("PEB (lettre)", list(PEB_LETTRES), index=2)
     peb_kwh = st.number_input("PEB (kWh/m2.an) - optionnel", min_value=0.0, value=0.0, step=1.0)
 
     st.markdown("### Cuisine / Salle de bain (etat)")
     c1, c2 = st.columns(2)
     with c1:
-        cuisine_etat = st.selectbox("Etat cuisine", ["Bonne", "A moderniser", "A remplacer"])
+        cuisine_etat = st.selectbox("Etat cuisine", list(ETATS_PIECE))
     with c2:
-        sdb_etat = st.selectbox("Etat salle de bain", ["Bonne", "A moderniser", "A remplacer"])
+        sdb_etat = st.selectbox("Etat salle de bain", list(ETATS_PIECE))
 
     # Apply to bien
     bien["toiture_grenier"] = bool(toiture_grenier)
@@ -739,7 +422,13 @@ with tabs[1]:
     bien["cuisine_etat"] = cuisine_etat
     bien["sdb_etat"] = sdb_etat
 
-    st.markdown("---")
+    if not rerun_complet:
+        rendu_valorisation()
+
+
+@fragment
+def parametres_impacts():
+    """Parametres d'impacts (une cinquantaine de champs), isoles dans leur propre fragment."""
     st.subheader("Parametres (impacts ajustables)")
     with st.expander("Modifier les impacts (interne)", expanded=False):
         colA, colB, colC = st.columns(3)
@@ -798,209 +487,472 @@ with tabs[1]:
             params["grenier_amenageable_base"] = st.number_input("Grenier amenageable (base)", value=int(params["grenier_amenageable_base"]), step=500)
             params["grenier_amenageable_eur_m2"] = st.number_input("Grenier amenageable (EUR/m2)", value=int(params["grenier_amenageable_eur_m2"]), step=5)
 
-        st.session_state["params"] = params
-
-    # Compute preview impacts + indice
-    impacts = {
-        "toiture": calc_toiture_impact(bien, params),
-        "chauffage": calc_chauffage_impact(bien, params),
-        "vitrage": calc_vitrage_impact(bien, params),
-        "peb": calc_peb_impact(bien, params),
-        "cuisine": calc_cuisine_impact(bien, params),
-        "sdb_etat": calc_sdb_etat_impact(bien, params),
-        "chambres": calc_chambres_impact(bien, params),
-        "sdb_count": calc_sdb_count_impact(bien, params),
-        "etage_appart": calc_etage_appart_impact(bien, params),
-        "parking_garage": calc_parking_garage_impact(bien, params),
-        "balcon_terrasse": calc_balcon_terrasse_impact(bien, params),
-        "jardin_cave_grenier": calc_jardin_cave_grenier_impact(bien, params),
-    }
+        st.session_state["params_prives"] = surcharges(params, version.params)
+
+    if not rerun_complet:
+        rendu_valorisation()
+
+
+def rendu_technique():
+    """Impacts et indice du dossier, dans l'emplacement de l'onglet Technique."""
+    emplacement = st.session_state.get("emplacement_technique")
+    if emplacement is None:
+        return
+    bien = st.session_state["bien"]
+    # Valorisation (memoisee, partagee avec l'onglet Synthese)
+    with etape("valorisation"):
+        valo = valoriser(st.session_state["zone_row"], bien, params_compiles())
+    impacts = valo.impacts
+    indice = valo.indice
+
+    with emplacement.container():
+        # Affichage (2 lignes)
+        r1 = st.columns(6)
+        r1[0].metric("Toiture", euro(impacts["toiture"]))
+        r1[1].metric("Chauffage", euro(impacts["chauffage"]))
+        r1[2].metric("Vitrage", euro(impacts["vitrage"]))
+        r1[3].metric("PEB", euro(impacts["peb"]))
+        r1[4].metric("Parking/Garage", euro(impacts["parking_garage"]))
+        r1[5].metric("Balcon/Terrasse", euro(impacts["balcon_terrasse"]))
+
+        r2 = st.columns(6)
+        r2[0].metric("Cuisine", euro(impacts["cuisine"]))
+        r2[1].metric("SDB etat", euro(impacts["sdb_etat"]))
+        r2[2].metric("Chambres", euro(impacts["chambres"]))
+        r2[3].metric("Nb SDB", euro(impacts["sdb_count"]))
+        r2[4].metric("Etage appart", euro(impacts["etage_appart"]) if bien["type"] == "Appartement" else "0 €")
+        r2[5].metric("Jardin/Cave/Grenier", euro(impacts["jardin_cave_grenier"]))
+
+        r3 = st.columns(3)
+        r3[0].metric("Total impacts", euro(impacts["total"]))
+        r3[1].metric("Indice global", f"{indice:.1f} / 10")
+        # Contrôle surfaces par étage
+        total_etages = sum(bien["surfaces_etages"])
+        if total_etages > 0 and abs(total_etages - bien["surface"]) > 5:
+            r3[2].warning("Surfaces par etage ≠ surface totale")
+        else:
+            r3[2].success("Surfaces par etage OK (ou non renseigne)")
+
+
+def rendu_valorisation():
+    """Apres un rerun partiel d'un fragment de saisie : sorties des onglets Technique et Synthese redessinees."""
+    rendu_technique()
+    rendu_synthese(partiel=True)
+
+
+with tabs[1], etape("onglet_technique"):
+    champs_techniques()
+    st.markdown("---")
+    parametres_impacts()
+    st.session_state["emplacement_technique"] = st.empty()
+    rendu_technique()
 
-    impacts["total"] = (
-        impacts["toiture"] + impacts["chauffage"] + impacts["vitrage"] + impacts["peb"]
-        + impacts["cuisine"] + impacts["sdb_etat"]
-        + impacts["chambres"] + impacts["sdb_count"] + impacts["etage_appart"]
-        + impacts["parking_garage"] + impacts["balcon_terrasse"] + impacts["jardin_cave_grenier"]
-    )
 
-    indice = calc_indice(bien)
-
-    # Affichage (2 lignes)
-    r1 = st.columns(6)
-    r1[0].metric("Toiture", euro(impacts["toiture"]))
-    r1[1].metric("Chauffage", euro(impacts["chauffage"]))
-    r1[2].metric("Vitrage", euro(impacts["vitrage"]))
-    r1[3].metric("PEB", euro(impacts["peb"]))
-    r1[4].metric("Parking/Garage", euro(impacts["parking_garage"]))
-    r1[5].metric("Balcon/Terrasse", euro(impacts["balcon_terrasse"]))
-
-    r2 = st.columns(6)
-    r2[0].metric("Cuisine", euro(impacts["cuisine"]))
-    r2[1].metric("SDB etat", euro(impacts["sdb_etat"]))
-    r2[2].metric("Chambres", euro(impacts["chambres"]))
-    r2[3].metric("Nb SDB", euro(impacts["sdb_count"]))
-    r2[4].metric("Etage appart", euro(impacts["etage_appart"]) if bien["type"] == "Appartement" else "0 €")
-    r2[5].metric("Jardin/Cave/Grenier", euro(impacts["jardin_cave_grenier"]))
-
-    r3 = st.columns(3)
-    r3[0].metric("Total impacts", euro(impacts["total"]))
-    r3[1].metric("Indice global", f"{indice:.1f} / 10")
-    # Contrôle surfaces par étage
-    total_etages = sum(bien["surfaces_etages"])
-    if total_etages > 0 and abs(total_etages - bien["surface"]) > 5:
-        r3[2].warning("Surfaces par etage ≠ surface totale")
+# ---------------- TAB 3 : SYNTHESE ----------------
+def rendu_synthese(partiel: bool = False):
+    """Sorties de la synthese qui dependent de la valorisation, dessinees dans les emplacements de l'onglet.
+
+    Appelee par l'onglet Synthese et, lors de ses reruns partiels, par l'onglet
+    Technique : rien d'autre que de l'affichage n'est ecrit ici, hors bouton de
+    telechargement du rapport (onglet Synthese seulement).
+    """
+    emplacements = st.session_state.get("emplacements_synthese")
+    if not emplacements:
+        return
+    bien = st.session_state["bien"]
+    zone_row = st.session_state["zone_row"]
+    pc = params_compiles()
+    with etape("valorisation"):
+        valo = valoriser(zone_row, bien, pc)
+    marche = valo.marche
+    impacts = valo.impacts
+    indice = valo.indice
+    low_pct, high_pct = valo.low_pct, valo.high_pct
+
+    with emplacements["valeurs"].container():
+        # contrôle surfaces par étage
+        total_etages = sum(bien["surfaces_etages"])
+        if total_etages > 0 and abs(total_etages - bien["surface"]) > 5:
+            st.warning("Attention: la somme des surfaces par etage ne correspond pas a la surface totale (ecart > 5 m2).")
+
+        a1, a2, a3, a4 = st.columns(4)
+        a1.metric("Valeur marche", euro(marche["valeur_marche"]))
+        a2.metric("Total impacts", euro(impacts["total"]))
+        a3.metric("Valeur technique", euro(valo.valeur_tech))
+        a4.metric("Valeur finale", euro(valo.valeur_finale))
+
+        b1, b2, b3 = st.columns(3)
+        b1.metric("Indice global", f"{indice:.1f} / 10")
+        b2.metric("Fourchette basse", euro(valo.low))
+        b3.metric("Fourchette haute", euro(valo.high))
+        st.caption(f"Fourchette ajustee: -{int(low_pct*100)}% / +{int(high_pct*100)}% (selon indice)")
+
+    montecarlo = bool(st.session_state.get("montecarlo"))
+    if montecarlo:
+        with etape("montecarlo"):
+            bande = simuler(zone_row, bien, pc)
+        with emplacements["montecarlo"].container():
+            m1, m2, m3 = st.columns(3)
+            m1.metric("P10", euro(bande.p10))
+            m2.metric("P50", euro(bande.p50))
+            m3.metric("P90", euro(bande.p90))
+            st.caption(f"{bande.tirages:,} tirages (graine {bande.graine}).".replace(",", " "))
+    else:
+        emplacements["montecarlo"].empty()
+
+    with etape("comparables"):
+        comparables = chercher_comparables(
+            st.session_state["poids_comparables"],
+            {
+                "zone": zone_row["zone"],
+                "type_bien": bien["type"],
+                "surface_m2": bien["surface"],
+                "terrain_m2": bien["terrain"],
+                "nb_chambres": bien["nb_chambres"],
+                "nb_sdb": bien["nb_sdb"],
+                "indice_etat": indice,
+            },
+            st.session_state.get("nb_comparables", 5),
+        )
+    with emplacements["comparables"].container():
+        if not comparables:
+            st.info("Aucune vente enregistree dans l'historique (onglet Historique : prix vendu).")
+        else:
+            st.dataframe(
+                [
+                    {
+                        "date vente": c["date_vente"], "commune": c["commune"], "zone": c["zone"], "type": c["type_bien"],
+                        "surface m2": c["surface_m2"], "terrain m2": c["terrain_m2"], "chambres": c["nb_chambres"],
+                        "sdb": c["nb_sdb"], "indice": c["indice_etat"], "prix vendu": euro(c["prix_vendu"]),
+                        "EUR/m2": euro(c["prix_vendu"] / c["surface_m2"]) if c["surface_m2"] else "-",
+                        "distance": round(c["distance"], 2),
+                    }
+                    for c in comparables
+                ],
+                use_container_width=True, hide_index=True,
+            )
+            prix_m2 = sorted(c["prix_vendu"] / c["surface_m2"] for c in comparables if c["surface_m2"])
+            if prix_m2:
+                st.caption(f"Prix median des comparables: {euro(prix_m2[len(prix_m2) // 2])} par m2.")
+
+    # Rapport PDF : genere uniquement sur demande, puis servi depuis le cache
+    demande = st.session_state.get("rapport_demande")
+    if demande == empreinte_rapport(bien, zone_row, pc, montecarlo):
+        if not partiel:
+            with etape("rapport_pdf"):
+                pdf = rapport_pdf(bien, zone_row, pc, montecarlo)
+            emplacements["rapport"].download_button(
+                "Telecharger rapport vendeur (PDF - 3 pages)",
+                data=pdf,
+                file_name=f"Rapport_Expert_{date.today().isoformat()}.pdf",
+                mime="application/pdf",
+            )
+    elif demande is not None:
+        emplacements["rapport"].caption("Dossier modifie depuis la preparation du rapport : le preparer a nouveau.")
     else:
-        r3[2].success("Surfaces par etage OK (ou non renseigne)")
+        emplacements["rapport"].empty()
 
+    if st.session_state.get("sensibilite"):
+        with etape("sensibilite"), emplacements["sensibilite"].container():
+            rendu_sensibilite(zone_row, bien, pc)
+    else:
+        emplacements["sensibilite"].empty()
 
-# ---------------- TAB 3 : SYNTHESE ----------------
-with tabs[2]:
-    st.subheader("Synthese experte (calcul final)")
-    if zone_row is None:
-        st.stop()
+    if st.session_state.get("renovation"):
+        with etape("renovation"), emplacements["renovation"].container():
+            rendu_renovation(zone_row, bien, pc)
+    else:
+        emplacements["renovation"].empty()
 
-    marche = calc_marche(zone_row, bien, params)
-
-    impacts = {
-        "toiture": calc_toiture_impact(bien, params),
-        "chauffage": calc_chauffage_impact(bien, params),
-        "vitrage": calc_vitrage_impact(bien, params),
-        "peb": calc_peb_impact(bien, params),
-        "cuisine": calc_cuisine_impact(bien, params),
-        "sdb_etat": calc_sdb_etat_impact(bien, params),
-        "chambres": calc_chambres_impact(bien, params),
-        "sdb_count": calc_sdb_count_impact(bien, params),
-        "etage_appart": calc_etage_appart_impact(bien, params),
-        "parking_garage": calc_parking_garage_impact(bien, params),
-        "balcon_terrasse": calc_balcon_terrasse_impact(bien, params),
-        "jardin_cave_grenier": calc_jardin_cave_grenier_impact(bien, params),
-    }
 
-    impacts["total"] = (
-        impacts["toiture"] + impacts["chauffage"] + impacts["vitrage"] + impacts["peb"]
-        + impacts["cuisine"] + impacts["sdb_etat"]
-        + impacts["chambres"] + impacts["sdb_count"] + impacts["etage_appart"]
-        + impacts["parking_garage"] + impacts["balcon_terrasse"] + impacts["jardin_cave_grenier"]
+def rendu_renovation(zone_row: dict, bien: dict, pc):
+    """Front de Pareto plus-value / cout des combinaisons de travaux (couts : cle ``couts_travaux``)."""
+    scenarios, front = optimiser(zone_row, bien, pc, st.session_state["couts_travaux"])
+    st.caption(
+        f"{len(scenarios):,} combinaisons evaluees ; {len(front)} sur le front de Pareto "
+        f"(aucune autre ne rapporte plus pour moins cher).".replace(",", " ")
     )
-
-    indice = calc_indice(bien)
-    valeur_tech = marche["valeur_marche"] + impacts["total"]
-    coef = float(bien["coef_expert_pct"]) / 100.0
-    valeur_finale = valeur_tech * (1.0 + coef)
-
-    low, high, low_pct, high_pct = fourchette_from_indice(valeur_finale, indice, params)
-
-    # contrôle surfaces par étage
-    total_etages = sum(bien["surfaces_etages"])
-    if total_etages > 0 and abs(total_etages - bien["surface"]) > 5:
-        st.warning("Attention: la somme des surfaces par etage ne correspond pas a la surface totale (ecart > 5 m2).")
-
-    a1, a2, a3, a4 = st.columns(4)
-    a1.metric("Valeur marche", euro(marche["valeur_marche"]))
-    a2.metric("Total impacts", euro(impacts["total"]))
-    a3.metric("Valeur technique", euro(valeur_tech))
-    a4.metric("Valeur finale", euro(valeur_finale))
-
-    b1, b2, b3 = st.columns(3)
-    b1.metric("Indice global", f"{indice:.1f} / 10")
-    b2.metric("Fourchette basse", euro(low))
-    b3.metric("Fourchette haute", euro(high))
-    st.caption(f"Fourchette ajustee: -{int(low_pct*100)}% / +{int(high_pct*100)}% (selon indice)")
-
-    pdf = build_pdf_3pages(
-        bien=bien,
-        zone_row=zone_row,
-        marche=marche,
-        impacts=impacts,
-        indice=indice,
-        coef_expert_pct=float(bien["coef_expert_pct"]),
-        valeur_tech=valeur_tech,
-        valeur_finale=valeur_finale,
-        low=low,
-        high=high,
-        low_pct=low_pct,
-        high_pct=high_pct,
+    if not front:
+        st.info("Aucune amelioration ne fait monter la valeur finale de ce dossier.")
+        return
+    points = [{"cout": float(c), "plus_value": float(g)} for c, g in zip(scenarios.cout, scenarios.plus_value)]
+    nuage = alt.Chart(alt.Data(values=points)).mark_circle(size=12, opacity=0.25, color="gray").encode(
+        x=alt.X("cout:Q", title="Cout des travaux (EUR)"),
+        y=alt.Y("plus_value:Q", title="Plus-value (EUR)"),
+    )
+    lignes = [
+        {
+            "travaux": ", ".join(f"{poste.split('_')[0]}: {etat}" for poste, etat in f["travaux"].items()),
+            "cout": f["cout"], "plus_value": f["plus_value"],
+        }
+        for f in front
+    ]
+    courbe = alt.Chart(alt.Data(values=lignes)).mark_line(point=True, color="firebrick").encode(
+        x="cout:Q", y="plus_value:Q",
+        tooltip=["travaux:N", alt.Tooltip("cout:Q", format=",.0f"), alt.Tooltip("plus_value:Q", format=",.0f")],
+    )
+    st.altair_chart(nuage + courbe, use_container_width=True)
+    st.dataframe(
+        [
+            {
+                "travaux": l["travaux"], "cout": euro(f["cout"]), "plus-value": euro(f["plus_value"]),
+                "valeur finale": euro(f["valeur_finale"]), "indice": round(f["indice"], 1),
+                "plus-value / cout": round(f["rendement"], 2) if f["rendement"] is not None else "-",
+            }
+            for l, f in zip(lignes, front)
+        ],
+        use_container_width=True, hide_index=True,
     )
 
-    st.download_button(
-        "Telecharger rapport vendeur (PDF - 3 pages)",
-        data=pdf,
-        file_name=f"Rapport_Expert_{date.today().isoformat()}.pdf",
-        mime="application/pdf",
+
+def rendu_sensibilite(zone_row: dict, bien: dict, pc):
+    """Graphique what-if selon les reglages de l'onglet Synthese (cles ``sens_*``)."""
+    mode = st.session_state["sens_mode"]
+    variation = st.session_state["sens_variation"] / 100.0
+
+    if mode.startswith("Tornado"):
+        lignes = tornado(zone_row, bien, pc, variation)
+        if not lignes:
+            st.info("Aucun parametre n'influence la valeur finale de ce dossier.")
+            return
+        lignes = lignes[:st.session_state["sens_nb"]]
+        barres = [
+            {"parametre": l["parametre"], "sens": sens, "debut": l["base"], "fin": l[cle], "ecart": l["ecart"]}
+            for l in lignes for sens, cle in ((f"-{variation:.0%}", "bas"), (f"+{variation:.0%}", "haut"))
+        ]
+        ordre = [l["parametre"] for l in lignes]
+        chart = alt.Chart(alt.Data(values=barres)).mark_bar().encode(
+            y=alt.Y("parametre:N", sort=ordre, title=None),
+            x=alt.X("debut:Q", title="Valeur finale (EUR)", scale=alt.Scale(zero=False)),
+            x2="fin:Q",
+            color=alt.Color("sens:N", title="Variation"),
+            tooltip=["parametre:N", "sens:N", alt.Tooltip("fin:Q", format=",.0f", title="valeur finale")],
+        )
+        st.altair_chart(chart, use_container_width=True)
+        st.caption(
+            f"Valeur finale actuelle: {euro(lignes[0]['base'])} - parametres varies un a un de +/-{variation:.0%} "
+            f"(+/-{euro(ECART_ABSOLU)} pour un parametre nul)."
+        )
+
+    elif mode.startswith("Balayage"):
+        cle = st.session_state["sens_cle"]
+        valeurs = plage(float(params[cle]), variation)
+        res = balayer(zone_row, bien, pc, cle, valeurs)
+        points = [{cle: float(v), "valeur_finale": float(r)} for v, r in zip(valeurs, res)]
+        chart = alt.Chart(alt.Data(values=points)).mark_line(point=True).encode(
+            x=alt.X(f"{cle}:Q", scale=alt.Scale(zero=False)),
+            y=alt.Y("valeur_finale:Q", title="Valeur finale (EUR)", scale=alt.Scale(zero=False)),
+            tooltip=[f"{cle}:Q", alt.Tooltip("valeur_finale:Q", format=",.0f")],
+        )
+        st.altair_chart(chart, use_container_width=True)
+
+    else:
+        cle_x, cle_y = st.session_state["sens_x"], st.session_state["sens_y"]
+        if cle_x == cle_y:
+            st.warning("Choisir deux parametres differents.")
+            return
+        vx = plage(float(params[cle_x]), variation, n=31)
+        vy = plage(float(params[cle_y]), variation, n=31)
+        res = grille(zone_row, bien, pc, cle_x, vx, cle_y, vy)
+        cellules = [
+            {cle_x: float(x), cle_y: float(y), "valeur_finale": float(res[j, i])}
+            for j, y in enumerate(vy) for i, x in enumerate(vx)
+        ]
+        chart = alt.Chart(alt.Data(values=cellules)).mark_rect().encode(
+            x=alt.X(f"{cle_x}:O", axis=alt.Axis(format=".4~g")),
+            y=alt.Y(f"{cle_y}:O", sort="descending", axis=alt.Axis(format=".4~g")),
+            color=alt.Color("valeur_finale:Q", title="Valeur finale", scale=alt.Scale(scheme="viridis")),
+            tooltip=[f"{cle_x}:Q", f"{cle_y}:Q", alt.Tooltip("valeur_finale:Q", format=",.0f")],
+        )
+        st.altair_chart(chart, use_container_width=True)
+
+
+@fragment
+def onglet_synthese():
+    """Reglages de la synthese (Monte Carlo, comparables, rapport, sauvegarde, sensibilite, travaux) ; sorties via ``rendu_synthese``."""
+    bien = st.session_state["bien"]
+    zone_row = st.session_state["zone_row"]
+    st.subheader("Synthese experte (calcul final)")
+    if zone_row is None:
+        return
+    message = st.session_state.pop("message_synthese", None)
+    if message:
+        st.success(message)
+
+    emplacements = {"valeurs": st.empty()}
+    st.checkbox(
+        "Bande d'incertitude Monte Carlo (P10 / P50 / P90)", value=False, key="montecarlo",
+        help="Tirages graines sur la surface, le prix EUR/m2 du referentiel et les etats techniques ; repris dans le PDF.",
     )
+    emplacements["montecarlo"] = st.empty()
+
+    st.markdown("---")
+    st.subheader("Ventes comparables (historique)")
+    if "poids_comparables" not in st.session_state:
+        st.session_state["poids_comparables"] = dict(POIDS_DEFAUT)
+    poids = st.session_state["poids_comparables"]
+    with st.expander("Ponderation de la similarite"):
+        colonnes_poids = st.columns(len(poids))
+        for col_p, cle in zip(colonnes_poids, list(poids)):
+            poids[cle] = col_p.number_input(cle, min_value=0.0, value=float(poids[cle]), step=0.5, key=f"poids_{cle}")
+    st.slider("Nombre de comparables", 1, 20, 5, key="nb_comparables")
+    emplacements["comparables"] = st.empty()
+
+    if st.button("Preparer le rapport vendeur (PDF - 3 pages)"):
+        st.session_state["rapport_demande"] = empreinte_rapport(bien, zone_row, params_compiles(), st.session_state["montecarlo"])
+    emplacements["rapport"] = st.empty()
 
     st.markdown("---")
     st.subheader("Sauvegarde (Historique)")
     colS1, colS2 = st.columns([1, 2])
     with colS1:
         if st.button("Enregistrer cette estimation"):
-            record = {
-                "date_estimation": date.today().isoformat(),
-                "client": safe_text(bien["client"], 60),
-                "adresse": safe_text(bien["adresse"], 80),
-                "commune": safe_text(bien["commune"], 40),
-                "zone": zone_row["zone"],
-                "type_bien": bien["type"],
-                "surface_m2": round(float(bien["surface"]), 1),
-                "terrain_m2": round(float(bien["terrain"]), 1),
-                "nb_chambres": int(bien["nb_chambres"]),
-                "nb_sdb": int(bien["nb_sdb"]),
-                "etage": int(bien["etage"]),
-                "ascenseur": bool(bien["ascenseur"]),
-                "peb_lettre": bien["peb_lettre"],
-                "peb_kwh": round(float(bien["peb_kwh"]), 0),
-                "vitrage_type": bien["vitrage_type"],
-                "toiture_etat": bien["toiture_etat"],
-                "toiture_grenier": bool(bien["toiture_grenier"]),
-                "toiture_surface_grenier": round(float(bien["toiture_surface_grenier"]), 1),
-                "chauffage_type": bien["chauffage_type"],
-                "cuisine_etat": bien["cuisine_etat"],
-                "sdb_etat": bien["sdb_etat"],
-                "nb_places_parking": int(bien["nb_places_parking"]),
-                "garage": bool(bien["garage"]),
-                "balcon": bool(bien["balcon"]),
-                "terrasse": bool(bien["terrasse"]),
-                "jardin": bool(bien["jardin"]),
-                "cave": bool(bien["cave"]),
-                "grenier_amenageable": bool(bien["grenier_amenageable"]),
-                "grenier_amenageable_surface_m2": round(float(bien["grenier_amenageable_surface_m2"]), 1),
-                "nb_etages": int(bien["nb_etages"]),
-                "surfaces_etages": " / ".join([str(int(s)) for s in bien.get("surfaces_etages", [])]),
-                "indice_etat": round(float(indice), 1),
-                "coef_expert_pct": round(float(bien["coef_expert_pct"]), 1),
-                "justif_coef": safe_text(bien["justif_coef"], 120),
-                "valeur_marche": round(float(marche["valeur_marche"]), 0),
-                "impact_total": round(float(impacts["total"]), 0),
-                "valeur_finale": round(float(valeur_finale), 0),
-                "fourchette_basse": round(float(low), 0),
-                "fourchette_haute": round(float(high), 0),
-                "prix_vendu": "",
-                "date_vente": "",
-            }
-            st.session_state["history"].insert(0, record)
-            st.success("Estimation enregistree dans l'historique.")
+            valo = valoriser(zone_row, bien, params_compiles())
+            record = build_record(
+                bien, zone_row["zone"], valo.indice,
+                valo.marche["valeur_marche"], valo.impacts["total"], valo.valeur_finale, valo.low, valo.high,
+            )
+            # Valeurs issues des surcharges privees de la session : exclue des revalorisations
+            prive = not dependances(zone_row["zone"], bien).isdisjoint(
+                cles_surcharges(st.session_state["params_prives"], st.session_state["lignes_privees"])
+            )
+            historique.ajouter(record, prive=prive)
+            # Rerun complet : l'onglet Historique (autre fragment) reprend la nouvelle ligne
+            st.session_state["message_synthese"] = "Estimation enregistree dans l'historique." + (
+                " Calculee avec des modifications non publiees : elle ne sera pas revalorisee." if prive else ""
+            )
+            st.rerun()
     with colS2:
         st.info("Ensuite: onglet Historique pour encoder le prix vendu.")
 
+    st.markdown("---")
+    st.subheader("Sensibilite aux parametres (what-if)")
+    if st.checkbox("Afficher l'analyse de sensibilite", value=False, key="sensibilite"):
+        cles_params = list(params)
+        mode = st.radio(
+            "Analyse", ["Tornado (tous les parametres)", "Balayage 1 parametre", "Grille 2 parametres"],
+            horizontal=True, key="sens_mode",
+        )
+        st.slider("Variation autour de la valeur actuelle (%)", 5, 100, 20, step=5, key="sens_variation")
+        if mode.startswith("Tornado"):
+            st.slider("Parametres affiches", 5, len(cles_params), min(15, len(cles_params)), key="sens_nb")
+        elif mode.startswith("Balayage"):
+            st.selectbox("Parametre", cles_params, index=cles_params.index("degressif_pct"), key="sens_cle")
+        else:
+            g1, g2 = st.columns(2)
+            with g1:
+                st.selectbox("Parametre X", cles_params, index=cles_params.index("impact_par_chambre"), key="sens_x")
+            with g2:
+                st.selectbox("Parametre Y", cles_params, index=cles_params.index("toit_impact_factor"), key="sens_y")
+    emplacements["sensibilite"] = st.empty()
+
+    st.markdown("---")
+    st.subheader("Travaux avant vente (scenarios)")
+    if st.checkbox("Chercher les travaux qui valent la peine", value=False, key="renovation"):
+        if "couts_travaux" not in st.session_state:
+            st.session_state["couts_travaux"] = {poste: dict(c) for poste, c in COUTS_DEFAUT.items()}
+        couts = st.session_state["couts_travaux"]
+        with st.expander("Cout des travaux par etat cible (EUR, indicatifs)"):
+            colonnes_couts = st.columns(len(POSTES))
+            for col_c, poste in zip(colonnes_couts, POSTES):
+                col_c.caption(poste.split("_")[0])
+                for etat in couts[poste]:
+                    couts[poste][etat] = col_c.number_input(
+                        etat, min_value=0, value=int(couts[poste][etat]), step=500, key=f"cout_{poste}_{etat}",
+                    )
+    emplacements["renovation"] = st.empty()
+
+    st.session_state["emplacements_synthese"] = emplacements
+    rendu_synthese()
+
+
+with tabs[2]:
+    onglet_synthese()
+
 
 # ---------------- TAB 4 : HISTORIQUE ----------------
-with tabs[3]:
+@fragment
+def onglet_historique():
+    """Historique pagine, mise a jour des ventes et calibration ; ses widgets ne relancent que ce fragment."""
     st.subheader("Historique des estimations (interne)")
-    hist = st.session_state["history"]
-    if not hist:
+    message = st.session_state.pop("message_historique", None)
+    if message:
+        st.success(message)
+    if historique.compter() == 0:
         st.warning("Aucune estimation enregistree pour le moment.")
-        st.stop()
+        return
+
+    f1, f2, f3, f4, f5 = st.columns(5)
+    with f1:
+        f_zone = st.selectbox("Zone", ["Toutes"] + historique.valeurs_distinctes("zone"), key="hist_zone")
+    with f2:
+        f_type = st.selectbox("Type", ["Tous"] + historique.valeurs_distinctes("type_bien"), key="hist_type")
+    with f3:
+        f_debut = st.date_input("Estime a partir du", value=None, key="hist_debut")
+    with f4:
+        f_fin = st.date_input("Estime jusqu'au", value=None, key="hist_fin")
+    with f5:
+        f_statut = st.selectbox("Statut", ["Tous", "Vendus", "Non vendus"], key="hist_statut")
+    filtres = {
+        "zone": None if f_zone == "Toutes" else f_zone,
+        "type_bien": None if f_type == "Tous" else f_type,
+        "date_debut": f_debut.isoformat() if f_debut else None,
+        "date_fin": f_fin.isoformat() if f_fin else None,
+        "vendu": {"Vendus": True, "Non vendus": False}.get(f_statut),
+    }
+
+    nb = historique.compter(**filtres)
+    t1, t2, t3, t4 = st.columns(4)
+    with t1:
+        tri = st.selectbox("Trier par", COLONNES_TRI, index=0, key="hist_tri")
+    with t2:
+        descendant = st.selectbox("Ordre", ["Decroissant", "Croissant"], key="hist_ordre") == "Decroissant"
+    with t3:
+        par_page = st.selectbox("Lignes par page", [25, 50, 100, 250], index=1, key="hist_par_page")
+    nb_pages = max(1, -(-nb // par_page))
+    with t4:
+        page = st.number_input(f"Page (sur {nb_pages})", min_value=1, max_value=nb_pages, value=1, step=1, key="hist_page")
+    page = min(int(page), nb_pages)
+
+    with etape("lister"):
+        hist = historique.lister(
+            limite=par_page, decalage=(page - 1) * par_page, tri=tri, descendant=descendant, **filtres
+        )
+    st.caption(f"{nb} estimation(s) correspondant aux filtres - page {page}/{nb_pages}.")
+    if not hist:
+        st.info("Aucune estimation ne correspond aux filtres.")
+        return
 
-    st.dataframe(hist, use_container_width=True)
+    # prix vendu vide -> None : colonne numerique cote Arrow
+    st.dataframe(
+        [{**r, "prix_vendu": r["prix_vendu"] if r["prix_vendu"] != "" else None} for r in hist],
+        use_container_width=True, hide_index=True,
+    )
+    revalorisations = historique.revalorisations(limite=200)
+    if revalorisations:
+        with st.expander(f"Revalorisations recentes ({len(revalorisations)} dernieres)"):
+            st.dataframe(
+                [
+                    {
+                        "id": r["estimation_id"], "date": r["date"], "motif": r["motif"],
+                        "valeur finale avant": euro(r["valeur_finale_avant"]),
+                        "valeur finale apres": euro(r["valeur_finale_apres"]),
+                        "ecart": euro(r["valeur_finale_apres"] - r["valeur_finale_avant"]),
+                    }
+                    for r in revalorisations
+                ],
+                use_container_width=True, hide_index=True,
+            )
 
     st.markdown("---")
     st.subheader("Mettre a jour un dossier (prix vendu)")
-    idx = st.number_input(
-        "Numero de ligne (0 = la plus recente)",
-        min_value=0, max_value=max(0, len(hist) - 1),
-        value=0, step=1
+    par_id = {r["id"]: r for r in hist}
+    id_choisi = st.selectbox(
+        "Dossier (page affichee)",
+        list(par_id),
+        format_func=lambda i: f"#{i} - {par_id[i]['date_estimation']} - {par_id[i]['client'] or '-'} ({par_id[i]['commune'] or par_id[i]['zone']})",
     )
-    rec = hist[int(idx)]
+    rec = par_id[id_choisi]
 
     c1, c2, c3 = st.columns(3)
     with c1:
@@ -1015,8 +967,129 @@ with tabs[3]:
                     datetime.strptime(dv, "%Y-%m-%d")
                 except Exception:
                     st.error("Date vente invalide. Format attendu: YYYY-MM-DD")
-                    st.stop()
-            rec["prix_vendu"] = prix_vendu.strip()
-            rec["date_vente"] = dv
-            st.session_state["history"][int(idx)] = rec
+                    return
+            pv = prix_vendu.strip()
+            if pv:
+                try:
+                    parse_prix(pv)
+                except ValueError:
+                    st.error("Prix vendu invalide. Exemple: 245000")
+                    return
+            historique.mettre_a_jour_vente(rec["id"], pv, dv)
+            vente = historique.obtenir(rec["id"])
+            ajouter_vente_comparables(vente)
+            _precision().ajouter_ventes([vente])
             st.success("Mise a jour faite.")
+            if not rerun_complet:
+                rendu_synthese(partiel=True)  # comparables de la synthese
+
+    st.markdown("---")
+    st.subheader("Precision des estimations (prix vendus)")
+    resume = _precision().resume()
+    if resume is None:
+        st.info("Aucune vente enregistree : encoder des prix vendus ci-dessus.")
+    else:
+        p1, p2, p3, p4, p5 = st.columns(5)
+        p1.metric("Ventes", resume["n"])
+        p2.metric("Erreur moyenne (MAE)", euro(resume["mae"]))
+        p3.metric("MAPE", f"{resume['mape']:.1%}" if resume["mape"] is not None else "-")
+        p4.metric("Biais moyen", euro(resume["biais"]), help="Valeur finale - prix vendu (positif = surestimation).")
+        p5.metric("Prix dans la fourchette", f"{resume['dans_fourchette']:.0%}")
+        dimension = st.selectbox(
+            "Detail par", DIMENSIONS, key="precision_dimension",
+            format_func=lambda d: {"zone": "Zone", "type_bien": "Type", "indice": "Tranche d'indice", "coef_expert": "Coefficient expert"}[d],
+        )
+        lignes = _precision().par(dimension)
+        st.altair_chart(
+            alt.Chart(alt.Data(values=lignes)).mark_bar().encode(
+                x=alt.X("groupe:N", sort=[l["groupe"] for l in lignes], title=None),
+                y=alt.Y("biais_pct:Q", title="Biais moyen (% du prix vendu)", axis=alt.Axis(format="%")),
+                tooltip=["groupe:N", "n:Q", alt.Tooltip("biais_pct:Q", format=".1%"), alt.Tooltip("dans_fourchette:Q", format=".0%")],
+            ),
+            use_container_width=True,
+        )
+        st.dataframe(
+            [
+                {
+                    "groupe": l["groupe"], "ventes": l["n"], "MAE": euro(l["mae"]),
+                    "MAPE": f"{l['mape']:.1%}" if l["mape"] is not None else "-",
+                    "biais": euro(l["biais"]),
+                    "biais %": f"{l['biais_pct']:+.1%}" if l["biais_pct"] is not None else "-",
+                    "dans fourchette": f"{l['dans_fourchette']:.0%}",
+                    "sous": f"{l['sous_fourchette']:.0%}", "au-dessus": f"{l['sur_fourchette']:.0%}",
+                }
+                for l in lignes
+            ],
+            use_container_width=True, hide_index=True,
+        )
+
+    st.markdown("---")
+    st.subheader("Calibration des parametres (prix vendus)")
+    k1, k2 = st.columns(2)
+    with k1:
+        groupes = st.selectbox(
+            "Niveau du marche (EUR/m2)", ["zone", "global", None],
+            format_func=lambda g: {"zone": "Un facteur par zone + type", "global": "Un facteur global", None: "Non calibre"}[g],
+        )
+    with k2:
+        regularisation = st.slider(
+            "Regularisation vers les valeurs actuelles", 0.0, 2.0, REGULARISATION_DEFAUT, step=0.05,
+            help="0 = moindres carres purs ; plus la valeur est grande, plus les parametres restent proches des actuels.",
+        )
+    if st.button("Calculer une proposition de parametres"):
+        # Statistiques suffisantes gardees en session : seules les ventes nouvelles ou corrigees sont traitees
+        cle_cal = (params_compiles().empreinte, tuple(tuple(sorted(z.items())) for z in zones), groupes)
+        if st.session_state.get("calibrateur_cle") != cle_cal:
+            st.session_state["calibrateur"] = Calibrateur(params_compiles(), zones, groupes)
+            st.session_state["calibrateur_cle"] = cle_cal
+        calibrateur = st.session_state["calibrateur"]
+        ventes = historique.lister(vendu=True)
+        # Ventes integrees dont le prix a ete efface depuis : retirees des sommes
+        retirees = calibrateur.ids - {r["id"] for r in ventes}
+        calibrateur.ajouter_ventes(ventes + historique.obtenir_lot(retirees))
+        if calibrateur.n == 0:
+            st.warning("Aucune vente exploitable (prix vendu + ligne referentiel).")
+        else:
+            st.session_state["calibration"] = calibrateur.ajuster(regularisation)
+            st.session_state["calibration_metriques"] = (
+                evaluer(ventes, params, zones),
+                evaluer(ventes, st.session_state["calibration"].params, st.session_state["calibration"].referentiel),
+            )
+
+    cal = st.session_state.get("calibration")
+    if cal is not None:
+        avant, apres = st.session_state["calibration_metriques"]
+        st.caption(f"{cal.n} vente(s) utilisee(s).")
+        st.dataframe(
+            [
+                {"": "Actuel", "MAE": euro(avant["mae"]), "MAPE": f"{avant['mape']:.1%}", "RMSE": euro(avant["rmse"]), "Biais": euro(avant["biais"])},
+                {"": "Propose", "MAE": euro(apres["mae"]), "MAPE": f"{apres['mape']:.1%}", "RMSE": euro(apres["rmse"]), "Biais": euro(apres["biais"])},
+            ],
+            hide_index=True,
+        )
+        st.dataframe(
+            [
+                {"parametre": k, "actuel": float(params[k]), "propose": round(cal.params[k]), "ecart": round(cal.params[k] - params[k])}
+                for k in PARAMS_CALIBRABLES
+            ],
+            use_container_width=True, hide_index=True,
+        )
+        if cal.facteurs_marche:
+            st.dataframe(
+                [{"groupe": " / ".join(g) if isinstance(g, tuple) else "Tous", "facteur EUR/m2": round(f, 3)} for g, f in cal.facteurs_marche.items()],
+                hide_index=True,
+            )
+        if st.button("Appliquer les parametres proposes"):
+            params.update({k: float(round(cal.params[k])) for k in PARAMS_CALIBRABLES})
+            st.session_state["params_prives"] = surcharges(params, version.params)
+            st.session_state.pop("calibration", None)
+            # Rerun complet : toutes les valorisations dependent des parametres
+            st.session_state["message_historique"] = "Parametres mis a jour (les facteurs EUR/m2 sont a reporter dans le referentiel)."
+            st.rerun()
+
+
+with tabs[3]:
+    onglet_historique()
+
+fin_rerun()
+rerun_complet = False
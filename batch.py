@@ -0,0 +1,313 @@
+"""Valorisation vectorisee d'un portefeuille entier (une passe NumPy pour N biens).
+
+Chaque colonne est calculee avec les memes operations, dans le meme ordre, que
+les fonctions scalaires de ``calculs`` : le resultat est identique a une boucle
+sur ``calc_marche`` / ``calc_*_impact`` / ``calc_indice`` / ``fourchette_from_indice``.
+
+Les colonnes d'entree portent les memes noms que les cles du dict ``bien``
+(``type``, ``surface``, ``toiture_etat``, ...). Les colonnes de libelles
+acceptent soit des chaines, soit des codes entiers (index dans les tuples
+``TYPES_BIEN``, ``CHAUFFAGE_TYPES``, ... de ``calculs``).
+"""
+import numpy as np
+
+from calculs import (
+    CHAUFFAGE_TYPES,
+    ETATS_PIECE,
+    IMPACT_KEYS,
+    NOTES_CHAUFFAGE,
+    NOTES_CUISINE,
+    NOTES_PEB,
+    NOTES_SDB,
+    NOTES_TOITURE,
+    NOTES_VITRAGE,
+    PARAMS_CHAUFFAGE,
+    PARAMS_CUISINE,
+    PARAMS_PEB,
+    PARAMS_SDB,
+    PARAMS_VITRAGE,
+    PEB_LETTRES,
+    TOITURE_ETATS,
+    TYPES_BIEN,
+    VITRAGE_TYPES,
+)
+
+
+# Colonnes optionnelles : memes valeurs par defaut que les bien.get(...) scalaires.
+# "nb_chambres" absent (colonne ou valeur NaN) = nombre de reference (impact nul).
+COLONNES_DEFAUT = {
+    "terrain": 0.0,
+    "nb_sdb": 1,
+    "etage": 0,
+    "ascenseur": False,
+    "nb_places_parking": 0,
+    "garage": False,
+    "balcon": False,
+    "terrasse": False,
+    "jardin": False,
+    "cave": False,
+    "grenier_amenageable": False,
+    "grenier_amenageable_surface_m2": 0.0,
+    "toiture_grenier": False,
+    "toiture_surface_grenier": 0.0,
+    "coef_expert_pct": 0.0,
+    "peb_lettre": "C",
+}
+
+COLONNES_REFERENTIEL = ("base_eur_m2", "terrain_eur_m2", "commerce_eur_m2")
+
+
+# -----------------------------
+# Encodage des colonnes
+# -----------------------------
+def _lettre(v) -> str:
+    # Cellule vide d'un CSV / Parquet (NaN, None) = lettre absente
+    return (v if isinstance(v, str) else "") or "C"
+
+
+def _peb_impact(v) -> str:
+    return _lettre(v).strip().upper()
+
+
+def _peb_indice(v) -> str:
+    return _lettre(v).upper()
+
+
+def encoder(valeurs, libelles, normaliser=None) -> np.ndarray:
+    """Convertit une colonne de libelles en codes entiers (-1 = libelle inconnu).
+
+    Une colonne deja entiere est consideree comme encodee (index dans ``libelles``).
+    """
+    arr = np.asarray(valeurs)
+    if arr.dtype.kind in "iu":
+        return np.where((arr >= 0) & (arr < len(libelles)), arr, -1).astype(np.intp)
+
+    index = {lib: i for i, lib in enumerate(libelles)}
+    memo = {}
+
+    def code(v):
+        try:
+            return memo[v]
+        except KeyError:
+            c = memo[v] = index.get(normaliser(v) if normaliser else v, -1)
+            return c
+
+    codes = np.fromiter(map(code, arr.ravel().tolist()), dtype=np.intp, count=arr.size)
+    return codes.reshape(arr.shape)
+
+
+def _choisir(codes: np.ndarray, valeurs, defaut: float = 0.0) -> np.ndarray:
+    """Equivalent vectorise de ``mapping.get(libelle, defaut)`` (code -1 = defaut).
+
+    ``valeurs`` peut contenir des scalaires ou des tableaux (balayage de parametres).
+    """
+    choix = [np.asarray(v, dtype=float) for v in valeurs] + [np.asarray(defaut, dtype=float)]
+    if all(c.ndim == 0 for c in choix):
+        return np.array(choix)[codes]
+    return np.choose(np.where(codes < 0, len(valeurs), codes), choix)
+
+
+def _table(params, correspondance: dict, libelles) -> list:
+    return [params[correspondance[lib]] for lib in libelles]
+
+
+def _f(params, key: str) -> np.ndarray:
+    return np.asarray(params[key], dtype=float)
+
+
+def _num(x) -> np.ndarray:
+    return np.asarray(x, dtype=float)
+
+
+def _ent(x) -> np.ndarray:
+    # int(x) scalaire = troncature vers zero
+    return np.trunc(np.asarray(x, dtype=float))
+
+
+def _bool(x) -> np.ndarray:
+    return np.asarray(x, dtype=bool)
+
+
+def _colonnes(colonnes) -> dict:
+    if isinstance(colonnes, np.ndarray) and colonnes.dtype.names:
+        return {name: colonnes[name] for name in colonnes.dtype.names}
+    return dict(colonnes)
+
+
+def colonnes_depuis_biens(biens: list) -> dict:
+    """Transpose une liste de dicts ``bien`` en colonnes NumPy (cle absente d'un dict : defaut ou NaN)."""
+    cles = []
+    for b in biens:
+        for k in b:
+            if k not in cles:
+                cles.append(k)
+    cols = {}
+    for k in cles:
+        defaut = COLONNES_DEFAUT.get(k, np.nan)
+        cols[k] = np.array([b.get(k, defaut) for b in biens])
+    return cols
+
+
+def resoudre_referentiel(zones: list, zone, type_bien) -> dict:
+    """Recherche (zone, type) dans le referentiel pour chaque ligne.
+
+    Retourne les colonnes ``base_eur_m2`` / ``terrain_eur_m2`` / ``commerce_eur_m2``
+    (NaN si absent) et le masque ``trouve``. Premiere ligne gagnante, comme la sidebar.
+    """
+    index = {}
+    for i, z in enumerate(zones):
+        index.setdefault((z["zone"], z["type"]), i)
+
+    zone = np.asarray(zone).ravel().tolist()
+    type_bien = np.asarray(type_bien).ravel().tolist()
+    pos = np.fromiter(
+        (index.get(k, -1) for k in zip(zone, type_bien)),
+        dtype=np.intp, count=len(zone),
+    )
+    trouve = pos >= 0
+
+    res = {"trouve": trouve}
+    for k in COLONNES_REFERENTIEL:
+        valeurs = np.array([float(z.get(k, 0)) for z in zones] + [np.nan])
+        res[k] = valeurs[pos]
+    return res
+
+
+# -----------------------------
+# Valorisation vectorisee
+# -----------------------------
+def valoriser_lot(colonnes, params, zones: list = None) -> dict:
+    """Valorise toutes les lignes en une passe.
+
+    ``colonnes`` : dict de tableaux (ou tableau structure) au format ``bien``.
+    Les valeurs du referentiel sont lues dans les colonnes ``base_eur_m2`` /
+    ``terrain_eur_m2`` / ``commerce_eur_m2`` ou, a defaut, resolues dans ``zones``
+    a partir des colonnes ``zone`` et ``type`` (lignes introuvables = NaN).
+
+    Retourne un dict de tableaux : marche, chaque impact, ``total``, ``indice``,
+    ``valeur_tech``, ``valeur_finale`` et la fourchette.
+    """
+    col = _colonnes(colonnes)
+    for k, v in COLONNES_DEFAUT.items():
+        col.setdefault(k, v)
+
+    res = {}
+    if all(k in col for k in COLONNES_REFERENTIEL):
+        ref = {k: _num(col[k]) for k in COLONNES_REFERENTIEL}
+    elif zones is not None:
+        ref = resoudre_referentiel(zones, col["zone"], col["type"])
+        res["trouve"] = ref["trouve"]
+    else:
+        raise KeyError("Colonnes base_eur_m2 / terrain_eur_m2 / commerce_eur_m2 absentes et aucun referentiel fourni")
+
+    type_code = encoder(col["type"], TYPES_BIEN)
+    maison = type_code == TYPES_BIEN.index("Maison")
+    appart = type_code == TYPES_BIEN.index("Appartement")
+    commerce = type_code == TYPES_BIEN.index("Commerce")
+
+    # Marche (calc_marche + apply_degressivity)
+    surface = _num(col["surface"])
+    base = ref["base_eur_m2"]
+    base_m2 = np.where(surface > _f(params, "seuil_degressif_m2"), base * (1.0 - _f(params, "degressif_pct")), base)
+    valeur_batie = surface * base_m2
+    valeur_terrain = np.where(maison, _num(col["terrain"]) * ref["terrain_eur_m2"], 0.0)
+    base_commerce = commerce & (base == 0)
+    base_m2 = np.where(base_commerce, ref["commerce_eur_m2"], base_m2)
+    valeur_batie = np.where(base_commerce, surface * ref["commerce_eur_m2"], valeur_batie)
+    res["base_eur_m2"] = base_m2
+    res["valeur_batie"] = valeur_batie
+    res["valeur_terrain"] = valeur_terrain
+    res["valeur_marche"] = valeur_batie + valeur_terrain
+
+    # Impacts
+    toit_code = encoder(col["toiture_etat"], TOITURE_ETATS)
+    chauff_code = encoder(col["chauffage_type"], CHAUFFAGE_TYPES)
+    vitrage_code = encoder(col["vitrage_type"], VITRAGE_TYPES)
+    cuisine_code = encoder(col["cuisine_etat"], ETATS_PIECE)
+    sdb_code = encoder(col["sdb_etat"], ETATS_PIECE)
+
+    toit = np.where(
+        _bool(col["toiture_grenier"]),
+        _f(params, "toit_base_avec_grenier") + _num(col["toiture_surface_grenier"]) * _f(params, "toit_eur_m2_grenier"),
+        _f(params, "toit_forfait_sans_grenier"),
+    )
+    toit = np.where(toit_code == TOITURE_ETATS.index("Moyenne"), toit * _f(params, "toit_etat_moyen_coeff"), toit)
+    toit = -np.abs(toit * _f(params, "toit_impact_factor"))
+    res["toiture"] = np.where(toit_code == TOITURE_ETATS.index("Parfaite"), 0.0, toit)
+
+    res["chauffage"] = _choisir(chauff_code, _table(params, PARAMS_CHAUFFAGE, CHAUFFAGE_TYPES))
+    res["vitrage"] = _choisir(vitrage_code, _table(params, PARAMS_VITRAGE, VITRAGE_TYPES))
+    res["peb"] = _choisir(
+        encoder(col["peb_lettre"], PEB_LETTRES, _peb_impact), _table(params, PARAMS_PEB, PEB_LETTRES)
+    )
+    res["cuisine"] = _choisir(cuisine_code, _table(params, PARAMS_CUISINE, ETATS_PIECE))
+    res["sdb_etat"] = _choisir(sdb_code, _table(params, PARAMS_SDB, ETATS_PIECE))
+
+    ref_chambres = np.where(maison, 3.0, 2.0)
+    if "nb_chambres" in col:
+        nb_chambres = _ent(col["nb_chambres"])
+        nb_chambres = np.where(np.isnan(nb_chambres), ref_chambres, nb_chambres)
+    else:
+        nb_chambres = ref_chambres
+    res["chambres"] = np.where(commerce, 0.0, (nb_chambres - ref_chambres) * _f(params, "impact_par_chambre"))
+    res["sdb_count"] = (_ent(col["nb_sdb"]) - 1.0) * _f(params, "impact_par_sdb_supp")
+
+    etage = _ent(col["etage"])
+    etage_impact = np.where(
+        _bool(col["ascenseur"]),
+        _f(params, "etage_avec_ascenseur_bonus"),
+        _f(params, "etage_sans_ascenseur_malus_par_niveau") * etage,
+    )
+    etage_impact = np.where(etage == 0, _f(params, "etage_rdc_malus"), etage_impact)
+    res["etage_appart"] = np.where(appart, etage_impact, 0.0)
+
+    res["parking_garage"] = (
+        _ent(col["nb_places_parking"]) * _f(params, "impact_par_place_parking")
+        + np.where(_bool(col["garage"]), _f(params, "impact_garage"), 0.0)
+    )
+    res["balcon_terrasse"] = (
+        np.where(_bool(col["balcon"]), _f(params, "impact_balcon"), 0.0)
+        + np.where(_bool(col["terrasse"]), _f(params, "impact_terrasse"), 0.0)
+    )
+    grenier = _f(params, "grenier_amenageable_base") + _num(col["grenier_amenageable_surface_m2"]) * _f(params, "grenier_amenageable_eur_m2")
+    res["jardin_cave_grenier"] = (
+        np.where(_bool(col["jardin"]), _f(params, "impact_jardin"), 0.0)
+        + np.where(_bool(col["cave"]), _f(params, "impact_cave"), 0.0)
+        + np.where(_bool(col["grenier_amenageable"]), grenier, 0.0)
+    )
+
+    total = res[IMPACT_KEYS[0]]
+    for k in IMPACT_KEYS[1:]:
+        total = total + res[k]
+    res["total"] = total
+
+    # Indice (moyenne des 6 notes, memes defauts que calc_indice)
+    notes = (
+        _choisir(toit_code, [NOTES_TOITURE[l] for l in TOITURE_ETATS], 6)
+        + _choisir(chauff_code, [NOTES_CHAUFFAGE[l] for l in CHAUFFAGE_TYPES], 6)
+        + _choisir(cuisine_code, [NOTES_CUISINE[l] for l in ETATS_PIECE], 5)
+        + _choisir(sdb_code, [NOTES_SDB[l] for l in ETATS_PIECE], 5)
+        + _choisir(vitrage_code, [NOTES_VITRAGE[l] for l in VITRAGE_TYPES], 6)
+        + _choisir(encoder(col["peb_lettre"], PEB_LETTRES, _peb_indice), [NOTES_PEB[l] for l in PEB_LETTRES], 6)
+    )
+    indice = notes / 6.0
+    res["indice"] = indice
+
+    # Synthese + fourchette (fourchette_from_indice)
+    res["valeur_tech"] = res["valeur_marche"] + total
+    res["valeur_finale"] = res["valeur_tech"] * (1.0 + _num(col["coef_expert_pct"]) / 100.0)
+
+    neutre = _f(params, "fourchette_neutre_pct")
+    paliers = [indice >= 8.0, indice >= 6.0, indice >= 4.0]
+    low_pct = np.select(paliers, [0.05, neutre, 0.08], 0.10)
+    high_pct = np.select(paliers, [0.08, neutre, 0.05], 0.04)
+    res["fourchette_basse"] = res["valeur_finale"] * (1.0 - low_pct)
+    res["fourchette_haute"] = res["valeur_finale"] * (1.0 + high_pct)
+    res["low_pct"] = low_pct
+    res["high_pct"] = high_pct
+
+    forme = np.broadcast_shapes(*(np.shape(v) for v in res.values()))
+    return {
+        k: (v if np.shape(v) == forme else np.broadcast_to(v, forme).copy())
+        for k, v in res.items()
+    }
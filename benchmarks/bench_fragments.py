@@ -0,0 +1,160 @@
+"""Latence d'un rerun complet vs rerun du seul fragment des champs techniques (serveur Streamlit reel).
+
+Le script lance ``streamlit run app.py`` (base d'historique temporaire), se
+connecte au websocket comme le ferait le navigateur, puis alterne deux
+requetes qui changent l'etat de la toiture :
+
+- rerun complet (comportement sans fragments) ;
+- rerun du fragment ``champs_techniques`` (ce que le navigateur envoie quand
+  un champ de l'onglet Technique change).
+
+Mesure : temps entre l'envoi et le message ``script_finished`` (calcul cote
+serveur + serialisation, hors rendu navigateur), et nombre de deltas envoyes.
+
+Usage :
+    python benchmarks/bench_fragments.py --n 30
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import AsyncHTTPClient
+from tornado.websocket import websocket_connect
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WIDGET_TECHNIQUE = "Etat toiture"
+NB_ETATS_TOITURE = 3
+
+
+def _port_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(valeurs: list, p: float) -> float:
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100.0 * (len(valeurs) - 1))))]
+
+
+class Session:
+    """Client websocket minimal : envoie des ``rerun_script`` et attend la fin du run."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = {}  # label -> (id, fragment_id)
+
+    async def rerun(self, widget_states=(), fragment_id: str = "") -> tuple:
+        msg = BackMsg()
+        msg.rerun_script.widget_states.widgets.extend(widget_states)
+        if fragment_id:
+            msg.rerun_script.fragment_id = fragment_id
+        t0 = time.perf_counter()
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        deltas = 0
+        while True:
+            brut = await self.ws.read_message()
+            if brut is None:
+                raise SystemExit("Connexion fermee par le serveur")
+            fm = ForwardMsg()
+            fm.ParseFromString(brut)
+            quoi = fm.WhichOneof("type")
+            if quoi == "delta":
+                deltas += 1
+                self._noter(fm.delta)
+            elif quoi == "script_finished":
+                if fm.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                return time.perf_counter() - t0, deltas
+
+    def _noter(self, delta):
+        if delta.WhichOneof("type") != "new_element":
+            return
+        element = getattr(delta.new_element, delta.new_element.WhichOneof("type"))
+        label, ident = getattr(element, "label", None), getattr(element, "id", None)
+        if label and ident:
+            self.widgets[label] = (ident, delta.fragment_id)
+
+
+def _etat_toiture(ident: str, i: int) -> WidgetState:
+    w = WidgetState(id=ident)
+    w.int_value = i % NB_ETATS_TOITURE
+    return w
+
+
+async def mesurer(url: str, n: int) -> dict:
+    client = AsyncHTTPClient()
+    limite = time.monotonic() + 60
+    while True:
+        try:
+            await client.fetch(f"{url}/_stcore/health")
+            break
+        except Exception:
+            if time.monotonic() > limite:
+                raise SystemExit("Streamlit ne repond pas sur /_stcore/health")
+            await asyncio.sleep(0.3)
+
+    ws = await websocket_connect(url.replace("http", "ws", 1) + "/_stcore/stream", max_message_size=64 * 1024 * 1024)
+    session = Session(ws)
+    await session.rerun()
+    if WIDGET_TECHNIQUE not in session.widgets:
+        raise SystemExit(f"Widget '{WIDGET_TECHNIQUE}' introuvable")
+    ident, fragment_id = session.widgets[WIDGET_TECHNIQUE]
+    if not fragment_id:
+        print("Attention: les champs techniques ne sont pas un fragment (rerun complet dans les deux cas).", file=sys.stderr)
+
+    mesures = {"complet": [], "fragment_technique": []}
+    deltas = {"complet": [], "fragment_technique": []}
+    for i in range(n):
+        for mode, frag in (("complet", ""), ("fragment_technique", fragment_id)):
+            duree, nb = await session.rerun([_etat_toiture(ident, i + 1)], frag)
+            mesures[mode].append(duree * 1000)
+            deltas[mode].append(nb)
+    ws.close()
+
+    return {
+        mode: {
+            "n": len(ms),
+            "p50_ms": round(_percentile(ms, 50), 2),
+            "p90_ms": round(_percentile(ms, 90), 2),
+            "moyenne_ms": round(statistics.mean(ms), 2),
+            "deltas_par_rerun": round(statistics.mean(deltas[mode]), 1),
+        }
+        for mode, ms in mesures.items()
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Rerun complet vs rerun du fragment des champs techniques.")
+    ap.add_argument("--n", type=int, default=30, help="Mesures par mode")
+    args = ap.parse_args(argv)
+
+    port = _port_libre()
+    env = {**os.environ, "ESTIMATEUR_DB": os.path.join(tempfile.mkdtemp(prefix="bench_"), "historique.sqlite3")}
+    serveur = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(RACINE, "app.py"),
+         "--server.headless", "true", "--server.port", str(port),
+         "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+        cwd=RACINE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        res = asyncio.run(mesurer(f"http://127.0.0.1:{port}", max(1, args.n)))
+    finally:
+        serveur.terminate()
+        serveur.wait()
+    print(json.dumps(res, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Temps d'import a froid des modules de calcul (sans Streamlit ni ReportLab).
+
+Chaque import est mesure dans un interpreteur neuf (meilleur de ``--repetitions``).
+Le script echoue (code 1) si le coeur ``calculs`` depasse ``--cible-ms`` ou si
+un module charge une dependance lourde qui doit rester paresseuse
+(Streamlit, ReportLab, PIL, pyarrow).
+
+Usage :
+    python benchmarks/bench_import.py --cible-ms 50
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ("calculs", "batch", "referentiel", "renovation", "historique", "revalorisation", "rapport", "estimer_lot", "service")
+INTERDITS = ("streamlit", "reportlab", "PIL", "pyarrow")
+CIBLE_MS = 50.0
+
+_SONDE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+duree = time.perf_counter() - t0
+print(json.dumps({{"ms": duree * 1000, "charges": [m for m in {interdits!r} if m in sys.modules]}}))
+"""
+
+
+def mesurer(module: str, repetitions: int) -> dict:
+    meilleur, charges = None, []
+    for _ in range(repetitions):
+        sortie = subprocess.run(
+            [sys.executable, "-c", _SONDE.format(module=module, interdits=INTERDITS)],
+            cwd=RACINE, capture_output=True, text=True, check=True,
+        ).stdout
+        res = json.loads(sortie)
+        meilleur = res["ms"] if meilleur is None else min(meilleur, res["ms"])
+        charges = res["charges"]
+    return {"import_ms": round(meilleur, 2), "dependances_lourdes": charges}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark du temps d'import a froid.")
+    ap.add_argument("--repetitions", type=int, default=5, help="Mesures par module (meilleur temps retenu)")
+    ap.add_argument("--cible-ms", type=float, default=CIBLE_MS, help=f"Cible pour calculs (defaut {CIBLE_MS} ms)")
+    args = ap.parse_args(argv)
+
+    resultats = {m: mesurer(m, max(1, args.repetitions)) for m in MODULES}
+    echecs = [f"{m}: charge {', '.join(r['dependances_lourdes'])}" for m, r in resultats.items() if r["dependances_lourdes"]]
+    if resultats["calculs"]["import_ms"] > args.cible_ms:
+        echecs.append(f"calculs: {resultats['calculs']['import_ms']} ms > cible {args.cible_ms} ms")
+
+    print(json.dumps({"cible_ms": args.cible_ms, "modules": resultats, "echecs": echecs}, indent=2))
+    return 1 if echecs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Temps de generation et taille du rapport PDF 3 pages.
+
+Usage :
+    python benchmarks/bench_rapport.py --n 20 --logo "chemin/logo.png"
+
+Le premier rapport (decodage du logo a froid) est mesure a part ; la sortie
+est un JSON sur stdout, a comparer entre deux versions du code.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rapport  # noqa: E402
+from calculs import DEFAULT_PARAMS, DEFAULT_ZONES, valoriser  # noqa: E402
+
+BIEN_EXEMPLE = {
+    "client": "Dossier benchmark",
+    "adresse": "Rue de l'Exemple 12",
+    "commune": "Namur",
+    "type": "Maison",
+    "zone": "Namur - Centre",
+    "surface": 180.0,
+    "terrain": 450.0,
+    "nb_chambres": 4,
+    "nb_sdb": 2,
+    "etage": 0,
+    "ascenseur": False,
+    "nb_places_parking": 1,
+    "garage": True,
+    "balcon": False,
+    "terrasse": True,
+    "jardin": True,
+    "cave": True,
+    "grenier_amenageable": True,
+    "grenier_amenageable_surface_m2": 30.0,
+    "nb_etages": 2,
+    "surfaces_etages": [100.0, 80.0],
+    "coef_expert_pct": 1.5,
+    "justif_coef": "Quartier recherche",
+    "toiture_grenier": True,
+    "toiture_surface_grenier": 40.0,
+    "toiture_etat": "Moyenne",
+    "chauffage_type": "Mazout",
+    "cuisine_etat": "A moderniser",
+    "sdb_etat": "Bonne",
+    "vitrage_type": "Double ancien",
+    "peb_lettre": "D",
+    "peb_kwh": 310.0,
+}
+
+
+def generer(bien: dict = BIEN_EXEMPLE) -> bytes:
+    zone_row = next(z for z in DEFAULT_ZONES if z["zone"] == bien["zone"] and z["type"] == bien["type"])
+    valo = valoriser(zone_row, bien, DEFAULT_PARAMS)
+    return rapport.build_pdf_3pages(
+        bien=bien,
+        zone_row=zone_row,
+        marche=valo.marche,
+        impacts=valo.impacts,
+        indice=valo.indice,
+        coef_expert_pct=float(bien["coef_expert_pct"]),
+        valeur_tech=valo.valeur_tech,
+        valeur_finale=valo.valeur_finale,
+        low=valo.low,
+        high=valo.high,
+        low_pct=valo.low_pct,
+        high_pct=valo.high_pct,
+    )
+
+
+def mesurer(n: int) -> dict:
+    t0 = time.perf_counter()
+    pdf = generer()
+    premier = time.perf_counter() - t0
+
+    durees = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        pdf = generer()
+        durees.append(time.perf_counter() - t0)
+
+    return {
+        "n": n,
+        "premier_ms": round(premier * 1000, 2),
+        "median_ms": round(statistics.median(durees) * 1000, 2),
+        "moyenne_ms": round(statistics.mean(durees) * 1000, 2),
+        "taille_octets": len(pdf),
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark du rapport PDF 3 pages.")
+    ap.add_argument("--n", type=int, default=20, help="Nombre de rapports mesures (apres le premier)")
+    ap.add_argument("--logo", help="Chemin du logo (defaut: rapport.LOGO_PATH)")
+    args = ap.parse_args(argv)
+
+    if args.logo:
+        rapport.LOGO_PATH = args.logo
+    print(json.dumps(mesurer(max(1, args.n)), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+"""Test de charge multi-sessions de l'application Streamlit (serveur reel, clients websocket).
+
+Pour chaque nombre de sessions demande, le script demarre ``streamlit run app.py``
+(historique et referentiel dans un dossier temporaire), ouvre N connexions
+websocket comme autant de navigateurs et fait suivre a chacune le parcours
+d'un agent, ``--parcours`` fois :
+
+1. barre laterale : client, adresse, commune, type, zone (ligne du referentiel par
+   defaut), surface (un rerun complet par champ) ;
+2. onglet Technique : toiture, chauffage, vitrage (reruns du fragment) ;
+3. rapport PDF : preparation puis telechargement (GET de l'URL media) ;
+4. sauvegarde dans l'historique.
+
+Mesures par nombre de sessions : latences p50 / p90 / p99 (envoi ->
+``script_finished`` ; telechargement : requete HTTP) par etape et au total,
+debit, CPU du serveur (temps processeur / duree de la charge) et RSS de
+pointe (``VmHWM``), aussi ramenee a une session (pointe moins RSS du serveur
+avant toute connexion, divise par N). CPU et memoire sont lus dans /proc
+(Linux ; None ailleurs). Client et serveur partagent la machine : sur peu de
+coeurs, le client prend une part (faible) du CPU.
+
+Usage :
+    python benchmarks/charge_app.py --sessions 1,2,4,8 --parcours 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import AsyncHTTPClient
+from tornado.websocket import websocket_connect
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+from calculs import DEFAULT_ZONES, TYPES_BIEN  # noqa: E402
+
+GRAINE = 1234
+
+BOUTON_RAPPORT = "Preparer le rapport vendeur (PDF - 3 pages)"
+BOUTON_SAUVEGARDE = "Enregistrer cette estimation"
+COMMUNES = ("Namur", "Jambes", "Liege", "Charleroi", "Wavre")
+
+
+def _port_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(valeurs: list, p: float) -> float:
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100.0 * (len(valeurs) - 1))))]
+
+
+def _resume(ms: list) -> dict:
+    if not ms:
+        return {"n": 0}
+    return {
+        "n": len(ms),
+        "p50_ms": round(_percentile(ms, 50), 1),
+        "p90_ms": round(_percentile(ms, 90), 1),
+        "p99_ms": round(_percentile(ms, 99), 1),
+        "moyenne_ms": round(statistics.mean(ms), 1),
+    }
+
+
+# -----------------------------
+# Mesures du processus serveur (/proc)
+# -----------------------------
+def _cpu_s(pid: int):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            champs = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    # utime, stime (champs 14 et 15 de stat)
+    return (int(champs[11]) + int(champs[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _memoire_mo(pid: int, cle: str):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for ligne in f:
+                if ligne.startswith(cle + ":"):
+                    return int(ligne.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+# -----------------------------
+# Client
+# -----------------------------
+class Navigateur:
+    """Une session : websocket, etat des widgets renvoye a chaque rerun comme le ferait le navigateur."""
+
+    def __init__(self, ws, http, url: str):
+        self.ws = ws
+        self.http = http
+        self.url = url
+        self.widgets = {}  # label -> (id, fragment_id, type, element) ; premier widget du label dans le script
+        self.etats = {}  # id -> WidgetState
+        self.url_rapport = None
+        self.erreurs = 0
+
+    async def rerun(self, fragment_id: str = "", declencheur: WidgetState = None) -> float:
+        msg = BackMsg()
+        msg.rerun_script.widget_states.widgets.extend(self.etats.values())
+        if declencheur is not None:
+            msg.rerun_script.widget_states.widgets.append(declencheur)
+        if fragment_id:
+            msg.rerun_script.fragment_id = fragment_id
+        vus = set()
+        t0 = time.perf_counter()
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        while True:
+            brut = await self.ws.read_message()
+            if brut is None:
+                raise ConnectionError("Connexion fermee par le serveur")
+            fm = ForwardMsg()
+            fm.ParseFromString(brut)
+            quoi = fm.WhichOneof("type")
+            if quoi == "delta":
+                self._noter(fm.delta, vus)
+            elif quoi == "script_finished":
+                if fm.script_finished == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    continue
+                if fm.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    self.erreurs += 1
+                return time.perf_counter() - t0
+
+    def _noter(self, delta, vus: set):
+        if delta.WhichOneof("type") != "new_element":
+            return
+        genre = delta.new_element.WhichOneof("type")
+        element = getattr(delta.new_element, genre)
+        if genre == "exception":
+            self.erreurs += 1
+        if genre == "download_button":
+            self.url_rapport = element.url
+        label, ident = getattr(element, "label", None), getattr(element, "id", None)
+        if label and ident and label not in vus:
+            vus.add(label)
+            self.widgets[label] = (ident, delta.fragment_id, genre, element)
+
+    async def saisir(self, label: str, valeur) -> float:
+        """Change un widget (texte, nombre, index de selectbox, case) : rerun complet ou du fragment."""
+        ident, fragment_id, genre, _ = self.widgets[label]
+        w = WidgetState(id=ident)
+        if genre == "text_input":
+            w.string_value = valeur
+        elif genre == "number_input":
+            w.double_value = float(valeur)
+        elif genre == "checkbox":
+            w.bool_value = bool(valeur)
+        else:
+            w.int_value = int(valeur)
+        self.etats[ident] = w
+        return await self.rerun(fragment_id)
+
+    async def cliquer(self, label: str) -> float:
+        ident, fragment_id, _, _ = self.widgets[label]
+        w = WidgetState(id=ident)
+        w.trigger_value = True
+        return await self.rerun(fragment_id, declencheur=w)
+
+    def nb_options(self, label: str) -> int:
+        return len(self.widgets[label][3].options)
+
+    def index_option(self, label: str, option: str) -> int:
+        return list(self.widgets[label][3].options).index(option)
+
+    async def telecharger(self) -> float:
+        t0 = time.perf_counter()
+        await self.http.fetch(self.url + self.url_rapport, request_timeout=120)
+        return time.perf_counter() - t0
+
+
+async def parcours(nav: Navigateur, rng: random.Random, latences: dict, pause: float):
+    """Un dossier de bout en bout ; durees (ms) ajoutees a ``latences[etape]``."""
+
+    async def noter(etape: str, attente):
+        latences.setdefault(etape, []).append(await attente * 1000)
+        if pause:
+            await asyncio.sleep(rng.uniform(0, 2 * pause))
+
+    await noter("barre_laterale", nav.saisir("Client (interne)", f"Client {rng.randrange(10_000)}"))
+    await noter("barre_laterale", nav.saisir("Adresse", f"{rng.randrange(1, 200)} rue de la Gare"))
+    await noter("barre_laterale", nav.saisir("Commune", rng.choice(COMMUNES)))
+    ligne = rng.choice(DEFAULT_ZONES)
+    await noter("barre_laterale", nav.saisir("Type", TYPES_BIEN.index(ligne["type"])))
+    await noter("barre_laterale", nav.saisir("Zone", nav.index_option("Zone", ligne["zone"])))
+    await noter("barre_laterale", nav.saisir("Surface totale (m2)", rng.randrange(50, 250)))
+
+    for label in ("Etat toiture", "Type de chauffage", "Type de vitrage"):
+        await noter("technique", nav.saisir(label, rng.randrange(nav.nb_options(label))))
+
+    nav.url_rapport = None
+    await noter("rapport", nav.cliquer(BOUTON_RAPPORT))
+    if nav.url_rapport:
+        await noter("telechargement", nav.telecharger())
+    else:
+        nav.erreurs += 1
+
+    await noter("sauvegarde", nav.cliquer(BOUTON_SAUVEGARDE))
+
+
+async def _attendre(http, url: str, delai: float = 60.0):
+    limite = time.monotonic() + delai
+    while True:
+        try:
+            await http.fetch(f"{url}/_stcore/health")
+            return
+        except Exception:
+            if time.monotonic() > limite:
+                raise SystemExit("Streamlit ne repond pas sur /_stcore/health")
+            await asyncio.sleep(0.3)
+
+
+async def charger(url: str, pid: int, sessions: int, n_parcours: int, pause: float) -> dict:
+    http = AsyncHTTPClient(max_clients=max(10, sessions))
+    await _attendre(http, url)
+    rss_serveur = _memoire_mo(pid, "VmRSS")
+    ws_url = url.replace("http", "ws", 1) + "/_stcore/stream"
+    navigateurs = [
+        Navigateur(await websocket_connect(ws_url, max_message_size=64 * 1024 * 1024), http, url)
+        for _ in range(sessions)
+    ]
+    latences = {}
+    # Premier chargement de chaque page (hors mesure de charge : demarrage des sessions)
+    latences["chargement"] = [await nav.rerun() * 1000 for nav in navigateurs]
+
+    rss_depart = _memoire_mo(pid, "VmRSS")
+    cpu_depart = _cpu_s(pid)
+    t0 = time.perf_counter()
+
+    async def session(i: int, nav: Navigateur):
+        rng = random.Random(GRAINE + i)
+        for _ in range(n_parcours):
+            await parcours(nav, rng, latences, pause)
+
+    await asyncio.gather(*(session(i, nav) for i, nav in enumerate(navigateurs)))
+    duree = time.perf_counter() - t0
+    cpu_fin = _cpu_s(pid)
+    for nav in navigateurs:
+        nav.ws.close()
+
+    reruns = [ms for etape, ms in latences.items() if etape not in ("chargement", "telechargement") for ms in ms]
+    rss_pic = _memoire_mo(pid, "VmHWM")
+    return {
+        "sessions": sessions,
+        "parcours_par_session": n_parcours,
+        "reruns": len(reruns),
+        "erreurs": sum(nav.erreurs for nav in navigateurs),
+        "duree_s": round(duree, 2),
+        "debit_reruns_s": round(len(reruns) / duree, 2) if duree else None,
+        "cpu_serveur_pct": round(100.0 * (cpu_fin - cpu_depart) / duree, 1) if cpu_depart is not None and duree else None,
+        "rss_serveur_seul_mo": round(rss_serveur, 1) if rss_serveur is not None else None,
+        "rss_depart_mo": round(rss_depart, 1) if rss_depart is not None else None,
+        "rss_pic_mo": round(rss_pic, 1) if rss_pic is not None else None,
+        "rss_par_session_mo": round((rss_pic - rss_serveur) / sessions, 1) if rss_pic is not None else None,
+        "latences": {"reruns": _resume(reruns), **{etape: _resume(ms) for etape, ms in latences.items()}},
+    }
+
+
+def mesurer(sessions: int, n_parcours: int, pause: float) -> dict:
+    """Un serveur neuf par palier : RSS de pointe et historique propres a ce nombre de sessions."""
+    port = _port_libre()
+    dossier = tempfile.mkdtemp(prefix="charge_app_")
+    env = {
+        **os.environ,
+        "ESTIMATEUR_DB": os.path.join(dossier, "historique.sqlite3"),
+        "ESTIMATEUR_REFERENTIEL": os.path.join(dossier, "referentiel.json"),
+    }
+    serveur = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(RACINE, "app.py"),
+         "--server.headless", "true", "--server.port", str(port),
+         "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+        cwd=RACINE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        return asyncio.run(charger(f"http://127.0.0.1:{port}", serveur.pid, sessions, n_parcours, pause))
+    finally:
+        serveur.terminate()
+        serveur.wait()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Test de charge multi-sessions de app.py.")
+    ap.add_argument("--sessions", default="1,2,4,8", help="Nombres de sessions simultanees (liste)")
+    ap.add_argument("--parcours", type=int, default=3, help="Parcours complets par session")
+    ap.add_argument("--pause", type=float, default=0.0,
+                    help="Temps de reflexion moyen entre deux actions (s ; 0 = enchainement immediat)")
+    ap.add_argument("--sortie", help="Ecrire le JSON dans ce fichier (defaut: stdout)")
+    args = ap.parse_args(argv)
+
+    paliers = [max(1, int(n)) for n in args.sessions.split(",") if n.strip()]
+    resultats = []
+    for n in paliers:
+        res = mesurer(n, max(1, args.parcours), max(0.0, args.pause))
+        lat = res["latences"]["reruns"]
+        print(
+            f"{n} session(s): rerun p50 {lat.get('p50_ms')} ms, p99 {lat.get('p99_ms')} ms, "
+            f"CPU {res['cpu_serveur_pct']}%, RSS pic {res['rss_pic_mo']} Mo, erreurs {res['erreurs']}",
+            file=sys.stderr,
+        )
+        resultats.append(res)
+
+    texte = json.dumps({
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpu": os.cpu_count(),
+            "pause_s": args.pause,
+        },
+        "resultats": resultats,
+    }, indent=2)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            f.write(texte + "\n")
+    else:
+        print(texte)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
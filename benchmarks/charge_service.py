@@ -0,0 +1,133 @@
+"""Test de charge du service HTTP de valorisation (latences p50 / p90 / p99).
+
+Usage :
+    python benchmarks/charge_service.py --lancer --endpoint estimation --n 2000 --concurrence 32
+    python benchmarks/charge_service.py --url http://127.0.0.1:8600 --endpoint rapport --n 200 --concurrence 8
+
+``--lancer`` demarre ``service.py`` dans un sous-processus (port libre) le temps
+de la mesure. La sortie est un JSON sur stdout, a comparer entre deux versions.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+
+from bench_rapport import BIEN_EXEMPLE  # noqa: E402
+
+ENDPOINTS = ("estimation", "estimations", "rapport")
+
+
+def _port_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _corps(endpoint: str, lot: int, i: int) -> bytes:
+    # Surface variable : chaque requete est un dossier different (pas de cache)
+    bien = {**BIEN_EXEMPLE, "surface": 80.0 + (i % 2000) / 10.0}
+    if endpoint == "estimations":
+        return json.dumps({"biens": [{**bien, "surface": 80.0 + j % 200} for j in range(lot)]}).encode()
+    return json.dumps({"bien": bien}).encode()
+
+
+def _percentile(valeurs: list, p: float) -> float:
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100.0 * (len(valeurs) - 1))))]
+
+
+async def charger(url: str, endpoint: str, n: int, concurrence: int, lot: int) -> dict:
+    client = AsyncHTTPClient(max_clients=concurrence)
+    cible = f"{url.rstrip('/')}/{endpoint}"
+    latences, erreurs = [], {}
+    compteur = iter(range(n))
+
+    async def worker():
+        for i in compteur:
+            t0 = time.perf_counter()
+            try:
+                await client.fetch(cible, method="POST", body=_corps(endpoint, lot, i), request_timeout=300)
+                latences.append(time.perf_counter() - t0)
+            except HTTPClientError as e:
+                erreurs[e.code] = erreurs.get(e.code, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrence)))
+    duree = time.perf_counter() - t0
+    client.close()
+
+    ms = [l * 1000 for l in latences]
+    return {
+        "endpoint": endpoint,
+        "n": n,
+        "concurrence": concurrence,
+        "lot": lot if endpoint == "estimations" else 1,
+        "ok": len(latences),
+        "erreurs": erreurs,
+        "debit_req_s": round(len(latences) / duree, 1) if duree else 0.0,
+        "p50_ms": round(_percentile(ms, 50), 2) if ms else None,
+        "p90_ms": round(_percentile(ms, 90), 2) if ms else None,
+        "p99_ms": round(_percentile(ms, 99), 2) if ms else None,
+        "moyenne_ms": round(statistics.mean(ms), 2) if ms else None,
+    }
+
+
+async def _attendre(url: str, delai: float = 30.0):
+    client = AsyncHTTPClient()
+    limite = time.monotonic() + delai
+    while True:
+        try:
+            await client.fetch(f"{url}/sante")
+            return
+        except Exception:
+            if time.monotonic() > limite:
+                raise SystemExit("Le service ne repond pas sur /sante")
+            await asyncio.sleep(0.2)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Test de charge du service de valorisation.")
+    ap.add_argument("--url", default="http://127.0.0.1:8600", help="URL du service")
+    ap.add_argument("--lancer", action="store_true", help="Demarrer service.py pour la mesure")
+    ap.add_argument("--workers", type=int, default=None, help="Processus PDF du service lance (--lancer)")
+    ap.add_argument("--endpoint", choices=ENDPOINTS, default="estimation")
+    ap.add_argument("--n", type=int, default=1000, help="Nombre de requetes")
+    ap.add_argument("--concurrence", type=int, default=16, help="Requetes simultanees")
+    ap.add_argument("--lot", type=int, default=100, help="Biens par requete (endpoint estimations)")
+    args = ap.parse_args(argv)
+
+    service = None
+    url = args.url
+    if args.lancer:
+        port = _port_libre()
+        url = f"http://127.0.0.1:{port}"
+        cmd = [sys.executable, os.path.join(RACINE, "service.py"), "--port", str(port)]
+        if args.workers:
+            cmd += ["--workers", str(args.workers)]
+        service = subprocess.Popen(cmd, cwd=RACINE, stderr=subprocess.DEVNULL)
+
+    try:
+        async def mesurer():
+            await _attendre(url)
+            return await charger(url, args.endpoint, max(1, args.n), max(1, args.concurrence), max(1, args.lot))
+
+        print(json.dumps(asyncio.run(mesurer()), indent=2))
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
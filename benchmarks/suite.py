@@ -0,0 +1,248 @@
+"""Suite de benchmarks des chemins critiques (valorisation, rapport, rerun Streamlit).
+
+Cas mesures :
+- ``calc_marche``, chaque ``calc_*_impact``, ``calc_indice`` (par appel) ;
+- valorisation complete d'un portefeuille synthetique de N biens, en boucle
+  scalaire (``valoriser`` sans cache) et en une passe (``batch.valoriser_lot``) ;
+- ``build_pdf_3pages`` ;
+- un rerun de ``app.py`` via ``streamlit.testing.v1.AppTest``.
+
+Les donnees sont tirees avec une graine fixe. Chaque cas est repete
+``--repetitions`` fois (ramasse-miettes coupe, comme ``timeit``) ; la mediane
+et le minimum sont enregistres, la comparaison porte sur le minimum (moins
+sensible au bruit de la machine).
+
+Usage :
+    python benchmarks/suite.py --sortie base.json
+    python benchmarks/suite.py --comparer base.json --seuil 0.15
+    python benchmarks/suite.py --filtre impact --rapide
+
+``--comparer`` signale (code 1) tout cas plus lent que la base de plus de ``--seuil``.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+RACINE = os.path.dirname(BENCHMARKS)
+# Explicite : bench_rapport doit etre importable meme lance par ``python -m`` ou importe
+sys.path[:0] = [RACINE, BENCHMARKS]
+
+import calculs  # noqa: E402
+from batch import colonnes_depuis_biens, valoriser_lot  # noqa: E402
+from bench_rapport import BIEN_EXEMPLE, generer  # noqa: E402
+from calculs import (  # noqa: E402
+    CHAUFFAGE_TYPES,
+    DEFAULT_PARAMS,
+    DEFAULT_ZONES,
+    ETATS_PIECE,
+    PEB_LETTRES,
+    TOITURE_ETATS,
+    VITRAGE_TYPES,
+    compile_params,
+)
+
+GRAINE = 1234
+N_PORTEFEUILLE = 10_000
+SEUIL_DEFAUT = 0.15
+
+IMPACTS = (
+    "calc_toiture_impact", "calc_chauffage_impact", "calc_cuisine_impact", "calc_sdb_etat_impact",
+    "calc_vitrage_impact", "calc_peb_impact", "calc_chambres_impact", "calc_sdb_count_impact",
+    "calc_etage_appart_impact", "calc_parking_garage_impact", "calc_balcon_terrasse_impact",
+    "calc_jardin_cave_grenier_impact",
+)
+
+
+def portefeuille(n: int, graine: int = GRAINE) -> list:
+    """N dossiers synthetiques (zones/types du referentiel par defaut)."""
+    rng = random.Random(graine)
+    biens = []
+    for _ in range(n):
+        z = rng.choice(DEFAULT_ZONES)
+        biens.append({
+            **BIEN_EXEMPLE,
+            "zone": z["zone"],
+            "type": z["type"],
+            "surface": round(rng.uniform(40, 300), 1),
+            "terrain": round(rng.uniform(0, 1000), 1),
+            "nb_chambres": rng.randint(0, 6),
+            "nb_sdb": rng.randint(1, 3),
+            "etage": rng.randint(0, 6),
+            "ascenseur": rng.random() < 0.5,
+            "nb_places_parking": rng.randint(0, 2),
+            "garage": rng.random() < 0.3,
+            "toiture_etat": rng.choice(TOITURE_ETATS),
+            "chauffage_type": rng.choice(CHAUFFAGE_TYPES),
+            "cuisine_etat": rng.choice(ETATS_PIECE),
+            "sdb_etat": rng.choice(ETATS_PIECE),
+            "vitrage_type": rng.choice(VITRAGE_TYPES),
+            "peb_lettre": rng.choice(PEB_LETTRES),
+            "coef_expert_pct": round(rng.uniform(-3, 3), 1),
+        })
+    return biens
+
+
+def _zone_row(bien: dict) -> dict:
+    return next(z for z in DEFAULT_ZONES if z["zone"] == bien["zone"] and z["type"] == bien["type"])
+
+
+# -----------------------------
+# Mesure
+# -----------------------------
+def chronometrer(fn, repetitions: int, boucle: int = 1) -> dict:
+    """Duree par appel de ``fn`` (mediane / min sur ``repetitions`` series de ``boucle`` appels)."""
+    fn()  # chauffe (imports paresseux, caches de module)
+    durees = []
+    gc_actif = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repetitions):
+            t0 = time.perf_counter()
+            for _ in range(boucle):
+                fn()
+            durees.append((time.perf_counter() - t0) / boucle)
+    finally:
+        if gc_actif:
+            gc.enable()
+    return {
+        "median_s": statistics.median(durees),
+        "min_s": min(durees),
+        "repetitions": repetitions,
+        "boucle": boucle,
+    }
+
+
+def cas(n: int) -> dict:
+    """Nom -> (fonction, appels par serie)."""
+    p = compile_params(DEFAULT_PARAMS)
+    bien = dict(BIEN_EXEMPLE)
+    zone_row = _zone_row(bien)
+    biens = portefeuille(n)
+    zones = [_zone_row(b) for b in biens]
+    colonnes = colonnes_depuis_biens(biens)
+
+    def valoriser_portefeuille():
+        calculs._valoriser_memo.cache_clear()
+        calculs._marche_memo.cache_clear()
+        for z, b in zip(zones, biens):
+            calculs.valoriser(z, b, p)
+
+    tous = {
+        "calc_marche": (lambda: calculs.calc_marche(zone_row, bien, p), 20_000),
+        **{nom: ((lambda f: lambda: f(bien, p))(getattr(calculs, nom)), 20_000) for nom in IMPACTS},
+        "calc_indice": (lambda: calculs.calc_indice(bien), 20_000),
+        f"portefeuille_scalaire_{n}": (valoriser_portefeuille, 1),
+        f"portefeuille_lot_{n}": (lambda: valoriser_lot(colonnes, p, DEFAULT_ZONES), 1),
+        "build_pdf_3pages": (generer, 5),
+        "streamlit_rerun": (_rerun_streamlit(), 1),
+    }
+    return tous
+
+
+def _rerun_streamlit():
+    """Rerun complet de app.py (AppTest) ; historique et referentiel partage dans un dossier temporaire."""
+    etat = {}
+
+    def rerun():
+        if "at" not in etat:
+            from streamlit.testing.v1 import AppTest
+
+            dossier = tempfile.mkdtemp(prefix="bench_")
+            os.environ["ESTIMATEUR_DB"] = os.path.join(dossier, "historique.sqlite3")
+            os.environ["ESTIMATEUR_REFERENTIEL"] = os.path.join(dossier, "referentiel.json")
+            etat["at"] = AppTest.from_file(os.path.join(RACINE, "app.py"), default_timeout=60)
+        etat["at"].run()
+        if etat["at"].exception:
+            raise RuntimeError(etat["at"].exception[0].value)
+
+    return rerun
+
+
+def executer(n: int, repetitions: int, filtre: str = None) -> dict:
+    resultats = {}
+    for nom, (fn, boucle) in cas(n).items():
+        if filtre and filtre not in nom:
+            continue
+        try:
+            resultats[nom] = chronometrer(fn, repetitions, boucle)
+        except ImportError as e:
+            resultats[nom] = {"ignore": f"{type(e).__name__}: {e}"}
+        print(f"{nom}: {_format(resultats[nom])}", file=sys.stderr)
+    return {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "plateforme": platform.platform(),
+            "cpu": os.cpu_count(),
+            "n_portefeuille": n,
+            "graine": GRAINE,
+        },
+        "resultats": resultats,
+    }
+
+
+def _format(r: dict, cle: str = "median_s") -> str:
+    if "ignore" in r:
+        return f"ignore ({r['ignore']})"
+    s = r[cle]
+    return f"{s * 1e6:.2f} us" if s < 1e-3 else f"{s * 1e3:.2f} ms"
+
+
+# -----------------------------
+# Comparaison
+# -----------------------------
+def comparer(base: dict, courant: dict, seuil: float) -> list:
+    """Lignes (nom, base, courant, ratio, regression) pour les cas presents des deux cotes."""
+    lignes = []
+    for nom, r in courant["resultats"].items():
+        b = base["resultats"].get(nom)
+        if not b or "min_s" not in b or "min_s" not in r:
+            continue
+        ratio = r["min_s"] / b["min_s"] if b["min_s"] else float("inf")
+        lignes.append((nom, b, r, ratio, ratio > 1.0 + seuil))
+    return lignes
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Suite de benchmarks (valorisation, rapport, rerun Streamlit).")
+    ap.add_argument("--n", type=int, default=N_PORTEFEUILLE, help=f"Taille du portefeuille (defaut {N_PORTEFEUILLE})")
+    ap.add_argument("--repetitions", type=int, default=7, help="Series par cas (minimum compare, mediane rapportee)")
+    ap.add_argument("--rapide", action="store_true", help="3 series par cas")
+    ap.add_argument("--filtre", help="Ne mesurer que les cas dont le nom contient ce texte")
+    ap.add_argument("--sortie", help="Ecrire les resultats JSON dans ce fichier (defaut: stdout)")
+    ap.add_argument("--comparer", help="Base JSON : signaler les regressions")
+    ap.add_argument("--seuil", type=float, default=SEUIL_DEFAUT, help=f"Regression toleree (defaut {SEUIL_DEFAUT:.0%})")
+    args = ap.parse_args(argv)
+
+    res = executer(max(1, args.n), 3 if args.rapide else max(1, args.repetitions), args.filtre)
+    texte = json.dumps(res, indent=2)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            f.write(texte + "\n")
+    elif not args.comparer:
+        print(texte)
+
+    if not args.comparer:
+        return 0
+    with open(args.comparer, encoding="utf-8") as f:
+        base = json.load(f)
+    regressions = 0
+    for nom, b, r, ratio, regression in comparer(base, res, args.seuil):
+        regressions += regression
+        print(f"{'REGRESSION' if regression else 'ok':<10} {nom:<36} {_format(b, 'min_s'):>12} -> {_format(r, 'min_s'):>12}  x{ratio:.2f}")
+    if base["meta"].get("n_portefeuille") != res["meta"]["n_portefeuille"]:
+        print("Attention: taille de portefeuille differente de la base.", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
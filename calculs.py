@@ -0,0 +1,668 @@
+"""Coeur de calcul de l'estimateur (referentiel, parametres, impacts, indice).
+
+Module sans dependance a Streamlit ni a ReportLab : il est importe par
+``app.py`` et par les outils de traitement par lot.
+"""
+import hashlib
+import json
+import math
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import date
+from functools import lru_cache
+from types import MappingProxyType
+
+from profilage import mesurer
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def euro(x: float) -> str:
+    s = f"{x:,.0f}".replace(",", " ")
+    return f"{s} €"
+
+
+def safe_text(x: str, max_len: int = 120) -> str:
+    return (x or "").strip()[:max_len]
+
+
+# -----------------------------
+# Defaults (référentiel + paramètres)
+# -----------------------------
+DEFAULT_ZONES = [
+    {"zone": "Namur - Centre", "type": "Maison", "base_eur_m2": 2150, "terrain_eur_m2": 20, "commerce_eur_m2": 0},
+    {"zone": "Namur - Centre", "type": "Appartement", "base_eur_m2": 2350, "terrain_eur_m2": 0, "commerce_eur_m2": 0},
+    {"zone": "Charleroi", "type": "Maison", "base_eur_m2": 1550, "terrain_eur_m2": 12, "commerce_eur_m2": 0},
+    {"zone": "Charleroi", "type": "Appartement", "base_eur_m2": 1700, "terrain_eur_m2": 0, "commerce_eur_m2": 0},
+    {"zone": "Liege - Axe commercial", "type": "Commerce", "base_eur_m2": 0, "terrain_eur_m2": 0, "commerce_eur_m2": 2400},
+]
+
+DEFAULT_PARAMS = {
+    # Dégressivité surface
+    "seuil_degressif_m2": 160,
+    "degressif_pct": 0.06,
+
+    # Fourchette "neutre" (sera modulée par l'indice)
+    "fourchette_neutre_pct": 0.06,
+
+    # Toiture (forfait + option grenier)
+    "toit_forfait_sans_grenier": 18000,
+    "toit_base_avec_grenier": 10000,
+    "toit_eur_m2_grenier": 130,
+    "toit_impact_factor": 0.70,
+    "toit_etat_moyen_coeff": 0.50,
+
+    # Chauffage (impacts)
+    "chauff_pac": 8000,
+    "chauff_gaz_cond": 3000,
+    "chauff_mazout": -5000,
+    "chauff_electrique": -8000,
+    "chauff_ancien": -10000,
+
+    # Cuisine (impacts)
+    "cuisine_bonne": 0,
+    "cuisine_moderniser": -5000,
+    "cuisine_remplacer": -12000,
+
+    # Salle de bain état (impacts)
+    "sdb_bonne": 0,
+    "sdb_moderniser": -4000,
+    "sdb_remplacer": -9000,
+
+    # Châssis / vitrages (impacts)
+    "vitrage_simple": -8000,
+    "vitrage_double_ancien": -3000,
+    "vitrage_double_recent": 0,
+    "vitrage_triple": 4000,
+
+    # PEB (impacts)
+    "peb_A": 6000,
+    "peb_B": 3000,
+    "peb_C": 0,
+    "peb_D": -3000,
+    "peb_E": -6000,
+    "peb_F": -9000,
+    "peb_G": -12000,
+
+    # Chambres
+    "impact_par_chambre": 8000,
+
+    # Nombre de salles de bain (référence 1)
+    "impact_par_sdb_supp": 6000,
+
+    # Étage appartement (étage + ascenseur)
+    "etage_avec_ascenseur_bonus": 4000,
+    "etage_sans_ascenseur_malus_par_niveau": -2500,
+    "etage_rdc_malus": 0,
+
+    # Parking / Garage
+    "impact_par_place_parking": 8000,
+    "impact_garage": 15000,
+
+    # Balcon / Terrasse
+    "impact_balcon": 5000,
+    "impact_terrasse": 10000,
+
+    # Jardin / Cave
+    "impact_jardin": 12000,
+    "impact_cave": 4000,
+
+    # Grenier aménageable (surface)
+    "grenier_amenageable_base": 5000,
+    "grenier_amenageable_eur_m2": 120,
+
+    # Coefficient expert
+    "coef_expert_min": -3.0,
+    "coef_expert_max": 3.0,
+}
+
+
+# -----------------------------
+# Listes de choix (formulaires + encodage par lot)
+# -----------------------------
+TYPES_BIEN = ("Maison", "Appartement", "Commerce")
+TOITURE_ETATS = ("Parfaite", "Moyenne", "Mauvaise")
+CHAUFFAGE_TYPES = ("Pompe a chaleur", "Gaz condensation", "Mazout", "Electrique", "Ancien systeme / poele seul")
+VITRAGE_TYPES = ("Simple", "Double ancien", "Double recent", "Triple")
+PEB_LETTRES = ("A", "B", "C", "D", "E", "F", "G")
+ETATS_PIECE = ("Bonne", "A moderniser", "A remplacer")
+
+# Ordre de sommation des impacts (impacts["total"])
+IMPACT_KEYS = (
+    "toiture", "chauffage", "vitrage", "peb", "cuisine", "sdb_etat",
+    "chambres", "sdb_count", "etage_appart",
+    "parking_garage", "balcon_terrasse", "jardin_cave_grenier",
+)
+
+# Correspondance libelle -> cle de DEFAULT_PARAMS
+PARAMS_CHAUFFAGE = {
+    "Pompe a chaleur": "chauff_pac",
+    "Gaz condensation": "chauff_gaz_cond",
+    "Mazout": "chauff_mazout",
+    "Electrique": "chauff_electrique",
+    "Ancien systeme / poele seul": "chauff_ancien",
+}
+PARAMS_CUISINE = {"Bonne": "cuisine_bonne", "A moderniser": "cuisine_moderniser", "A remplacer": "cuisine_remplacer"}
+PARAMS_SDB = {"Bonne": "sdb_bonne", "A moderniser": "sdb_moderniser", "A remplacer": "sdb_remplacer"}
+PARAMS_VITRAGE = {
+    "Simple": "vitrage_simple",
+    "Double ancien": "vitrage_double_ancien",
+    "Double recent": "vitrage_double_recent",
+    "Triple": "vitrage_triple",
+}
+PARAMS_PEB = {l: f"peb_{l}" for l in PEB_LETTRES}
+
+# Notes /10 utilisees par l'indice global d'etat
+NOTES_TOITURE = {"Parfaite": 10, "Moyenne": 6, "Mauvaise": 2}
+NOTES_CHAUFFAGE = {
+    "Pompe a chaleur": 9,
+    "Gaz condensation": 8,
+    "Mazout": 5,
+    "Electrique": 3,
+    "Ancien systeme / poele seul": 2,
+}
+NOTES_CUISINE = {"Bonne": 8, "A moderniser": 5, "A remplacer": 2}
+NOTES_SDB = {"Bonne": 8, "A moderniser": 5, "A remplacer": 2}
+NOTES_VITRAGE = {"Simple": 2, "Double ancien": 5, "Double recent": 8, "Triple": 9}
+NOTES_PEB = {"A": 10, "B": 9, "C": 8, "D": 6, "E": 4, "F": 3, "G": 2}
+
+
+# -----------------------------
+# Parametres compiles
+# -----------------------------
+class ParamsCompiles(Mapping):
+    """Jeu de parametres fige, construit une fois par version des parametres.
+
+    Toutes les valeurs sont validees et converties en float, les tables
+    libelle -> impact sont precalculees et ``empreinte`` (hash du contenu)
+    sert de cle de cache. Se lit comme un dict : ``p["degressif_pct"]``.
+    """
+
+    __slots__ = ("_valeurs", "chauffage", "cuisine", "sdb", "vitrage", "peb", "empreinte")
+
+    def __init__(self, params: Mapping):
+        manquants = [k for k in DEFAULT_PARAMS if k not in params]
+        if manquants:
+            raise ValueError(f"Parametres manquants: {', '.join(manquants)}")
+
+        valeurs = {}
+        for k, v in params.items():
+            try:
+                f = float(v)
+            except (TypeError, ValueError):
+                raise ValueError(f"Parametre {k!r} non numerique: {v!r}") from None
+            if not math.isfinite(f):
+                raise ValueError(f"Parametre {k!r} non fini: {v!r}")
+            valeurs[k] = f
+
+        def table(correspondance: dict):
+            return MappingProxyType({lib: valeurs[cle] for lib, cle in correspondance.items()})
+
+        contenu = json.dumps(sorted(valeurs.items()), separators=(",", ":"))
+        setter = object.__setattr__
+        setter(self, "_valeurs", MappingProxyType(valeurs))
+        setter(self, "chauffage", table(PARAMS_CHAUFFAGE))
+        setter(self, "cuisine", table(PARAMS_CUISINE))
+        setter(self, "sdb", table(PARAMS_SDB))
+        setter(self, "vitrage", table(PARAMS_VITRAGE))
+        setter(self, "peb", table(PARAMS_PEB))
+        setter(self, "empreinte", hashlib.sha1(contenu.encode("utf-8")).hexdigest())
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ParamsCompiles est immuable")
+
+    def __getitem__(self, key: str) -> float:
+        return self._valeurs[key]
+
+    def __iter__(self):
+        return iter(self._valeurs)
+
+    def __len__(self) -> int:
+        return len(self._valeurs)
+
+    def __hash__(self) -> int:
+        return hash(self.empreinte)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ParamsCompiles):
+            return self.empreinte == other.empreinte
+        return Mapping.__eq__(self, other)
+
+    def __repr__(self) -> str:
+        return f"ParamsCompiles({self.empreinte[:12]})"
+
+
+@lru_cache(maxsize=32)
+def _compiler(items: tuple) -> ParamsCompiles:
+    return ParamsCompiles(dict(items))
+
+
+def compile_params(params: Mapping) -> ParamsCompiles:
+    """ParamsCompiles pour ce contenu (mis en cache : un objet par version des parametres)."""
+    if isinstance(params, ParamsCompiles):
+        return params
+    return _compiler(tuple(params.items()))
+
+
+# -----------------------------
+# Calculs
+# -----------------------------
+# ``params`` : ParamsCompiles (ou dict, compile a la volee via le cache).
+def apply_degressivity(base_eur_m2: float, surface: float, params: dict) -> float:
+    p = compile_params(params)
+    if surface > p["seuil_degressif_m2"]:
+        return base_eur_m2 * (1.0 - p["degressif_pct"])
+    return base_eur_m2
+
+
+def calc_marche(zone_row: dict, bien: dict, params: dict) -> dict:
+    base_m2 = apply_degressivity(float(zone_row["base_eur_m2"]), float(bien["surface"]), params)
+    valeur_batie = float(bien["surface"]) * base_m2
+
+    valeur_terrain = 0.0
+    if bien["type"] == "Maison":
+        valeur_terrain = float(bien["terrain"]) * float(zone_row["terrain_eur_m2"])
+
+    # Commerce : si base_eur_m2 = 0, on prend commerce_eur_m2
+    if bien["type"] == "Commerce" and float(zone_row.get("base_eur_m2", 0)) == 0:
+        base_m2 = float(zone_row.get("commerce_eur_m2", 0))
+        valeur_batie = float(bien["surface"]) * base_m2
+
+    valeur_marche = valeur_batie + valeur_terrain
+    return {
+        "base_eur_m2": base_m2,
+        "valeur_batie": valeur_batie,
+        "valeur_terrain": valeur_terrain,
+        "valeur_marche": valeur_marche
+    }
+
+
+def calc_toiture_impact(bien: dict, params: dict) -> float:
+    etat = bien["toiture_etat"]
+    if etat == "Parfaite":
+        return 0.0
+
+    p = compile_params(params)
+    has_grenier = bool(bien["toiture_grenier"])
+    if not has_grenier:
+        calc = p["toit_forfait_sans_grenier"]
+    else:
+        surf = float(bien["toiture_surface_grenier"])
+        calc = p["toit_base_avec_grenier"] + surf * p["toit_eur_m2_grenier"]
+
+    if etat == "Moyenne":
+        calc = calc * p["toit_etat_moyen_coeff"]
+
+    impact = calc * p["toit_impact_factor"]
+    return -abs(impact)
+
+
+def calc_chauffage_impact(bien: dict, params: dict) -> float:
+    return compile_params(params).chauffage.get(bien["chauffage_type"], 0.0)
+
+
+def calc_cuisine_impact(bien: dict, params: dict) -> float:
+    return compile_params(params).cuisine.get(bien["cuisine_etat"], 0.0)
+
+
+def calc_sdb_etat_impact(bien: dict, params: dict) -> float:
+    return compile_params(params).sdb.get(bien["sdb_etat"], 0.0)
+
+
+def calc_vitrage_impact(bien: dict, params: dict) -> float:
+    return compile_params(params).vitrage.get(bien["vitrage_type"], 0.0)
+
+
+def calc_peb_impact(bien: dict, params: dict) -> float:
+    l = (bien.get("peb_lettre") or "C").strip().upper()
+    return compile_params(params).peb.get(l, 0.0)
+
+
+def calc_chambres_impact(bien: dict, params: dict) -> float:
+    if bien["type"] == "Commerce":
+        return 0.0
+    ref = 3 if bien["type"] == "Maison" else 2
+    nb = int(bien.get("nb_chambres", ref))
+    delta = nb - ref
+    return float(delta) * compile_params(params)["impact_par_chambre"]
+
+
+def calc_sdb_count_impact(bien: dict, params: dict) -> float:
+    ref = 1
+    nb = int(bien.get("nb_sdb", ref))
+    delta = nb - ref
+    return float(delta) * compile_params(params)["impact_par_sdb_supp"]
+
+
+def calc_etage_appart_impact(bien: dict, params: dict) -> float:
+    # Uniquement pour appartement
+    if bien["type"] != "Appartement":
+        return 0.0
+
+    p = compile_params(params)
+    etage = int(bien.get("etage", 0))
+    asc = bool(bien.get("ascenseur", False))
+
+    if etage == 0:
+        return p["etage_rdc_malus"]
+
+    if asc:
+        return p["etage_avec_ascenseur_bonus"]
+
+    return p["etage_sans_ascenseur_malus_par_niveau"] * float(etage)
+
+
+def calc_parking_garage_impact(bien: dict, params: dict) -> float:
+    p = compile_params(params)
+    nb = int(bien.get("nb_places_parking", 0))
+    impact = nb * p["impact_par_place_parking"]
+    if bool(bien.get("garage", False)):
+        impact += p["impact_garage"]
+    return float(impact)
+
+
+def calc_balcon_terrasse_impact(bien: dict, params: dict) -> float:
+    p = compile_params(params)
+    impact = 0.0
+    if bool(bien.get("balcon", False)):
+        impact += p["impact_balcon"]
+    if bool(bien.get("terrasse", False)):
+        impact += p["impact_terrasse"]
+    return float(impact)
+
+
+def calc_jardin_cave_grenier_impact(bien: dict, params: dict) -> float:
+    p = compile_params(params)
+    impact = 0.0
+    if bool(bien.get("jardin", False)):
+        impact += p["impact_jardin"]
+    if bool(bien.get("cave", False)):
+        impact += p["impact_cave"]
+    if bool(bien.get("grenier_amenageable", False)):
+        s = float(bien.get("grenier_amenageable_surface_m2", 0.0))
+        impact += p["grenier_amenageable_base"] + s * p["grenier_amenageable_eur_m2"]
+    return float(impact)
+
+
+def calc_indice(bien: dict) -> float:
+    # Indice /10 basé sur : toiture, chauffage, cuisine, sdb, vitrage, PEB
+    notes = (
+        NOTES_TOITURE.get(bien["toiture_etat"], 6)
+        + NOTES_CHAUFFAGE.get(bien["chauffage_type"], 6)
+        + NOTES_CUISINE.get(bien["cuisine_etat"], 5)
+        + NOTES_SDB.get(bien["sdb_etat"], 5)
+        + NOTES_VITRAGE.get(bien["vitrage_type"], 6)
+        + NOTES_PEB.get((bien.get("peb_lettre") or "C").upper(), 6)
+    )
+    # Notes entieres : somme exacte, meme resultat que statistics.mean
+    return notes / 6.0
+
+
+def fourchette_from_indice(valeur_finale: float, indice: float, params: dict):
+    neutre = compile_params(params)["fourchette_neutre_pct"]
+    if indice >= 8.0:
+        low_pct, high_pct = 0.05, 0.08
+    elif indice >= 6.0:
+        low_pct, high_pct = neutre, neutre
+    elif indice >= 4.0:
+        low_pct, high_pct = 0.08, 0.05
+    else:
+        low_pct, high_pct = 0.10, 0.04
+
+    low = valeur_finale * (1.0 - low_pct)
+    high = valeur_finale * (1.0 + high_pct)
+    return low, high, low_pct, high_pct
+
+
+# -----------------------------
+# Pipeline de valorisation (memoise)
+# -----------------------------
+# Champs du bien qui interviennent dans le calcul (client, adresse, ... n'en font pas partie)
+CHAMPS_CALCUL = (
+    "type", "surface", "terrain", "nb_chambres", "nb_sdb", "etage", "ascenseur",
+    "nb_places_parking", "garage", "balcon", "terrasse", "jardin", "cave",
+    "grenier_amenageable", "grenier_amenageable_surface_m2", "coef_expert_pct",
+    "toiture_grenier", "toiture_surface_grenier", "toiture_etat", "chauffage_type",
+    "cuisine_etat", "sdb_etat", "vitrage_type", "peb_lettre",
+)
+CHAMPS_MARCHE = ("type", "surface", "terrain")
+CHAMPS_REFERENTIEL = ("zone", "type", "base_eur_m2", "terrain_eur_m2", "commerce_eur_m2")
+
+
+@dataclass(frozen=True)
+class Valorisation:
+    marche: Mapping
+    impacts: Mapping
+    indice: float
+    valeur_tech: float
+    valeur_finale: float
+    low: float
+    high: float
+    low_pct: float
+    high_pct: float
+
+
+def _cle(d: dict, champs: tuple) -> tuple:
+    return tuple((k, d[k]) for k in champs if k in d)
+
+
+def calc_impacts(bien: dict, params: dict) -> dict:
+    """Les douze impacts + "total" (somme dans l'ordre de IMPACT_KEYS)."""
+    p = compile_params(params)
+    impacts = {
+        "toiture": calc_toiture_impact(bien, p),
+        "chauffage": calc_chauffage_impact(bien, p),
+        "vitrage": calc_vitrage_impact(bien, p),
+        "peb": calc_peb_impact(bien, p),
+        "cuisine": calc_cuisine_impact(bien, p),
+        "sdb_etat": calc_sdb_etat_impact(bien, p),
+        "chambres": calc_chambres_impact(bien, p),
+        "sdb_count": calc_sdb_count_impact(bien, p),
+        "etage_appart": calc_etage_appart_impact(bien, p),
+        "parking_garage": calc_parking_garage_impact(bien, p),
+        "balcon_terrasse": calc_balcon_terrasse_impact(bien, p),
+        "jardin_cave_grenier": calc_jardin_cave_grenier_impact(bien, p),
+    }
+    total = impacts[IMPACT_KEYS[0]]
+    for k in IMPACT_KEYS[1:]:
+        total = total + impacts[k]
+    impacts["total"] = total
+    return impacts
+
+
+@lru_cache(maxsize=256)
+def _marche_memo(cle_zone: tuple, cle_marche: tuple, p: ParamsCompiles) -> Mapping:
+    return MappingProxyType(calc_marche(dict(cle_zone), dict(cle_marche), p))
+
+
+@lru_cache(maxsize=256)
+def _valoriser_memo(cle_zone: tuple, cle_bien: tuple, p: ParamsCompiles) -> Valorisation:
+    bien = dict(cle_bien)
+    marche = _marche_memo(cle_zone, _cle(bien, CHAMPS_MARCHE), p)
+    impacts = mesurer("impacts", calc_impacts, bien, p)
+    indice = mesurer("indice", calc_indice, bien)
+    valeur_tech = marche["valeur_marche"] + impacts["total"]
+    coef = float(bien.get("coef_expert_pct", 0.0)) / 100.0
+    valeur_finale = valeur_tech * (1.0 + coef)
+    low, high, low_pct, high_pct = fourchette_from_indice(valeur_finale, indice, p)
+    return Valorisation(
+        marche=marche,
+        impacts=MappingProxyType(impacts),
+        indice=indice,
+        valeur_tech=valeur_tech,
+        valeur_finale=valeur_finale,
+        low=low,
+        high=high,
+        low_pct=low_pct,
+        high_pct=high_pct,
+    )
+
+
+def calc_marche_memo(zone_row: dict, bien: dict, params: dict) -> Mapping:
+    """calc_marche memoise sur (ligne referentiel, type/surface/terrain, params)."""
+    return _marche_memo(_cle(zone_row, CHAMPS_REFERENTIEL), _cle(bien, CHAMPS_MARCHE), compile_params(params))
+
+
+def valoriser(zone_row: dict, bien: dict, params: dict) -> Valorisation:
+    """Valorisation complete (marche, impacts, indice, valeurs, fourchette).
+
+    Memoisee sur le contenu des champs de calcul du bien, de la ligne
+    referentiel et l'empreinte des parametres : des entrees inchangees
+    retournent le meme objet sans recalcul.
+    """
+    return _valoriser_memo(_cle(zone_row, CHAMPS_REFERENTIEL), _cle(bien, CHAMPS_CALCUL), compile_params(params))
+
+
+# -----------------------------
+# Dependances (revalorisation incrementale de l'historique)
+# -----------------------------
+def cle_param(cle: str) -> str:
+    return f"param:{cle}"
+
+
+def cle_ligne(zone: str, type_bien: str) -> str:
+    return f"ligne:{zone}|{type_bien}"
+
+
+# Estimation calculee avec des surcharges privees de session : exclue des revalorisations
+CLE_PRIVEE = "prive"
+
+
+def cles_surcharges(params_prives, lignes_privees) -> frozenset:
+    """Cles (``cle_param`` / ``cle_ligne``) modifiees par les surcharges privees d'une session."""
+    return frozenset(
+        [cle_param(k) for k in params_prives] + [cle_ligne(l["zone"], l["type"]) for l in lignes_privees]
+    )
+
+
+def dependances(zone: str, bien: dict) -> frozenset:
+    """Parametres (``cle_param``) et ligne referentiel (``cle_ligne``) lus par ``valoriser``.
+
+    Memes branches que les fonctions ``calc_*`` : un parametre multiplie par
+    zero ou dans une branche non prise n'est pas une dependance. Degressivite :
+    toujours (le seuil decide de la branche).
+    """
+    type_bien = bien["type"]
+    cles = {"seuil_degressif_m2", "degressif_pct"}
+
+    etat_toit = bien["toiture_etat"]
+    if etat_toit != "Parfaite":
+        cles.add("toit_impact_factor")
+        if bool(bien["toiture_grenier"]):
+            cles.update(("toit_base_avec_grenier", "toit_eur_m2_grenier"))
+        else:
+            cles.add("toit_forfait_sans_grenier")
+        if etat_toit == "Moyenne":
+            cles.add("toit_etat_moyen_coeff")
+
+    for correspondance, libelle in (
+        (PARAMS_CHAUFFAGE, bien["chauffage_type"]),
+        (PARAMS_CUISINE, bien["cuisine_etat"]),
+        (PARAMS_SDB, bien["sdb_etat"]),
+        (PARAMS_VITRAGE, bien["vitrage_type"]),
+        (PARAMS_PEB, (bien.get("peb_lettre") or "C").strip().upper()),
+    ):
+        if libelle in correspondance:
+            cles.add(correspondance[libelle])
+
+    if type_bien != "Commerce":
+        ref = 3 if type_bien == "Maison" else 2
+        if int(bien.get("nb_chambres", ref)) != ref:
+            cles.add("impact_par_chambre")
+    if int(bien.get("nb_sdb", 1)) != 1:
+        cles.add("impact_par_sdb_supp")
+    if type_bien == "Appartement":
+        if int(bien.get("etage", 0)) == 0:
+            cles.add("etage_rdc_malus")
+        elif bool(bien.get("ascenseur", False)):
+            cles.add("etage_avec_ascenseur_bonus")
+        else:
+            cles.add("etage_sans_ascenseur_malus_par_niveau")
+    if int(bien.get("nb_places_parking", 0)) != 0:
+        cles.add("impact_par_place_parking")
+    for champ, cle in (
+        ("garage", "impact_garage"), ("balcon", "impact_balcon"), ("terrasse", "impact_terrasse"),
+        ("jardin", "impact_jardin"), ("cave", "impact_cave"),
+    ):
+        if bool(bien.get(champ, False)):
+            cles.add(cle)
+    if bool(bien.get("grenier_amenageable", False)):
+        cles.update(("grenier_amenageable_base", "grenier_amenageable_eur_m2"))
+
+    if 6.0 <= calc_indice(bien) < 8.0:
+        cles.add("fourchette_neutre_pct")
+
+    return frozenset({cle_ligne(zone, type_bien)} | {cle_param(k) for k in cles})
+
+
+# -----------------------------
+# Historique
+# -----------------------------
+def build_record(bien: dict, zone: str, indice: float, valeur_marche: float, impact_total: float,
+                 valeur_finale: float, low: float, high: float) -> dict:
+    return {
+        "date_estimation": date.today().isoformat(),
+        "client": safe_text(bien["client"], 60),
+        "adresse": safe_text(bien["adresse"], 80),
+        "commune": safe_text(bien["commune"], 40),
+        "zone": zone,
+        "type_bien": bien["type"],
+        "surface_m2": round(float(bien["surface"]), 1),
+        "terrain_m2": round(float(bien["terrain"]), 1),
+        "nb_chambres": int(bien["nb_chambres"]),
+        "nb_sdb": int(bien["nb_sdb"]),
+        "etage": int(bien["etage"]),
+        "ascenseur": bool(bien["ascenseur"]),
+        "peb_lettre": bien["peb_lettre"],
+        "peb_kwh": round(float(bien["peb_kwh"]), 0),
+        "vitrage_type": bien["vitrage_type"],
+        "toiture_etat": bien["toiture_etat"],
+        "toiture_grenier": bool(bien["toiture_grenier"]),
+        "toiture_surface_grenier": round(float(bien["toiture_surface_grenier"]), 1),
+        "chauffage_type": bien["chauffage_type"],
+        "cuisine_etat": bien["cuisine_etat"],
+        "sdb_etat": bien["sdb_etat"],
+        "nb_places_parking": int(bien["nb_places_parking"]),
+        "garage": bool(bien["garage"]),
+        "balcon": bool(bien["balcon"]),
+        "terrasse": bool(bien["terrasse"]),
+        "jardin": bool(bien["jardin"]),
+        "cave": bool(bien["cave"]),
+        "grenier_amenageable": bool(bien["grenier_amenageable"]),
+        "grenier_amenageable_surface_m2": round(float(bien["grenier_amenageable_surface_m2"]), 1),
+        "nb_etages": int(bien["nb_etages"]),
+        "surfaces_etages": " / ".join([str(int(s)) for s in bien.get("surfaces_etages", [])]),
+        "indice_etat": round(float(indice), 1),
+        "coef_expert_pct": round(float(bien["coef_expert_pct"]), 1),
+        "justif_coef": safe_text(bien["justif_coef"], 120),
+        "valeur_marche": round(float(valeur_marche), 0),
+        "impact_total": round(float(impact_total), 0),
+        "valeur_finale": round(float(valeur_finale), 0),
+        "fourchette_basse": round(float(low), 0),
+        "fourchette_haute": round(float(high), 0),
+        "prix_vendu": "",
+        "date_vente": "",
+    }
+
+
+# Colonnes de l'historique -> champs du bien (les autres ont le meme nom)
+ALIAS_HISTORIQUE = {"type": "type_bien", "surface": "surface_m2", "terrain": "terrain_m2"}
+
+
+def bien_depuis_record(record: dict) -> dict:
+    """Champs de calcul d'un enregistrement d'historique, au format ``bien``."""
+    return {k: record[ALIAS_HISTORIQUE.get(k, k)] for k in CHAMPS_CALCUL}
+
+
+# Colonnes d'un enregistrement d'historique (ordre de build_record)
+HISTORY_COLUMNS = (
+    "date_estimation", "client", "adresse", "commune", "zone", "type_bien", "surface_m2",
+    "terrain_m2", "nb_chambres", "nb_sdb", "etage", "ascenseur", "peb_lettre", "peb_kwh",
+    "vitrage_type", "toiture_etat", "toiture_grenier", "toiture_surface_grenier", "chauffage_type",
+    "cuisine_etat", "sdb_etat", "nb_places_parking", "garage", "balcon", "terrasse", "jardin",
+    "cave", "grenier_amenageable", "grenier_amenageable_surface_m2", "nb_etages",
+    "surfaces_etages", "indice_etat", "coef_expert_pct", "justif_coef", "valeur_marche",
+    "impact_total", "valeur_finale", "fourchette_basse", "fourchette_haute", "prix_vendu",
+    "date_vente",
+)
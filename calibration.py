@@ -0,0 +1,278 @@
+"""Calibration des parametres d'impact sur les prix vendus de l'historique.
+
+La valeur technique est lineaire dans la plupart des parametres (impacts
+additifs) et dans le niveau du marche (EUR/m2 du referentiel) :
+
+    prix_vendu / (1 + coef_expert) ~= toiture + sum_j X_j * theta_j + sum_g M_g * a_g
+
+- ``X_j`` : contribution unitaire du parametre ``theta_j`` (``PARAMS_CALIBRABLES``),
+  calculee une fois par colonne avec ``batch.valoriser_lot`` ;
+- ``M_g`` : valeur marche des biens du groupe ``g`` (zone + type, ou un seul
+  groupe global), ``a_g`` etant le facteur a appliquer aux EUR/m2 du groupe ;
+- toiture, degressivite et fourchette restent fixes (non lineaires).
+
+Le calibrateur ne garde que les statistiques suffisantes (Z'Z, Z'y, y'y, n) :
+chaque nouvelle vente (correction ou effacement d'un prix) met a jour ces sommes sans
+relire l'historique, et un ajustement est une resolution de systeme de la
+taille du nombre de parametres. La regularisation (ridge) tire chaque
+parametre vers sa valeur actuelle, proportionnellement a l'information que
+les ventes apportent sur lui.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from batch import COLONNES_REFERENTIEL, resoudre_referentiel, valoriser_lot
+from calculs import (
+    ALIAS_HISTORIQUE,
+    CHAMPS_CALCUL,
+    PARAMS_CHAUFFAGE,
+    PARAMS_CUISINE,
+    PARAMS_PEB,
+    PARAMS_SDB,
+    PARAMS_VITRAGE,
+    compile_params,
+)
+from historique import HistoriqueColonnes, parse_prix
+
+# Parametres entrant lineairement dans la valeur technique
+PARAMS_CALIBRABLES = (
+    *PARAMS_CHAUFFAGE.values(),
+    *PARAMS_CUISINE.values(),
+    *PARAMS_SDB.values(),
+    *PARAMS_VITRAGE.values(),
+    *PARAMS_PEB.values(),
+    "impact_par_chambre",
+    "impact_par_sdb_supp",
+    "etage_avec_ascenseur_bonus",
+    "etage_sans_ascenseur_malus_par_niveau",
+    "etage_rdc_malus",
+    "impact_par_place_parking",
+    "impact_garage",
+    "impact_balcon",
+    "impact_terrasse",
+    "impact_jardin",
+    "impact_cave",
+    "grenier_amenageable_base",
+    "grenier_amenageable_eur_m2",
+)
+
+GROUPES = ("zone", "global", None)
+REGULARISATION_DEFAUT = 0.1
+
+
+def colonnes_depuis_historique(records) -> dict:
+    """Colonnes ``valoriser_lot`` (+ ``zone``) a partir d'enregistrements d'historique (ou d'un ``HistoriqueColonnes``)."""
+    if isinstance(records, HistoriqueColonnes):
+        return records.colonnes_calcul()
+    return {
+        k: np.array([r[ALIAS_HISTORIQUE.get(k, k)] for r in records])
+        for k in CHAMPS_CALCUL + ("zone",)
+    }
+
+
+def _prix(records: list) -> np.ndarray:
+    return np.array([parse_prix(r["prix_vendu"]) for r in records], dtype=float)
+
+
+def _cle_groupe(zone, type_bien, groupes):
+    return (zone, type_bien) if groupes == "zone" else "*"
+
+
+# -----------------------------
+# Evaluation (modele complet)
+# -----------------------------
+def evaluer(records: list, params, zones) -> dict:
+    """Erreurs de la valeur finale contre les prix vendus : n, MAE, MAPE, RMSE, biais moyen."""
+    ventes = [r for r in records if r.get("prix_vendu") not in (None, "")]
+    metriques = {"n": 0, "mae": 0.0, "mape": 0.0, "rmse": 0.0, "biais": 0.0}
+    if not ventes:
+        return metriques
+    res = valoriser_lot(colonnes_depuis_historique(ventes), params, zones)
+    ok = res["trouve"]
+    if not ok.any():
+        return metriques
+    prix = _prix(ventes)[ok]
+    ecart = res["valeur_finale"][ok] - prix
+    non_nul = prix != 0
+    metriques.update(
+        n=int(ok.sum()),
+        mae=float(np.abs(ecart).mean()),
+        mape=float(np.abs(ecart[non_nul] / prix[non_nul]).mean()) if non_nul.any() else 0.0,
+        rmse=float(np.sqrt((ecart ** 2).mean())),
+        biais=float(ecart.mean()),
+    )
+    return metriques
+
+
+# -----------------------------
+# Calibration
+# -----------------------------
+@dataclass(frozen=True)
+class Calibration:
+    params: dict
+    facteurs_marche: dict
+    referentiel: list
+    n: int
+    rmse_avant: float
+    rmse_apres: float
+
+
+class Calibrateur:
+    """Statistiques suffisantes des ventes pour un jeu de parametres et un referentiel donnes.
+
+    ``groupes`` : "zone" (un facteur EUR/m2 par zone + type), "global" (un seul
+    facteur) ou None (niveau du marche non calibre).
+    """
+
+    def __init__(self, params, zones, groupes: str = "zone"):
+        if groupes not in GROUPES:
+            raise ValueError(f"groupes doit etre l'un de {GROUPES}")
+        self.params = compile_params(params)
+        self.zones = [dict(z) for z in zones]
+        self.groupes = groupes
+        self.theta0 = np.array([self.params[k] for k in PARAMS_CALIBRABLES])
+        self.cles_groupes = []
+        self._index_groupes = {}
+        k = len(PARAMS_CALIBRABLES)
+        self.ztz = np.zeros((k, k))
+        self.zty = np.zeros(k)
+        self.yty = 0.0
+        self.n = 0
+        # Lignes non nulles par colonne de Z : une colonne sans vente est inactive meme
+        # si les sommes retranchees y laissent un residu d'arrondi
+        self.n_colonnes = np.zeros(k, dtype=np.int64)
+        # id -> prix deja integre (une correction retire l'ancienne contribution)
+        self._prix = {}
+
+    # -- modele lineaire --
+    def _modele(self, col: dict):
+        """(X des parametres, valeur marche, offset toiture, masque referentiel trouve)."""
+        p0 = dict(self.params)
+        for cle in PARAMS_CALIBRABLES:
+            p0[cle] = 0.0
+        ref = resoudre_referentiel(self.zones, col["zone"], col["type"])
+        col = {**col, **{k: ref[k] for k in COLONNES_REFERENTIEL}}
+
+        res0 = valoriser_lot(col, p0)
+        x = np.empty((len(col["zone"]), len(PARAMS_CALIBRABLES)))
+        for j, cle in enumerate(PARAMS_CALIBRABLES):
+            x[:, j] = valoriser_lot(col, {**p0, cle: 1.0})["total"] - res0["total"]
+        return x, res0["valeur_marche"], res0["total"], ref["trouve"]
+
+    def _groupe(self, cle) -> int:
+        if cle not in self._index_groupes:
+            self._index_groupes[cle] = len(self.cles_groupes)
+            self.cles_groupes.append(cle)
+            self.ztz = np.pad(self.ztz, ((0, 1), (0, 1)))
+            self.zty = np.pad(self.zty, (0, 1))
+            self.n_colonnes = np.pad(self.n_colonnes, (0, 1))
+        return len(PARAMS_CALIBRABLES) + self._index_groupes[cle]
+
+    def _accumuler(self, records: list, prix: np.ndarray, signe: float):
+        col = colonnes_depuis_historique(records)
+        x, marche, offset, trouve = self._modele(col)
+        coef = 1.0 + col["coef_expert_pct"].astype(float) / 100.0
+        y = prix / coef - offset
+        garde = trouve & np.isfinite(y)
+        if not garde.any():
+            return 0
+
+        x, marche, y = x[garde], marche[garde], y[garde]
+        if self.groupes is None:
+            y = y - marche
+            z = x
+        else:
+            cols = [self._groupe(_cle_groupe(zo, ty, self.groupes))
+                    for zo, ty in zip(col["zone"][garde].tolist(), col["type"][garde].tolist())]
+            z = np.zeros((len(y), self.ztz.shape[0]))
+            z[:, :x.shape[1]] = x
+            z[np.arange(len(y)), cols] = marche
+
+        self.ztz += signe * (z.T @ z)
+        self.zty += signe * (z.T @ y)
+        self.yty += signe * float(y @ y)
+        self.n_colonnes += int(signe) * np.count_nonzero(z, axis=0)
+        self.n += int(signe) * len(y)
+        return len(y)
+
+    # -- mise a jour incrementale --
+    def ajouter_ventes(self, records: list) -> int:
+        """Integre les ventes nouvelles, corrigees ou retirees (prix efface, cle ``id``) ; retourne le nombre de lignes traitees."""
+        nouveaux, anciens, anciens_prix = [], [], []
+        for r in records:
+            id_ = r.get("id")
+            prix = None if r.get("prix_vendu") in (None, "") else parse_prix(r["prix_vendu"])
+            connu = self._prix.get(id_) if id_ is not None else None
+            if connu == prix:
+                continue
+            if connu is not None:
+                anciens.append(r)
+                anciens_prix.append(connu)
+                del self._prix[id_]
+            if prix is not None:
+                nouveaux.append(r)
+                if id_ is not None:
+                    self._prix[id_] = prix
+        traites = 0
+        if anciens:
+            traites += self._accumuler(anciens, np.array(anciens_prix), -1.0)
+        if nouveaux:
+            traites += self._accumuler(nouveaux, _prix(nouveaux), 1.0)
+        return traites
+
+    @property
+    def ids(self) -> set:
+        """Ids des ventes integrees (pour retrouver celles dont le prix a ete efface depuis)."""
+        return set(self._prix)
+
+    # -- ajustement --
+    def _beta0(self) -> np.ndarray:
+        return np.concatenate([self.theta0, np.ones(len(self.cles_groupes))])
+
+    def sse(self, beta: np.ndarray) -> float:
+        return float(self.yty - 2.0 * beta @ self.zty + beta @ self.ztz @ beta)
+
+    def ajuster(self, regularisation: float = REGULARISATION_DEFAUT) -> Calibration:
+        """Resout (Z'Z + lambda diag(Z'Z)) delta = Z'(y - Z beta0) ; beta = beta0 + delta.
+
+        Les parametres sans information (aucune vente concernee) gardent leur valeur.
+        """
+        if self.n == 0:
+            raise ValueError("Aucune vente exploitable (prix vendu + ligne referentiel).")
+        beta0 = self._beta0()
+        diag = np.diag(self.ztz).copy()
+        actif = (self.n_colonnes > 0) & (diag > 0)
+        a = self.ztz[np.ix_(actif, actif)] + regularisation * np.diag(diag[actif])
+        g = (self.zty - self.ztz @ beta0)[actif]
+        # Sans regularisation, les modalites d'un meme critere ne sont definies qu'a une
+        # constante pres : lstsq retient la correction de norme minimale.
+        if regularisation > 0:
+            delta = np.linalg.solve(a, g)
+        else:
+            delta = np.linalg.lstsq(a, g, rcond=None)[0]
+        beta = beta0.copy()
+        beta[actif] += delta
+
+        k = len(PARAMS_CALIBRABLES)
+        params = dict(self.params)
+        params.update({cle: float(v) for cle, v in zip(PARAMS_CALIBRABLES, beta[:k])})
+        facteurs = {cle: float(f) for cle, f in zip(self.cles_groupes, beta[k:])}
+        return Calibration(
+            params=params,
+            facteurs_marche=facteurs,
+            referentiel=self._referentiel(facteurs),
+            n=self.n,
+            rmse_avant=float(np.sqrt(max(self.sse(beta0), 0.0) / self.n)),
+            rmse_apres=float(np.sqrt(max(self.sse(beta), 0.0) / self.n)),
+        )
+
+    def _referentiel(self, facteurs: dict) -> list:
+        lignes = []
+        for z in self.zones:
+            f = facteurs.get(_cle_groupe(z["zone"], z["type"], self.groupes), 1.0)
+            ligne = dict(z)
+            for k in COLONNES_REFERENTIEL:
+                ligne[k] = float(z.get(k, 0)) * f
+            lignes.append(ligne)
+        return lignes
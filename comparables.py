@@ -0,0 +1,198 @@
+"""Ventes comparables : index des plus proches voisins sur l'historique des biens vendus.
+
+Distance ponderee entre deux biens :
+
+    d^2 = sum_f (poids_f * (x_f - y_f) / ECHELLES[f])^2
+          + poids_zone^2 [zones differentes] + poids_type^2 [types differents]
+
+Les ventes sont regroupees par (zone, type) : chaque groupe a son propre arbre
+(``scipy.spatial.cKDTree`` si disponible, sinon recherche NumPy vectorisee sur
+le groupe). Une requete parcourt les groupes par penalite croissante et
+s'arrete des que la penalite d'un groupe depasse la k-ieme distance trouvee.
+
+Les ventes ajoutees apres la construction vont dans un tampon du groupe,
+fusionne dans l'arbre lorsqu'il depasse ``TAMPON_MAX`` (reconstruction du seul
+groupe concerne).
+"""
+import threading
+
+import numpy as np
+
+from historique import parse_prix
+
+try:
+    from scipy.spatial import cKDTree
+except Exception:
+    cKDTree = None
+
+
+# Colonnes d'historique utilisees et ecart correspondant a "une unite" de dissemblance
+ECHELLES = {
+    "surface_m2": 20.0,
+    "terrain_m2": 200.0,
+    "nb_chambres": 1.0,
+    "nb_sdb": 1.0,
+    "indice_etat": 1.0,
+}
+CARACTERISTIQUES = tuple(ECHELLES)
+
+POIDS_DEFAUT = {
+    "surface_m2": 1.0,
+    "terrain_m2": 0.5,
+    "nb_chambres": 0.5,
+    "nb_sdb": 0.5,
+    "indice_etat": 1.0,
+    "zone": 3.0,
+    "type": 10.0,
+}
+
+TAMPON_MAX = 256
+
+
+def _vecteur(rec: dict) -> np.ndarray:
+    return np.array([float(rec.get(f) or 0.0) for f in CARACTERISTIQUES])
+
+
+class _Groupe:
+    """Ventes d'une meme (zone, type) : arbre + tampon des ajouts recents."""
+
+    def __init__(self):
+        self.positions = []
+        self.pos_arbre = np.empty(0, dtype=np.intp)
+        self.points = np.empty((0, len(CARACTERISTIQUES)))
+        self.arbre = None
+        self.retires = 0
+
+    def construire(self, coords: np.ndarray):
+        self.pos_arbre = np.asarray(self.positions, dtype=np.intp)
+        self.points = coords[self.pos_arbre]
+        self.arbre = cKDTree(self.points) if cKDTree is not None and len(self.pos_arbre) else None
+
+    def chercher(self, q: np.ndarray, k: int, coords: np.ndarray):
+        """(distances, positions) des k plus proches dans le groupe (arbre + tampon)."""
+        d, p = np.empty(0), np.empty(0, dtype=np.intp)
+        n = len(self.pos_arbre)
+        if n:
+            kk = min(k, n)
+            if self.arbre is not None:
+                d, i = self.arbre.query(q, k=kk)
+                d, i = np.atleast_1d(d), np.atleast_1d(i)
+            else:
+                dist = np.sqrt(((self.points - q) ** 2).sum(axis=1))
+                i = np.argpartition(dist, kk - 1)[:kk] if kk < n else np.arange(n)
+                d = dist[i]
+            p = self.pos_arbre[i]
+        if len(self.positions) > n:
+            tampon = np.asarray(self.positions[n:], dtype=np.intp)
+            d = np.concatenate([d, np.sqrt(((coords[tampon] - q) ** 2).sum(axis=1))])
+            p = np.concatenate([p, tampon])
+        return d, p
+
+
+class IndexComparables:
+    """Index des biens vendus, interrogeable par ``chercher`` ; alimente par ``ajouter``."""
+
+    def __init__(self, records=(), poids: dict = None):
+        self._lock = threading.Lock()
+        self.poids = {**POIDS_DEFAUT, **(poids or {})}
+        self._ventes = []
+        self._brut = np.empty((0, len(CARACTERISTIQUES)))
+        self._coords = self._brut
+        self._actif = np.empty(0, dtype=bool)
+        self._par_id = {}
+        self._groupes = {}
+        self.ajouter(records)
+
+    def __len__(self) -> int:
+        return int(self._actif.sum())
+
+    def _echelle(self) -> np.ndarray:
+        return np.array([self.poids[f] / ECHELLES[f] for f in CARACTERISTIQUES])
+
+    def reponderer(self, poids: dict):
+        """Change les poids : coordonnees recalculees, tous les arbres reconstruits."""
+        with self._lock:
+            self.poids = {**POIDS_DEFAUT, **(poids or {})}
+            self._coords = self._brut * self._echelle()
+            for g in self._groupes.values():
+                g.construire(self._coords)
+
+    def ajouter(self, records) -> int:
+        """Ajoute les ventes (ou met a jour prix / date d'un id deja indexe).
+
+        Un enregistrement sans prix vendu retire l'id correspondant de l'index.
+        """
+        nouveaux = []
+        with self._lock:
+            for r in records:
+                vendu = r.get("prix_vendu") not in (None, "")
+                pos = self._par_id.get(r.get("id")) if r.get("id") is not None else None
+                if pos is not None:
+                    if vendu:
+                        self._ventes[pos] = self._vente(r)
+                    if vendu != self._actif[pos]:
+                        self._actif[pos] = vendu
+                        v = self._ventes[pos]
+                        self._groupes[(v["zone"], v["type_bien"])].retires += -1 if vendu else 1
+                    continue
+                if vendu:
+                    nouveaux.append(r)
+            if not nouveaux:
+                return 0
+
+            debut = len(self._ventes)
+            brut = np.array([_vecteur(r) for r in nouveaux])
+            self._brut = np.vstack([self._brut, brut])
+            self._coords = np.vstack([self._coords, brut * self._echelle()])
+            self._actif = np.concatenate([self._actif, np.ones(len(nouveaux), dtype=bool)])
+            touches = set()
+            for pos, r in enumerate(nouveaux, start=debut):
+                self._ventes.append(self._vente(r))
+                if r.get("id") is not None:
+                    self._par_id[r["id"]] = pos
+                cle = (r.get("zone"), r.get("type_bien"))
+                self._groupes.setdefault(cle, _Groupe()).positions.append(pos)
+                touches.add(cle)
+            for cle in touches:
+                g = self._groupes[cle]
+                if len(g.pos_arbre) == 0 or len(g.positions) - len(g.pos_arbre) > TAMPON_MAX:
+                    g.construire(self._coords)
+            return len(nouveaux)
+
+    @staticmethod
+    def _vente(r: dict) -> dict:
+        vente = {k: r.get(k) for k in ("id", "date_estimation", "commune", "zone", "type_bien", "valeur_finale", "date_vente")}
+        vente.update({f: r.get(f) for f in CARACTERISTIQUES})
+        vente["prix_vendu"] = parse_prix(r["prix_vendu"])
+        return vente
+
+    def chercher(self, caracteristiques: dict, k: int = 5) -> list:
+        """Les k ventes les plus proches (dicts de vente + ``distance``), de la plus proche a la plus lointaine.
+
+        ``caracteristiques`` : colonnes d'historique (zone, type_bien, surface_m2, ...).
+        """
+        zone, type_bien = caracteristiques.get("zone"), caracteristiques.get("type_bien")
+        with self._lock:
+            # Poids lus sous le verrou : coherents avec les arbres (reponderer)
+            q = _vecteur(caracteristiques) * self._echelle()
+            pz, pt = self.poids["zone"], self.poids["type"]
+            penalites = {
+                cle: (pz if cle[0] != zone else 0.0) ** 2 + (pt if cle[1] != type_bien else 0.0) ** 2
+                for cle in self._groupes
+            }
+            ordre = sorted(self._groupes, key=penalites.get)
+            meilleurs_d, meilleurs_p = np.empty(0), np.empty(0, dtype=np.intp)
+            for cle in ordre:
+                penalite = penalites[cle]
+                if len(meilleurs_d) >= k and penalite >= meilleurs_d[k - 1] ** 2:
+                    break
+                g = self._groupes[cle]
+                # Marge pour les ventes retirees (prix efface) encore presentes dans l'arbre
+                d, p = g.chercher(q, k + g.retires, self._coords)
+                garde = self._actif[p]
+                d = np.sqrt(d[garde] ** 2 + penalite)
+                meilleurs_d = np.concatenate([meilleurs_d, d])
+                meilleurs_p = np.concatenate([meilleurs_p, p[garde]])
+                tri = np.argsort(meilleurs_d, kind="stable")[:k]
+                meilleurs_d, meilleurs_p = meilleurs_d[tri], meilleurs_p[tri]
+            return [{**self._ventes[p], "distance": float(d)} for d, p in zip(meilleurs_d, meilleurs_p)]
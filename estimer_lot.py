@@ -0,0 +1,335 @@
+"""Estimation en masse d'un fichier de biens (CSV ou Parquet), sans Streamlit.
+
+Le fichier est lu par blocs : chaque bloc est resolu dans le referentiel,
+valorise en une passe vectorisee (``batch.valoriser_lot``) puis ecrit
+immediatement. La memoire reste bornee par la taille d'un bloc, quel que soit
+le nombre de lignes.
+
+Une ligne illisible (valeur non numerique, ...) ou sans ligne referentiel ne
+bloque pas le lot : elle est ecrite dans un fichier de rejets
+(``<sortie>.rejets.csv`` par defaut) avec son numero (1 = premiere ligne de
+donnees) et la raison du rejet.
+
+Les colonnes d'entree reprennent les cles du dict ``bien`` de l'application
+(``type``, ``zone``, ``surface``, ``terrain``, ``chauffage_type``, ...) ; les
+noms de l'historique (``type_bien``, ``surface_m2``, ``terrain_m2``) sont aussi
+acceptes. La sortie a les colonnes d'un enregistrement d'historique.
+
+Usage :
+    python estimer_lot.py biens.csv estimations.csv
+    python estimer_lot.py biens.parquet estimations.parquet --referentiel zones.json --bloc 100000
+    python estimer_lot.py biens.csv estimations.csv --rejets a_corriger.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+from batch import colonnes_depuis_biens, valoriser_lot
+from calculs import DEFAULT_PARAMS, DEFAULT_ZONES, HISTORY_COLUMNS, build_record
+
+
+TAILLE_BLOC = 50_000
+
+# Valeurs par defaut des champs absents (memes defauts que le formulaire)
+LIGNE_DEFAUT = {
+    "client": "",
+    "adresse": "",
+    "commune": "",
+    "surface": 0.0,
+    "terrain": 0.0,
+    "nb_chambres": 2,
+    "nb_sdb": 1,
+    "etage": 0,
+    "ascenseur": False,
+    "nb_places_parking": 0,
+    "garage": False,
+    "balcon": False,
+    "terrasse": False,
+    "jardin": False,
+    "cave": False,
+    "grenier_amenageable": False,
+    "grenier_amenageable_surface_m2": 0.0,
+    "nb_etages": 1,
+    "surfaces_etages": [],
+    "coef_expert_pct": 0.0,
+    "justif_coef": "",
+    "toiture_grenier": False,
+    "toiture_surface_grenier": 0.0,
+    "toiture_etat": "Parfaite",
+    "chauffage_type": "Gaz condensation",
+    "cuisine_etat": "Bonne",
+    "sdb_etat": "Bonne",
+    "vitrage_type": "Double recent",
+    "peb_lettre": "C",
+    "peb_kwh": 0.0,
+}
+
+# Noms de colonnes de l'historique -> cles du dict bien
+ALIAS = {"type_bien": "type", "surface_m2": "surface", "terrain_m2": "terrain"}
+
+VRAI = {"1", "true", "vrai", "oui", "yes", "x"}
+
+SANS_REFERENTIEL = "Aucune ligne referentiel pour cette zone + ce type."
+COLONNES_REJETS = ("ligne", "erreur", "donnees")
+
+
+def _bool(v) -> bool:
+    if isinstance(v, str):
+        return v.strip().lower() in VRAI
+    return bool(v)
+
+
+def _float(v) -> float:
+    if v is None or (isinstance(v, str) and not v.strip()):
+        return 0.0
+    return float(str(v).replace(",", ".")) if isinstance(v, str) else float(v)
+
+
+def bien_depuis_ligne(ligne: dict) -> dict:
+    """Convertit une ligne brute (chaines CSV ou valeurs Parquet) en dict ``bien``."""
+    bien = dict(LIGNE_DEFAUT)
+    for k, v in ligne.items():
+        k = ALIAS.get(k, k)
+        if v is None or v == "":
+            continue
+        defaut = LIGNE_DEFAUT.get(k)
+        if isinstance(defaut, bool):
+            bien[k] = _bool(v)
+        elif isinstance(defaut, int):
+            bien[k] = int(_float(v))
+        elif isinstance(defaut, float):
+            bien[k] = _float(v)
+        elif isinstance(defaut, list):
+            bien[k] = [_float(s) for s in str(v).split("/") if s.strip()] if isinstance(v, str) else list(v)
+        else:
+            bien[k] = v
+    return bien
+
+
+# -----------------------------
+# Lecture / ecriture par blocs
+# -----------------------------
+def _est_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def _exiger_pyarrow():
+    """(pyarrow, pyarrow.parquet), importes au premier fichier Parquet seulement."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except Exception:
+        raise SystemExit("Le format Parquet necessite pyarrow (pip install pyarrow).")
+    return pa, pq
+
+
+def lire_blocs(path: str, taille: int = TAILLE_BLOC):
+    """Itere sur le fichier par listes de lignes (dicts) de ``taille`` au plus."""
+    if _est_parquet(path):
+        _, pq = _exiger_pyarrow()
+        for lot in pq.ParquetFile(path).iter_batches(batch_size=taille):
+            yield lot.to_pylist()
+        return
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        bloc = []
+        for ligne in csv.DictReader(f, delimiter=_delimiteur(f)):
+            bloc.append(ligne)
+            if len(bloc) >= taille:
+                yield bloc
+                bloc = []
+        if bloc:
+            yield bloc
+
+
+def _delimiteur(f) -> str:
+    debut = f.readline()
+    f.seek(0)
+    return ";" if debut.count(";") > debut.count(",") else ","
+
+
+class EcrivainCSV:
+    def __init__(self, path: str):
+        self.f = open(path, "w", newline="", encoding="utf-8")
+        self.w = csv.DictWriter(self.f, fieldnames=HISTORY_COLUMNS)
+        self.w.writeheader()
+
+    def ecrire(self, records: list):
+        self.w.writerows(records)
+        self.f.flush()
+
+    def fermer(self):
+        self.f.close()
+
+
+class EcrivainParquet:
+    def __init__(self, path: str):
+        self.pa, self.pq = _exiger_pyarrow()
+        self.path = path
+        self.writer = None
+
+    def ecrire(self, records: list):
+        if not records:
+            return
+        if self.writer is None:
+            table = self.pa.Table.from_pylist(records)
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = self.pa.Table.from_pylist(records, schema=self.writer.schema)
+        self.writer.write_table(table)
+
+    def fermer(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class EcrivainRejets:
+    """CSV des lignes rejetees (numero, raison, ligne brute en JSON), cree au premier rejet."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.f = None
+        self.n = 0
+
+    def ecrire(self, rejets: list):
+        if not rejets:
+            return
+        if self.f is None:
+            self.f = open(self.path, "w", newline="", encoding="utf-8")
+            self.w = csv.writer(self.f)
+            self.w.writerow(COLONNES_REJETS)
+        self.w.writerows(
+            (numero, erreur, json.dumps(ligne, ensure_ascii=False, default=str)) for numero, ligne, erreur in rejets
+        )
+        self.f.flush()
+        self.n += len(rejets)
+
+    def fermer(self):
+        if self.f is not None:
+            self.f.close()
+
+
+def chemin_rejets(sortie: str) -> str:
+    return f"{os.path.splitext(sortie)[0]}.rejets.csv"
+
+
+# -----------------------------
+# Estimation
+# -----------------------------
+def estimer_bloc(lignes: list, zones: list, params: dict, debut: int = 0):
+    """Valorise un bloc de lignes ; retourne (records, rejets).
+
+    ``rejets`` : [(numero de ligne, ligne brute, raison)] des lignes illisibles
+    ou sans ligne referentiel ; ``debut`` = nombre de lignes des blocs precedents.
+    """
+    biens, numeros, rejets = [], [], []
+    for i, ligne in enumerate(lignes):
+        try:
+            biens.append(bien_depuis_ligne(ligne))
+            numeros.append(i)
+        except (TypeError, ValueError, OverflowError) as e:
+            rejets.append((debut + i + 1, ligne, f"Ligne invalide: {e}"))
+    if not biens:
+        return [], rejets
+    res = valoriser_lot(colonnes_depuis_biens(biens), params, zones)
+    trouve = res["trouve"].tolist()
+
+    records = []
+    for j, (i, bien) in enumerate(zip(numeros, biens)):
+        if not trouve[j]:
+            rejets.append((debut + i + 1, lignes[i], SANS_REFERENTIEL))
+            continue
+        try:
+            records.append(build_record(
+                bien, bien["zone"], float(res["indice"][j]),
+                float(res["valeur_marche"][j]), float(res["total"][j]), float(res["valeur_finale"][j]),
+                float(res["fourchette_basse"][j]), float(res["fourchette_haute"][j]),
+            ))
+        except (TypeError, ValueError, OverflowError) as e:
+            rejets.append((debut + i + 1, lignes[i], f"Ligne invalide: {e}"))
+    rejets.sort(key=lambda r: r[0])
+    return records, rejets
+
+
+def estimer_fichier(entree: str, sortie: str, zones: list = None, params: dict = None,
+                    taille: int = TAILLE_BLOC, rejets: str = None) -> dict:
+    """Estime ``entree`` vers ``sortie`` ; lignes rejetees dans ``rejets`` (defaut ``chemin_rejets(sortie)``).
+
+    Retourne les compteurs (lignes, estimees, invalides, sans_referentiel) et
+    le chemin du fichier de rejets (None si aucun rejet).
+    """
+    zones = DEFAULT_ZONES if zones is None else zones
+    params = DEFAULT_PARAMS if params is None else params
+    ecrivain = EcrivainParquet(sortie) if _est_parquet(sortie) else EcrivainCSV(sortie)
+    ecrivain_rejets = EcrivainRejets(rejets or chemin_rejets(sortie))
+
+    stats = {"lignes": 0, "estimees": 0, "invalides": 0, "sans_referentiel": 0}
+    try:
+        for bloc in lire_blocs(entree, taille):
+            records, rejetes = estimer_bloc(bloc, zones, params, debut=stats["lignes"])
+            ecrivain.ecrire(records)
+            ecrivain_rejets.ecrire(rejetes)
+            stats["lignes"] += len(bloc)
+            stats["estimees"] += len(records)
+            sans_ref = sum(1 for _, _, erreur in rejetes if erreur == SANS_REFERENTIEL)
+            stats["sans_referentiel"] += sans_ref
+            stats["invalides"] += len(rejetes) - sans_ref
+    finally:
+        ecrivain.fermer()
+        ecrivain_rejets.fermer()
+    stats["rejets"] = ecrivain_rejets.path if ecrivain_rejets.n else None
+    return stats
+
+
+def charger_referentiel(path: str) -> list:
+    """Referentiel JSON (liste de lignes) ou CSV (zone, type, base_eur_m2, terrain_eur_m2, commerce_eur_m2)."""
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        return [
+            {
+                "zone": r["zone"],
+                "type": r["type"],
+                "base_eur_m2": _float(r.get("base_eur_m2")),
+                "terrain_eur_m2": _float(r.get("terrain_eur_m2")),
+                "commerce_eur_m2": _float(r.get("commerce_eur_m2")),
+            }
+            for r in csv.DictReader(f, delimiter=_delimiteur(f))
+        ]
+
+
+def charger_params(path: str) -> dict:
+    """Parametres JSON : seules les cles presentes remplacent DEFAULT_PARAMS."""
+    with open(path, encoding="utf-8") as f:
+        return {**DEFAULT_PARAMS, **json.load(f)}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Estimation en masse d'un fichier de biens (CSV / Parquet).")
+    ap.add_argument("entree", help="Fichier de biens (.csv ou .parquet)")
+    ap.add_argument("sortie", help="Fichier d'estimations (.csv ou .parquet)")
+    ap.add_argument("--referentiel", help="Referentiel zones (.json ou .csv), defaut: DEFAULT_ZONES")
+    ap.add_argument("--params", help="Parametres (.json), defaut: DEFAULT_PARAMS")
+    ap.add_argument("--bloc", type=int, default=TAILLE_BLOC, help=f"Lignes par bloc (defaut {TAILLE_BLOC})")
+    ap.add_argument("--rejets", help="Fichier CSV des lignes rejetees, defaut: <sortie>.rejets.csv")
+    args = ap.parse_args(argv)
+
+    zones = charger_referentiel(args.referentiel) if args.referentiel else None
+    params = charger_params(args.params) if args.params else None
+    stats = estimer_fichier(args.entree, args.sortie, zones, params, max(1, args.bloc), args.rejets)
+
+    print(
+        f"{stats['lignes']} lignes lues, {stats['estimees']} estimees, {stats['invalides']} invalides, "
+        f"{stats['sans_referentiel']} sans ligne referentiel (zone + type).",
+        file=sys.stderr,
+    )
+    if stats["rejets"]:
+        print(f"Lignes rejetees : {stats['rejets']}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
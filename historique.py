@@ -0,0 +1,504 @@
+"""Historique persistant des estimations (SQLite, mode WAL).
+
+Les enregistrements gardent le format de ``calculs.build_record`` (cles
+``HISTORY_COLUMNS``) ; chaque ligne lue porte en plus son ``id``. Un prix vendu
+ou une date de vente non renseignes valent ``""`` cote enregistrement et NULL
+en base.
+
+Chaque estimation est indexee par ses dependances (``calculs.dependances`` :
+parametres et ligne referentiel lus par son calcul), ce qui permet de ne
+revaloriser que les estimations touchees par un changement ; les valeurs
+remplacees sont gardees dans la table ``revalorisations``.
+
+Pour les analyses sur tout l'historique, ``HistoriqueColonnes`` garde les
+estimations en colonnes : tableaux NumPy types pour les nombres et booleens,
+codes entiers + liste de categories pour les textes (zones, etats, dates...).
+Les codes des etats techniques sont les index des tuples de ``calculs``,
+directement utilisables par ``batch.valoriser_lot``.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from calculs import (
+    ALIAS_HISTORIQUE,
+    CLE_PRIVEE,
+    CHAMPS_CALCUL,
+    CHAUFFAGE_TYPES,
+    DEFAULT_PARAMS,
+    ETATS_PIECE,
+    HISTORY_COLUMNS,
+    PEB_LETTRES,
+    TOITURE_ETATS,
+    TYPES_BIEN,
+    VITRAGE_TYPES,
+    bien_depuis_record,
+    cle_ligne,
+    cle_param,
+    dependances,
+)
+
+CHEMIN_DEFAUT = os.environ.get("ESTIMATEUR_DB", "historique.sqlite3")
+
+COLONNES_BOOL = {
+    "ascenseur", "toiture_grenier", "garage", "balcon", "terrasse", "jardin", "cave", "grenier_amenageable",
+}
+COLONNES_INT = {"nb_chambres", "nb_sdb", "etage", "nb_places_parking", "nb_etages"}
+COLONNES_REAL = {
+    "surface_m2", "terrain_m2", "peb_kwh", "toiture_surface_grenier", "grenier_amenageable_surface_m2",
+    "indice_etat", "coef_expert_pct", "valeur_marche", "impact_total", "valeur_finale",
+    "fourchette_basse", "fourchette_haute", "prix_vendu",
+}
+# Champs vides ("") stockes en NULL
+COLONNES_OPTIONNELLES = {"prix_vendu", "date_vente"}
+COLONNES_INDEXEES = ("date_estimation", "zone", "type_bien", "commune")
+# Colonnes recalculees par une revalorisation (valeur avant / apres gardees)
+COLONNES_VALEURS = ("valeur_marche", "impact_total", "valeur_finale", "fourchette_basse", "fourchette_haute")
+# Taille des lots de parametres SQL (limite SQLITE_MAX_VARIABLE_NUMBER des anciennes versions)
+TAILLE_LOT_SQL = 500
+# Colonnes texte a libelles connus : premieres categories = tuples de calculs (codes = codes batch)
+CATEGORIES_FIXES = {
+    "type_bien": TYPES_BIEN,
+    "toiture_etat": TOITURE_ETATS,
+    "chauffage_type": CHAUFFAGE_TYPES,
+    "vitrage_type": VITRAGE_TYPES,
+    "peb_lettre": PEB_LETTRES,
+    "cuisine_etat": ETATS_PIECE,
+    "sdb_etat": ETATS_PIECE,
+}
+# Colonnes autorisees pour le tri (jamais de nom de colonne venant de l'UI dans le SQL)
+COLONNES_TRI = (
+    "id", "date_estimation", "client", "commune", "zone", "type_bien", "surface_m2",
+    "valeur_finale", "prix_vendu", "date_vente",
+)
+
+
+def _type_sql(col: str) -> str:
+    if col in COLONNES_BOOL or col in COLONNES_INT:
+        return "INTEGER"
+    if col in COLONNES_REAL:
+        return "REAL"
+    return "TEXT"
+
+
+def parse_prix(valeur) -> float:
+    """Prix saisi librement ("245 000", "245000 €", "245000,50") -> float ; ValueError si illisible."""
+    s = str(valeur).strip().replace("€", "").replace(",", ".")
+    return float("".join(s.split()))
+
+
+def _vers_sql(col: str, v):
+    if col in COLONNES_OPTIONNELLES and (v is None or v == ""):
+        return None
+    if col == "prix_vendu":
+        return parse_prix(v)
+    if col in COLONNES_BOOL:
+        return int(bool(v))
+    return v
+
+
+def _dependances(record: dict) -> frozenset:
+    try:
+        return dependances(record["zone"], bien_depuis_record(record))
+    except (KeyError, TypeError, ValueError):
+        # Enregistrement incomplet : depend de tout (revalorise a chaque changement)
+        return frozenset({cle_ligne(record.get("zone"), record.get("type_bien"))} | {cle_param(k) for k in DEFAULT_PARAMS})
+
+
+def _depuis_sql(col: str, v):
+    if v is None and col in COLONNES_OPTIONNELLES:
+        return ""
+    if col in COLONNES_BOOL:
+        return bool(v)
+    return v
+
+
+# -----------------------------
+# Representation en colonnes
+# -----------------------------
+def _type_codes(n: int):
+    return np.int8 if n <= 127 else np.int16 if n <= 32767 else np.int32
+
+
+def _encoder(valeurs, categories: tuple = ()) -> tuple:
+    """(codes, categories) : codes entiers du plus petit type, categories dans l'ordre d'apparition."""
+    index = {c: i for i, c in enumerate(categories)}
+    codes = np.fromiter((index.setdefault(v, len(index)) for v in valeurs), dtype=np.int32, count=len(valeurs))
+    return codes.astype(_type_codes(len(index))), tuple(index)
+
+
+def _nombres(valeurs, dtype) -> np.ndarray:
+    try:
+        return np.array(valeurs, dtype=dtype)
+    except (TypeError, ValueError):
+        # Valeurs manquantes ("" ou None) : NaN
+        return np.array([np.nan if v is None or v == "" else v for v in valeurs], dtype=float)
+
+
+class HistoriqueColonnes:
+    """Estimations en colonnes (memes valeurs que les enregistrements, sans un dict par ligne).
+
+    ``ids`` : id de chaque ligne (-1 si inconnu) ; ``colonnes`` : nom -> tableau
+    (codes pour les textes) ; ``categories`` : nom -> libelles des codes.
+    """
+
+    def __init__(self, ids: np.ndarray, colonnes: dict, categories: dict):
+        self.ids = ids
+        self.colonnes = colonnes
+        self.categories = categories
+
+    @classmethod
+    def depuis_lignes(cls, lignes: list, noms=HISTORY_COLUMNS) -> "HistoriqueColonnes":
+        """Depuis des tuples ``(id, *colonnes)`` (ordre de ``noms``)."""
+        transpose = list(zip(*lignes)) if lignes else [()] * (len(noms) + 1)
+        ids = np.array([-1 if i is None else i for i in transpose[0]], dtype=np.int64)
+        colonnes, categories = {}, {}
+        for nom, valeurs in zip(noms, transpose[1:]):
+            if nom in COLONNES_BOOL:
+                colonnes[nom] = np.array(valeurs, dtype=bool)
+            elif nom in COLONNES_INT:
+                colonnes[nom] = _nombres(valeurs, np.int32)
+            elif nom in COLONNES_REAL:
+                colonnes[nom] = _nombres(valeurs, float)
+            else:
+                if nom in COLONNES_OPTIONNELLES:
+                    valeurs = ["" if v is None else v for v in valeurs]
+                colonnes[nom], categories[nom] = _encoder(valeurs, CATEGORIES_FIXES.get(nom, ()))
+        return cls(ids, colonnes, categories)
+
+    @classmethod
+    def depuis_records(cls, records: list) -> "HistoriqueColonnes":
+        return cls.depuis_lignes([(r.get("id"), *(r.get(c, "") for c in HISTORY_COLUMNS)) for r in records])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """Taille des tableaux (hors listes de categories)."""
+        return self.ids.nbytes + sum(a.nbytes for a in self.colonnes.values())
+
+    def valeurs(self, nom: str) -> np.ndarray:
+        """Colonne decodee (libelles pour les colonnes texte)."""
+        if nom not in self.categories:
+            return self.colonnes[nom]
+        return np.array(self.categories[nom], dtype=object)[self.colonnes[nom]]
+
+    def selection(self, lignes) -> "HistoriqueColonnes":
+        """Sous-ensemble (masque booleen ou positions), memes categories."""
+        return HistoriqueColonnes(
+            self.ids[lignes], {k: v[lignes] for k, v in self.colonnes.items()}, self.categories
+        )
+
+    def records(self) -> list:
+        """Enregistrements au format ``HistoriqueSQLite.lister`` (``id`` + ``HISTORY_COLUMNS``)."""
+        listes = [self.ids.tolist()]
+        for nom in HISTORY_COLUMNS:
+            valeurs = self.valeurs(nom)
+            if valeurs.dtype.kind == "f" and np.isnan(valeurs).any():
+                manquant = "" if nom in COLONNES_OPTIONNELLES else None
+                listes.append([manquant if v != v else v for v in valeurs.tolist()])
+            elif nom in COLONNES_INT and valeurs.dtype.kind == "f":
+                listes.append([int(v) for v in valeurs.tolist()])
+            else:
+                listes.append(valeurs.tolist())
+        return [dict(zip(("id",) + HISTORY_COLUMNS, ligne)) for ligne in zip(*listes)]
+
+    def colonnes_calcul(self) -> dict:
+        """Colonnes ``batch.valoriser_lot`` (champs de calcul + ``zone``).
+
+        Etats passes en codes quand toutes les categories sont connues, en
+        libelles sinon (normalisation des libelles par ``batch``) ; zone et
+        type en libelles (recherche dans le referentiel).
+        """
+        col = {}
+        for k in CHAMPS_CALCUL + ("zone",):
+            nom = ALIAS_HISTORIQUE.get(k, k)
+            fixes = CATEGORIES_FIXES.get(nom)
+            if k != "type" and fixes is not None and len(self.categories[nom]) == len(fixes):
+                col[k] = self.colonnes[nom]
+            else:
+                col[k] = self.valeurs(nom)
+        return col
+
+
+class HistoriqueSQLite:
+    """Depot des estimations : ajout (unitaire ou par lot), lecture, mise a jour de la vente.
+
+    Une connexion partagee entre les threads Streamlit, protegee par un verrou ;
+    le mode WAL laisse les lecteurs d'autres processus lire pendant une ecriture.
+    """
+
+    def __init__(self, chemin: str = CHEMIN_DEFAUT):
+        self.chemin = chemin
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(chemin, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self._lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            colonnes = ", ".join(f"{c} {_type_sql(c)}" for c in HISTORY_COLUMNS)
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS estimations (id INTEGER PRIMARY KEY AUTOINCREMENT, {colonnes})")
+            for col in COLONNES_INDEXEES:
+                self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_estimations_{col} ON estimations({col})")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_estimations_zone_type_date "
+                "ON estimations(zone, type_bien, date_estimation)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS dependances "
+                "(cle TEXT NOT NULL, estimation_id INTEGER NOT NULL, PRIMARY KEY (cle, estimation_id)) WITHOUT ROWID"
+            )
+            avant_apres = ", ".join(f"{c}_avant REAL, {c}_apres REAL" for c in COLONNES_VALEURS)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS revalorisations (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                f"estimation_id INTEGER NOT NULL, date TEXT, motif TEXT, {avant_apres})"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_revalorisations_estimation ON revalorisations(estimation_id)"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS etat (cle TEXT PRIMARY KEY, valeur TEXT)")
+            self._indexer_dependances()
+
+    def _indexer_dependances(self):
+        """Dependances des estimations qui n'en ont pas encore (bases anterieures)."""
+        rows = self.conn.execute(
+            "SELECT * FROM estimations WHERE id NOT IN (SELECT DISTINCT estimation_id FROM dependances)"
+        ).fetchall()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO dependances (cle, estimation_id) VALUES (?, ?)",
+            [(cle, row["id"]) for row in rows for cle in _dependances(self._record(row))],
+        )
+
+    def _record(self, row: sqlite3.Row) -> dict:
+        rec = {"id": row["id"]}
+        for col in HISTORY_COLUMNS:
+            rec[col] = _depuis_sql(col, row[col])
+        return rec
+
+    # -----------------------------
+    # Ecriture
+    # -----------------------------
+    def ajouter_lot(self, records: list, prives=None) -> list:
+        """Insere tous les enregistrements en une transaction ; retourne leurs ids.
+
+        ``prives`` : un booleen par enregistrement, vrai si ses valeurs ont ete
+        calculees avec des surcharges privees (jamais revalorise, cle ``CLE_PRIVEE``).
+        """
+        prives = [False] * len(records) if prives is None else list(prives)
+        sql = (
+            f"INSERT INTO estimations ({', '.join(HISTORY_COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in HISTORY_COLUMNS)})"
+        )
+        lignes = [tuple(_vers_sql(c, r.get(c, "")) for c in HISTORY_COLUMNS) for r in records]
+        with self._lock, self.conn:
+            cur = self.conn.cursor()
+            ids = []
+            for ligne in lignes:
+                cur.execute(sql, ligne)
+                ids.append(cur.lastrowid)
+            cur.executemany(
+                "INSERT OR IGNORE INTO dependances (cle, estimation_id) VALUES (?, ?)",
+                [(cle, id_) for id_, r in zip(ids, records) for cle in _dependances(r)]
+                + [(CLE_PRIVEE, id_) for id_, prive in zip(ids, prives) if prive],
+            )
+        return ids
+
+    def ajouter(self, record: dict, prive: bool = False) -> int:
+        return self.ajouter_lot([record], [prive])[0]
+
+    def mettre_a_jour_vente(self, id_: int, prix_vendu, date_vente: str):
+        """Enregistre (ou efface, si vides) le prix et la date de vente d'une estimation."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "UPDATE estimations SET prix_vendu = ?, date_vente = ? WHERE id = ?",
+                (_vers_sql("prix_vendu", prix_vendu), _vers_sql("date_vente", date_vente), int(id_)),
+            )
+
+    def revaloriser(self, valeurs: dict, motif: str = "", etat: tuple = None) -> int:
+        """Remplace les ``COLONNES_VALEURS`` des estimations ``{id: {colonne: valeur}}``.
+
+        Les anciennes et nouvelles valeurs sont ajoutees a ``revalorisations``
+        dans la meme transaction. ``etat`` : (cle, avant, apres) ; la cle d'etat
+        passe de ``avant`` (None : absente) a ``apres`` dans la transaction, et
+        rien n'est ecrit (retour 0) si un autre processus l'a deja changee.
+        """
+        if etat is None and not valeurs:
+            return 0
+        date_ = datetime.now().isoformat(timespec="seconds")
+        maj = f"UPDATE estimations SET {', '.join(f'{c} = ?' for c in COLONNES_VALEURS)} WHERE id = ?"
+        trace = (
+            f"INSERT INTO revalorisations (estimation_id, date, motif, "
+            f"{', '.join(f'{c}_avant, {c}_apres' for c in COLONNES_VALEURS)}) "
+            f"VALUES (?, ?, ?, {', '.join('?' for _ in range(2 * len(COLONNES_VALEURS)))})"
+        )
+        colonnes = ", ".join(COLONNES_VALEURS)
+        with self._lock, self.conn:
+            if etat is not None and not self._remplacer_etat(*etat):
+                return 0
+            for id_, nouvelles in valeurs.items():
+                avant = self.conn.execute(f"SELECT {colonnes} FROM estimations WHERE id = ?", (int(id_),)).fetchone()
+                if avant is None:
+                    continue
+                apres = [nouvelles.get(c, avant[c]) for c in COLONNES_VALEURS]
+                self.conn.execute(maj, (*apres, int(id_)))
+                self.conn.execute(
+                    trace, (int(id_), date_, motif, *(v for c, a in zip(avant, apres) for v in (c, a)))
+                )
+        return len(valeurs)
+
+    def _remplacer_etat(self, cle: str, avant, apres) -> bool:
+        # Dans la transaction de l'appelant : vrai si l'etat valait encore ``avant``
+        texte = json.dumps(apres, ensure_ascii=False)
+        if avant is None:
+            cur = self.conn.execute("INSERT OR IGNORE INTO etat (cle, valeur) VALUES (?, ?)", (cle, texte))
+        else:
+            cur = self.conn.execute(
+                "UPDATE etat SET valeur = ? WHERE cle = ? AND valeur = ?",
+                (texte, cle, json.dumps(avant, ensure_ascii=False)),
+            )
+        return cur.rowcount == 1
+
+    def ecrire_etat(self, cle: str, valeur):
+        """Memorise une valeur JSON dans la base (etat partage entre processus)."""
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO etat (cle, valeur) VALUES (?, ?)", (cle, json.dumps(valeur, ensure_ascii=False))
+            )
+
+    # -----------------------------
+    # Lecture
+    # -----------------------------
+    @staticmethod
+    def _filtre(zone=None, type_bien=None, date_debut=None, date_fin=None, vendu=None):
+        """Clause WHERE parametree + arguments ; dates ISO (YYYY-MM-DD) incluses."""
+        conditions, args = [], []
+        if zone:
+            conditions.append("zone = ?")
+            args.append(zone)
+        if type_bien:
+            conditions.append("type_bien = ?")
+            args.append(type_bien)
+        if date_debut:
+            conditions.append("date_estimation >= ?")
+            args.append(str(date_debut))
+        if date_fin:
+            conditions.append("date_estimation <= ?")
+            args.append(str(date_fin))
+        if vendu is not None:
+            conditions.append("prix_vendu IS NOT NULL" if vendu else "prix_vendu IS NULL")
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", args
+
+    def lister(self, limite: int = None, decalage: int = 0, tri: str = "id", descendant: bool = True,
+               **filtres) -> list:
+        """Estimations filtrees (zone, type_bien, date_debut, date_fin, vendu), triees, une page a la fois.
+
+        Par defaut : de la plus recente a la plus ancienne, sans limite.
+        """
+        if tri not in COLONNES_TRI:
+            raise ValueError(f"Tri non autorise: {tri}")
+        where, args = self._filtre(**filtres)
+        sens = "DESC" if descendant else "ASC"
+        sql = f"SELECT * FROM estimations{where} ORDER BY {tri} {sens}"
+        if tri != "id":
+            sql += f", id {sens}"
+        if limite is not None:
+            sql += " LIMIT ? OFFSET ?"
+            args += [int(limite), int(decalage)]
+        with self._lock:
+            return [self._record(r) for r in self.conn.execute(sql, args)]
+
+    def valeurs_distinctes(self, col: str) -> list:
+        """Valeurs distinctes d'une colonne indexee (listes des filtres)."""
+        if col not in COLONNES_INDEXEES:
+            raise ValueError(f"Colonne non indexee: {col}")
+        with self._lock:
+            rows = self.conn.execute(f"SELECT DISTINCT {col} FROM estimations WHERE {col} IS NOT NULL ORDER BY {col}")
+            return [r[0] for r in rows]
+
+    def obtenir(self, id_: int):
+        with self._lock:
+            row = self.conn.execute("SELECT * FROM estimations WHERE id = ?", (int(id_),)).fetchone()
+        return self._record(row) if row else None
+
+    def obtenir_lot(self, ids) -> list:
+        """Estimations des ``ids`` (ordre croissant d'id ; ids inconnus ignores)."""
+        ids = sorted({int(i) for i in ids})
+        records = []
+        with self._lock:
+            for i in range(0, len(ids), TAILLE_LOT_SQL):
+                lot = ids[i:i + TAILLE_LOT_SQL]
+                rows = self.conn.execute(
+                    f"SELECT * FROM estimations WHERE id IN ({', '.join('?' for _ in lot)}) ORDER BY id", lot
+                )
+                records.extend(self._record(r) for r in rows)
+        return records
+
+    def ids_dependants(self, cles, exclure=()) -> list:
+        """Ids des estimations dont le calcul lit au moins une des ``cles`` (``calculs.dependances``).
+
+        Estimations ayant une des cles ``exclure`` (ex. ``CLE_PRIVEE``) : omises.
+        """
+        if exclure:
+            exclues = set(self.ids_dependants(exclure))
+            return [i for i in self.ids_dependants(cles) if i not in exclues]
+        cles = sorted(set(cles))
+        ids = set()
+        with self._lock:
+            for i in range(0, len(cles), TAILLE_LOT_SQL):
+                lot = cles[i:i + TAILLE_LOT_SQL]
+                rows = self.conn.execute(
+                    f"SELECT DISTINCT estimation_id FROM dependances WHERE cle IN ({', '.join('?' for _ in lot)})", lot
+                )
+                ids.update(r[0] for r in rows)
+        return sorted(ids)
+
+    def colonnes(self, ids=None, **filtres) -> HistoriqueColonnes:
+        """Estimations filtrees (comme ``lister``) ou des ``ids``, en colonnes, par id croissant."""
+        select = f"SELECT id, {', '.join(HISTORY_COLUMNS)} FROM estimations"
+        if ids is None:
+            where, args = self._filtre(**filtres)
+            requetes = [(f"{select}{where} ORDER BY id", args)]
+        else:
+            ids = sorted({int(i) for i in ids})
+            requetes = [
+                (f"{select} WHERE id IN ({', '.join('?' for _ in lot)}) ORDER BY id", lot)
+                for lot in (ids[i:i + TAILLE_LOT_SQL] for i in range(0, len(ids), TAILLE_LOT_SQL))
+            ]
+        lignes = []
+        with self._lock:
+            cur = self.conn.cursor()
+            # Tuples bruts : pas d'objet sqlite3.Row par ligne
+            cur.row_factory = None
+            for sql, args in requetes:
+                lignes.extend(cur.execute(sql, args).fetchall())
+        return HistoriqueColonnes.depuis_lignes(lignes)
+
+    def revalorisations(self, limite: int = 100, estimation_id: int = None) -> list:
+        """Dernieres revalorisations (valeurs avant / apres), de la plus recente a la plus ancienne."""
+        sql, args = "SELECT * FROM revalorisations", []
+        if estimation_id is not None:
+            sql += " WHERE estimation_id = ?"
+            args.append(int(estimation_id))
+        sql += " ORDER BY id DESC LIMIT ?"
+        args.append(int(limite))
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(sql, args)]
+
+    def lire_etat(self, cle: str):
+        with self._lock:
+            row = self.conn.execute("SELECT valeur FROM etat WHERE cle = ?", (cle,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def compter(self, **filtres) -> int:
+        where, args = self._filtre(**filtres)
+        with self._lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM estimations{where}", args).fetchone()[0]
+
+    def fermer(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,132 @@
+"""Bande d'incertitude Monte Carlo de la valeur finale (P10 / P50 / P90).
+
+Complement optionnel de ``fourchette_from_indice`` : au lieu d'un pourcentage
+fixe, on tire N variantes du dossier et on lit les percentiles de la valeur
+finale. Sources d'incertitude :
+
+- surface mesuree : ecart relatif normal (``surface_pct``) ;
+- prix du referentiel : un facteur normal commun aux EUR/m2 bati, terrain et
+  commerce (``eur_m2_pct``) ;
+- etats techniques (toiture, chauffage, cuisine, salle de bain, vitrage,
+  lettre PEB) : avec la probabilite ``etat_proba``, l'etat observe est decale
+  d'un cran (meilleur ou moins bon, a parts egales). Les crans suivent les
+  notes de l'indice (``NOTES_*``), du meilleur au moins bon.
+
+Les N tirages sont valorises en une passe ``batch.valoriser_lot``. Le
+generateur est graine : memes entrees + meme graine = meme bande, ce qui rend
+le rapport PDF reproductible.
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from batch import COLONNES_REFERENTIEL, valoriser_lot
+from calculs import (
+    CHAMPS_CALCUL,
+    CHAUFFAGE_TYPES,
+    ETATS_PIECE,
+    NOTES_CHAUFFAGE,
+    NOTES_CUISINE,
+    NOTES_PEB,
+    NOTES_SDB,
+    NOTES_TOITURE,
+    NOTES_VITRAGE,
+    PEB_LETTRES,
+    TOITURE_ETATS,
+    VITRAGE_TYPES,
+    compile_params,
+)
+
+TIRAGES_DEFAUT = 100_000
+GRAINE_DEFAUT = 2024
+
+INCERTITUDES_DEFAUT = {
+    "surface_pct": 0.03,
+    "eur_m2_pct": 0.08,
+    "etat_proba": 0.20,
+}
+
+
+def _par_note(libelles: tuple, notes: dict) -> tuple:
+    return tuple(sorted(libelles, key=notes.get, reverse=True))
+
+
+# Etats pouvant etre decales d'un cran : (libelles dans l'ordre des codes de batch,
+# meme libelles du meilleur au moins bon)
+ETATS_ORDONNES = {
+    "toiture_etat": (TOITURE_ETATS, _par_note(TOITURE_ETATS, NOTES_TOITURE)),
+    "chauffage_type": (CHAUFFAGE_TYPES, _par_note(CHAUFFAGE_TYPES, NOTES_CHAUFFAGE)),
+    "cuisine_etat": (ETATS_PIECE, _par_note(ETATS_PIECE, NOTES_CUISINE)),
+    "sdb_etat": (ETATS_PIECE, _par_note(ETATS_PIECE, NOTES_SDB)),
+    "vitrage_type": (VITRAGE_TYPES, _par_note(VITRAGE_TYPES, NOTES_VITRAGE)),
+    "peb_lettre": (PEB_LETTRES, _par_note(PEB_LETTRES, NOTES_PEB)),
+}
+
+
+@dataclass(frozen=True)
+class BandeMonteCarlo:
+    p10: float
+    p50: float
+    p90: float
+    moyenne: float
+    tirages: int
+    graine: int
+
+
+def _decaler(libelle: str, libelles: tuple, ordre: tuple, proba: float, rng, n: int) -> np.ndarray:
+    """Codes d'etat tires (index dans ``libelles``) : etat observe, decale de +/-1 cran d'``ordre`` avec la probabilite ``proba``."""
+    normalise = (libelle or "").strip().upper() if libelles is PEB_LETTRES else libelle
+    if normalise not in libelles:
+        # Libelle inconnu : impact/note par defaut, pas de decalage possible
+        return np.full(n, -1, dtype=np.intp)
+    u = rng.random(n)
+    pas = np.where(u < proba / 2, -1, np.where(u < proba, 1, 0))
+    rangs = np.clip(ordre.index(normalise) + pas, 0, len(ordre) - 1)
+    return np.array([libelles.index(l) for l in ordre], dtype=np.intp)[rangs]
+
+
+def tirer_colonnes(zone_row: dict, bien: dict, tirages: int = TIRAGES_DEFAUT, graine: int = GRAINE_DEFAUT,
+                   incertitudes: dict = None) -> dict:
+    """Colonnes ``valoriser_lot`` des ``tirages`` variantes du dossier."""
+    inc = {**INCERTITUDES_DEFAUT, **(incertitudes or {})}
+    rng = np.random.default_rng(graine)
+    n = int(tirages)
+
+    col = {k: np.array([bien[k]]) for k in CHAMPS_CALCUL if k in bien}
+    col["surface"] = np.maximum(float(bien["surface"]) * (1.0 + rng.normal(0.0, inc["surface_pct"], n)), 0.0)
+    facteur = np.maximum(1.0 + rng.normal(0.0, inc["eur_m2_pct"], n), 0.0)
+    for k in COLONNES_REFERENTIEL:
+        col[k] = float(zone_row.get(k, 0)) * facteur
+    for k, (libelles, ordre) in ETATS_ORDONNES.items():
+        if k in bien:
+            col[k] = _decaler(bien[k], libelles, ordre, inc["etat_proba"], rng, n)
+    return col
+
+
+@lru_cache(maxsize=64)
+def _simuler_memo(cle_zone: tuple, cle_bien: tuple, p, tirages: int, graine: int, cle_inc: tuple) -> BandeMonteCarlo:
+    res = valoriser_lot(tirer_colonnes(dict(cle_zone), dict(cle_bien), tirages, graine, dict(cle_inc)), p)
+    p10, p50, p90 = np.percentile(res["valeur_finale"], [10, 50, 90])
+    return BandeMonteCarlo(
+        p10=float(p10),
+        p50=float(p50),
+        p90=float(p90),
+        moyenne=float(res["valeur_finale"].mean()),
+        tirages=int(tirages),
+        graine=int(graine),
+    )
+
+
+def simuler(zone_row: dict, bien: dict, params, tirages: int = TIRAGES_DEFAUT, graine: int = GRAINE_DEFAUT,
+            incertitudes: dict = None) -> BandeMonteCarlo:
+    """Percentiles P10/P50/P90 de la valeur finale sur ``tirages`` variantes du dossier (memoise)."""
+    inc = {**INCERTITUDES_DEFAUT, **(incertitudes or {})}
+    return _simuler_memo(
+        tuple((k, zone_row.get(k, 0)) for k in COLONNES_REFERENTIEL),
+        tuple((k, bien[k]) for k in CHAMPS_CALCUL if k in bien),
+        compile_params(params),
+        int(tirages),
+        int(graine),
+        tuple(sorted(inc.items())),
+    )
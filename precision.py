@@ -0,0 +1,151 @@
+"""Precision des estimations sur les ventes : agregats incrementaux par groupe.
+
+Pour chaque vente (estimation avec ``prix_vendu``), l'ecart est
+``valeur_finale - prix_vendu`` (positif = surestimation). Chaque groupe garde
+des sommes (nombre, ecart, |ecart|, ecart^2, ecarts relatifs, position du prix
+par rapport a la fourchette) : une vente nouvelle, corrigee ou retiree met a
+jour les sommes de ses groupes sans relire l'historique, et les indicateurs
+(MAE, MAPE, RMSE, biais, part dans la fourchette) sont lus dans les sommes.
+
+Groupes : tout l'historique, zone, type, tranche d'indice (paliers de
+``fourchette_from_indice``) et tranche de coefficient expert.
+"""
+import threading
+
+import numpy as np
+
+from historique import HistoriqueColonnes
+
+DIMENSIONS = ("zone", "type_bien", "indice", "coef_expert")
+
+BORNES_INDICE = (4.0, 6.0, 8.0)
+TRANCHES_INDICE = ("< 4", "4 - 6", "6 - 8", ">= 8")
+TRANCHES_COEF = ("< -2 %", "-2 a 0 %", "0 %", "0 a +2 %", "> +2 %")
+
+# Colonnes des sommes par groupe
+TERMES = ("n", "ecart", "ecart_abs", "ecart_carre", "ecart_pct", "ecart_pct_abs", "n_pct", "dans", "sous", "sur")
+_T = {t: i for i, t in enumerate(TERMES)}
+
+
+def _termes(col: HistoriqueColonnes, prix: np.ndarray) -> np.ndarray:
+    """Matrice (ventes, TERMES)."""
+    valeur = col.valeurs("valeur_finale")
+    basse, haute = col.valeurs("fourchette_basse"), col.valeurs("fourchette_haute")
+    ecart = valeur - prix
+    pct_ok = prix != 0
+    pct = np.where(pct_ok, ecart / np.where(pct_ok, prix, 1.0), 0.0)
+    t = np.empty((len(prix), len(TERMES)))
+    t[:, _T["n"]] = 1.0
+    t[:, _T["ecart"]] = ecart
+    t[:, _T["ecart_abs"]] = np.abs(ecart)
+    t[:, _T["ecart_carre"]] = ecart ** 2
+    t[:, _T["ecart_pct"]] = pct
+    t[:, _T["ecart_pct_abs"]] = np.abs(pct)
+    t[:, _T["n_pct"]] = pct_ok
+    t[:, _T["dans"]] = (prix >= basse) & (prix <= haute)
+    t[:, _T["sous"]] = prix < basse
+    t[:, _T["sur"]] = prix > haute
+    return t
+
+
+def _groupes(col: HistoriqueColonnes, dimension: str) -> tuple:
+    """(code de groupe par vente, libelles des codes)."""
+    if dimension in ("zone", "type_bien"):
+        return col.colonnes[dimension].astype(np.intp), col.categories[dimension]
+    if dimension == "indice":
+        return np.searchsorted(BORNES_INDICE, col.valeurs("indice_etat"), side="right"), TRANCHES_INDICE
+    c = col.valeurs("coef_expert_pct")
+    return np.select([c < -2.0, c < 0.0, c == 0.0, c <= 2.0], [0, 1, 2, 3], 4), TRANCHES_COEF
+
+
+def indicateurs(sommes: np.ndarray) -> dict:
+    """Indicateurs d'un groupe a partir de ses sommes (None si aucune vente)."""
+    n = sommes[_T["n"]]
+    if n < 0.5:
+        return None
+    n_pct = sommes[_T["n_pct"]]
+    return {
+        "n": int(round(n)),
+        "mae": float(sommes[_T["ecart_abs"]] / n),
+        # Sommes retranchees : ne pas laisser un arrondi rendre la variance negative
+        "rmse": float(np.sqrt(max(sommes[_T["ecart_carre"]] / n, 0.0))),
+        "biais": float(sommes[_T["ecart"]] / n),
+        "mape": float(sommes[_T["ecart_pct_abs"]] / n_pct) if n_pct > 0 else None,
+        "biais_pct": float(sommes[_T["ecart_pct"]] / n_pct) if n_pct > 0 else None,
+        "dans_fourchette": float(sommes[_T["dans"]] / n),
+        "sous_fourchette": float(sommes[_T["sous"]] / n),
+        "sur_fourchette": float(sommes[_T["sur"]] / n),
+    }
+
+
+class AgregatsPrecision:
+    """Sommes par groupe des ecarts estimation / prix vendu, alimentees par ``ajouter_ventes``."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sommes = {"global": np.zeros(len(TERMES)), **{d: {} for d in DIMENSIONS}}
+        # id -> prix deja integre (une correction retire l'ancienne contribution)
+        self._prix = {}
+
+    def _accumuler(self, col: HistoriqueColonnes, prix: np.ndarray, signe: float):
+        t = _termes(col, prix)
+        garde = np.isfinite(t).all(axis=1)
+        if not garde.all():
+            col, t = col.selection(garde), t[garde]
+        if not len(t):
+            return
+        self.sommes["global"] += signe * t.sum(axis=0)
+        for dimension in DIMENSIONS:
+            codes, libelles = _groupes(col, dimension)
+            groupes = self.sommes[dimension]
+            for code in np.unique(codes).tolist():
+                s = groupes.setdefault(libelles[code], np.zeros(len(TERMES)))
+                s += signe * t[codes == code].sum(axis=0)
+
+    def ajouter_ventes(self, ventes) -> int:
+        """Integre les ventes nouvelles, corrigees ou retirees (prix efface) ; retourne le nombre de lignes traitees.
+
+        ``ventes`` : enregistrements (``HistoriqueSQLite.lister`` / ``obtenir``) ou ``HistoriqueColonnes``.
+        """
+        col = ventes if isinstance(ventes, HistoriqueColonnes) else HistoriqueColonnes.depuis_records(list(ventes))
+        prix_vendus = col.valeurs("prix_vendu")
+        with self._lock:
+            nouvelles, anciennes, anciens_prix = [], [], []
+            for i, (id_, prix) in enumerate(zip(col.ids.tolist(), prix_vendus.tolist())):
+                if prix != prix:
+                    # NaN : pas (ou plus) de prix vendu
+                    prix = None
+                connu = self._prix.get(id_) if id_ >= 0 else None
+                if connu == prix:
+                    continue
+                if connu is not None:
+                    anciennes.append(i)
+                    anciens_prix.append(connu)
+                    del self._prix[id_]
+                if prix is not None:
+                    nouvelles.append(i)
+                    if id_ >= 0:
+                        self._prix[id_] = prix
+            if anciennes:
+                self._accumuler(col.selection(anciennes), np.array(anciens_prix), -1.0)
+            if nouvelles:
+                lignes = col.selection(nouvelles)
+                self._accumuler(lignes, lignes.valeurs("prix_vendu"), 1.0)
+            return len(nouvelles) + len(anciennes)
+
+    def resume(self) -> dict:
+        """Indicateurs sur toutes les ventes (None si aucune)."""
+        with self._lock:
+            return indicateurs(self.sommes["global"])
+
+    def par(self, dimension: str) -> list:
+        """Indicateurs par groupe de ``dimension`` (groupes sans vente omis), par nombre de ventes decroissant."""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Dimension inconnue: {dimension}")
+        with self._lock:
+            lignes = [
+                {"groupe": groupe, **ind}
+                for groupe, s in self.sommes[dimension].items()
+                if (ind := indicateurs(s)) is not None
+            ]
+        return sorted(lignes, key=lambda l: -l["n"])
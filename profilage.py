@@ -0,0 +1,142 @@
+"""Profilage des reruns : chronometres par etape, percentiles glissants, journal JSONL.
+
+Un ``Profileur`` par session Streamlit. Entre ``demarrer()`` et ``terminer()``,
+il est le profileur actif du contexte : ``etape(nom)`` et ``mesurer(nom, fn)``
+chronometrent alors le bloc ou l'appel, sinon ils ne coutent presque rien (les
+modules de calcul peuvent donc les garder en permanence).
+
+Les etapes imbriquees sont nommees par leur chemin (``onglet_technique/valorisation``).
+Une etape executee plusieurs fois dans un rerun est cumulee. Un rerun partiel
+(fragment Streamlit) a pour portee le nom du fragment et son temps total est
+enregistre sous ``total_<portee>``.
+
+Chaque rerun termine ajoute une ligne JSON au journal, par exemple :
+
+    {"date": "...", "session": "3f2a9c1b", "rerun": 12, "portee": "app", "interrompu": false,
+     "etapes_ms": {"total": 41.2, "onglet_technique/valorisation": 0.02, ...}}
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+
+FENETRE_DEFAUT = 200
+JOURNAL_DEFAUT = os.environ.get("ESTIMATEUR_PROFIL_LOG", "profil_reruns.jsonl")
+PERCENTILES = (50, 90, 99)
+
+_actif = ContextVar("profileur_actif", default=None)
+_INACTIF = nullcontext()
+_verrou_journal = threading.Lock()
+
+
+def etape(nom: str):
+    """Chronometre le bloc ``with`` dans le profileur actif (aucun effet sinon)."""
+    profileur = _actif.get()
+    return _INACTIF if profileur is None else profileur.etape(nom)
+
+
+def mesurer(nom: str, fn, *args):
+    """``fn(*args)``, chronometre comme etape ``nom`` si un profileur est actif."""
+    profileur = _actif.get()
+    if profileur is None:
+        return fn(*args)
+    with profileur.etape(nom):
+        return fn(*args)
+
+
+def _percentile(valeurs: list, p: float) -> float:
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100.0 * (len(valeurs) - 1))))]
+
+
+class Profileur:
+    """Durees (ms) par etape sur les ``fenetre`` derniers reruns, et journal optionnel."""
+
+    def __init__(self, fenetre: int = FENETRE_DEFAUT, journal: str = None):
+        self.fenetre = fenetre
+        self.journal = journal
+        self.session = uuid.uuid4().hex[:8]
+        self.reruns = 0
+        self.dernier = {}
+        self.durees = {}
+        self._courant = None
+        self._pile = []
+        self._t0 = 0.0
+        self.portee = "app"
+
+    def demarrer(self, portee: str = "app"):
+        """Debut d'un rerun (``portee`` : "app" ou nom du fragment).
+
+        Un rerun precedent non termine est enregistre comme interrompu.
+        """
+        if self._courant is not None:
+            self.terminer(interrompu=True)
+        self.portee = portee
+        self._courant = {}
+        self._pile = []
+        self._t0 = time.perf_counter()
+        _actif.set(self)
+
+    @contextmanager
+    def etape(self, nom: str):
+        if self._courant is None:
+            yield
+            return
+        self._pile.append(nom)
+        chemin = "/".join(self._pile)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._courant[chemin] = self._courant.get(chemin, 0.0) + (time.perf_counter() - t0) * 1000.0
+            self._pile.pop()
+
+    def terminer(self, interrompu: bool = False) -> dict:
+        """Clot le rerun courant : durees ajoutees aux fenetres glissantes et au journal."""
+        if self._courant is None:
+            return self.dernier
+        total = "total" if self.portee == "app" else f"total_{self.portee}"
+        etapes = {total: (time.perf_counter() - self._t0) * 1000.0, **self._courant}
+        self._courant = None
+        if _actif.get() is self:
+            _actif.set(None)
+        self.reruns += 1
+        for nom, ms in etapes.items():
+            self.durees.setdefault(nom, deque(maxlen=self.fenetre)).append(ms)
+        self.dernier = etapes
+        if self.journal:
+            self._journaliser(etapes, interrompu)
+        return etapes
+
+    def _journaliser(self, etapes: dict, interrompu: bool):
+        ligne = json.dumps({
+            "date": datetime.now().isoformat(timespec="milliseconds"),
+            "session": self.session,
+            "rerun": self.reruns,
+            "portee": self.portee,
+            "interrompu": interrompu,
+            "etapes_ms": {k: round(v, 3) for k, v in etapes.items()},
+        })
+        with _verrou_journal, open(self.journal, "a", encoding="utf-8") as f:
+            f.write(ligne + "\n")
+
+    def reinitialiser(self):
+        self.dernier = {}
+        self.durees = {}
+
+    def tableau(self) -> list:
+        """Une ligne par etape : dernier rerun et percentiles sur la fenetre glissante."""
+        lignes = []
+        for nom in sorted(self.durees, key=lambda n: (not n.startswith("total"), n)):
+            valeurs = list(self.durees[nom])
+            ligne = {"etape": nom, "dernier_ms": round(self.dernier[nom], 3) if nom in self.dernier else None}
+            for p in PERCENTILES:
+                ligne[f"p{p}_ms"] = round(_percentile(valeurs, p), 3)
+            ligne["n"] = len(valeurs)
+            lignes.append(ligne)
+        return lignes
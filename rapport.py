@@ -0,0 +1,396 @@
+"""Rapport vendeur PDF (3 pages) et cache des rapports deja generes."""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date
+from functools import lru_cache
+from io import BytesIO
+from types import SimpleNamespace
+
+from calculs import compile_params, euro, safe_text, valoriser
+
+
+# ReportLab et PIL ne sont importes qu'a la premiere generation de PDF :
+# importer ce module (ou le coeur de calcul) reste rapide.
+@lru_cache(maxsize=None)
+def _rl() -> SimpleNamespace:
+    from reportlab import rl_config
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+
+    return SimpleNamespace(A4=A4, ImageReader=ImageReader, canvas=canvas, rl_config=rl_config)
+
+
+# Rendus du processus serialises : ``rl_config.useA85`` n'est change que sous ce verrou
+_rendu_lock = threading.Lock()
+
+
+@contextmanager
+def _sans_a85():
+    """Flux binaires (sans encodage ASCII85) le temps d'un document : plus compacts et bien plus rapides.
+
+    ReportLab n'a pas d'option par document : ``rl_config.useA85`` est global
+    et lu pendant tout le rendu. Il est change puis restaure sous un verrou de
+    module, et tous les rendus de ce module le prennent : un autre rapport ne
+    voit jamais la valeur d'un rendu en cours (le rendu etant lie au GIL, la
+    serialisation ne coute pas de parallelisme ; ``rapports_lot`` rend dans des
+    processus distincts).
+    """
+    rl_config = _rl().rl_config
+    with _rendu_lock:
+        avant = rl_config.useA85
+        rl_config.useA85 = 0
+        try:
+            yield
+        finally:
+            rl_config.useA85 = avant
+
+
+@lru_cache(maxsize=None)
+def _pil():
+    try:
+        from PIL import Image
+    except Exception:
+        return None
+    return Image
+
+
+AGENCE = "LA PRIORITE IMMOBILIERE"
+EMAIL = "sbelhmira@gmail.com"
+LOGO_PATH = "assets/logo.png"
+
+
+# Logo redimensionne a sa taille d'affichage (140 x 80 pt) a cette resolution
+LOGO_DPI = 300
+LOGO_BOX = (140, 80)
+
+
+def _logo(path: str):
+    """Logo decode une seule fois par version du fichier (None si absent ou PIL indisponible)."""
+    try:
+        modifie = os.stat(path).st_mtime_ns
+    except OSError:
+        # Absent : rien en cache, un logo ajoute ensuite est pris en compte
+        return None
+    return _logo_decode(path, modifie)
+
+
+@lru_cache(maxsize=4)
+def _logo_decode(path: str, modifie: int):
+    Image = _pil()
+    if Image is None:
+        return None
+    try:
+        img = Image.open(path)
+        img.load()
+    except Exception:
+        return None
+    taille = tuple(round(d * LOGO_DPI / 72) for d in LOGO_BOX)
+    if img.width > taille[0] or img.height > taille[1]:
+        img = img.resize(taille, Image.LANCZOS)
+    return _rl().ImageReader(img)
+
+
+def _gabarit_entete(c) -> str:
+    """Habillage commun des en-tetes (logo, agence, contact, date, filet).
+
+    Dessine une seule fois par document sous forme de XObject, puis reutilise
+    sur chaque page : le logo n'est embarque qu'une fois.
+    """
+    nom = "entete"
+    if c.hasForm(nom):
+        return nom
+
+    w, h = _rl().A4
+    c.beginForm(nom)
+    logo = _logo(LOGO_PATH)
+    if logo is not None:
+        try:
+            c.drawImage(logo, 40, h - 120, width=LOGO_BOX[0], height=LOGO_BOX[1], mask="auto")
+        except Exception:
+            pass
+    c.setFont("Helvetica", 10)
+    c.drawString(200, h - 72, AGENCE)
+    c.drawString(200, h - 86, f"Contact: {EMAIL}")
+    c.drawString(200, h - 100, f"Date: {date.today().strftime('%d/%m/%Y')}")
+    c.line(40, h - 130, w - 40, h - 130)
+    c.endForm()
+    return nom
+
+
+def draw_header(c, title: str, subtitle: str):
+    w, h = _rl().A4
+    c.doForm(_gabarit_entete(c))
+
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(200, h - 55, title)
+    c.setFont("Helvetica-Oblique", 9)
+    c.drawString(200, h - 114, subtitle)
+
+
+def _gabarit_methodologie(c) -> str:
+    """Corps statique de la page 3 (methodologie), sous forme de XObject."""
+    nom = "methodologie"
+    if c.hasForm(nom):
+        return nom
+
+    w, h = _rl().A4
+    c.beginForm(nom)
+    y = h - 165
+
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(40, y, "Approche")
+    y -= 18
+    c.setFont("Helvetica", 10)
+    lines3 = [
+        "1) Valeur marche: referentiel interne (zone/type) applique a la surface (degressivite si grande surface).",
+        "2) Terrain (maisons): valorisation par m2 selon la zone.",
+        "3) Impacts: technique + caracteristiques (chambres, sdb, annexes) appliques automatiquement.",
+        "4) Indice global (/10): calcule sur toiture, chauffage, cuisine, sdb, vitrage, PEB; il influence la fourchette.",
+        "5) Coefficient d'appreciation experte: ajustement final (quartier, nuisances, vue, attractivite).",
+    ]
+    for ln in lines3:
+        c.drawString(55, y, ln)
+        y -= 14
+
+    y -= 8
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(40, y, "Notes")
+    y -= 18
+    c.setFont("Helvetica", 10)
+    notes = [
+        "Le referentiel est a mettre a jour regulierement selon ton marche local.",
+        "Les impacts representent l'effet sur la valeur, pas un devis.",
+        "La fourchette depend aussi de la demande au moment de la mise en vente.",
+    ]
+    for ln in notes:
+        c.drawString(55, y, f"- {ln}")
+        y -= 14
+
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawString(40, 40, "Outil interne - La Priorite Immobiliere.")
+    c.endForm()
+    return nom
+
+
+def build_pdf_3pages(bien: dict, zone_row: dict, marche: dict, impacts: dict, indice: float,
+                     coef_expert_pct: float, valeur_tech: float, valeur_finale: float,
+                     low: float, high: float, low_pct: float, high_pct: float, bande=None) -> bytes:
+    with _sans_a85():
+        return _dessiner_3pages(bien, zone_row, marche, impacts, indice, coef_expert_pct, valeur_tech,
+                                valeur_finale, low, high, low_pct, high_pct, bande)
+
+
+def _dessiner_3pages(bien: dict, zone_row: dict, marche: dict, impacts: dict, indice: float,
+                     coef_expert_pct: float, valeur_tech: float, valeur_finale: float,
+                     low: float, high: float, low_pct: float, high_pct: float, bande=None) -> bytes:
+    rl = _rl()
+    buf = BytesIO()
+    c = rl.canvas.Canvas(buf, pagesize=rl.A4)
+    w, h = rl.A4
+
+    # PAGE 1 - Synthèse
+    draw_header(c, "Rapport d'estimation - Vente", "Synthese vendeur (page 1/3)")
+    y = h - 165
+
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(40, y, "Bien")
+    y -= 18
+
+    c.setFont("Helvetica", 10)
+    c.drawString(55, y, f"Client: {safe_text(bien['client'], 60) or '-'}"); y -= 14
+    c.drawString(55, y, f"Adresse: {safe_text(bien['adresse'], 80) or '-'}"); y -= 14
+    c.drawString(55, y, f"Commune: {safe_text(bien['commune'], 40) or '-'}"); y -= 14
+    c.drawString(55, y, f"Zone: {zone_row['zone']}  |  Type: {bien['type']}"); y -= 14
+    c.drawString(55, y, f"Surface: {bien['surface']:.0f} m2" + (f"  |  Terrain: {bien['terrain']:.0f} m2" if bien["type"] == "Maison" else "")); y -= 14
+    c.drawString(55, y, f"Chambres: {int(bien.get('nb_chambres', 0))}  |  Salles de bain: {int(bien.get('nb_sdb', 0))}"); y -= 14
+
+    if bien["type"] == "Appartement":
+        c.drawString(55, y, f"Etage: {int(bien.get('etage', 0))}  |  Ascenseur: {'Oui' if bien.get('ascenseur') else 'Non'}"); y -= 14
+
+    c.drawString(55, y, f"PEB: {bien['peb_lettre']}" + (f" ({bien['peb_kwh']:.0f} kWh/m2.an)" if bien['peb_kwh'] else "")); y -= 14
+    c.drawString(55, y, f"Vitrage: {bien['vitrage_type']}"); y -= 14
+
+    c.drawString(55, y, f"Parking: {int(bien.get('nb_places_parking', 0))}  |  Garage: {'Oui' if bien.get('garage') else 'Non'}"); y -= 14
+    c.drawString(55, y, f"Balcon: {'Oui' if bien.get('balcon') else 'Non'}  |  Terrasse: {'Oui' if bien.get('terrasse') else 'Non'}"); y -= 14
+    c.drawString(
+        55, y,
+        "Jardin: " + ("Oui" if bien.get("jardin") else "Non")
+        + "  |  Cave: " + ("Oui" if bien.get("cave") else "Non")
+        + "  |  Grenier amenageable: " + ("Oui" if bien.get("grenier_amenageable") else "Non")
+        + (f" ({bien.get('grenier_amenageable_surface_m2', 0):.0f} m2)" if bien.get("grenier_amenageable") else "")
+    )
+    y -= 14
+
+    # Surfaces par étage (infos)
+    sp = bien.get("surfaces_etages", [])
+    if sp and sum(sp) > 0:
+        c.drawString(55, y, "Surfaces par etage: " + " / ".join([f"{s:.0f} m2" for s in sp]))
+        y -= 14
+
+    y -= 6
+    c.setFont("Helvetica-Bold", 13)
+    c.drawString(40, y, f"Indice global d'etat: {indice:.1f} / 10")
+    y -= 22
+
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(55, y, f"Valeur finale estimee: {euro(valeur_finale)}")
+    y -= 22
+    c.setFont("Helvetica", 11)
+    c.drawString(55, y, f"Fourchette recommandee: {euro(low)}  ->  {euro(high)}")
+    y -= 16
+    c.setFont("Helvetica-Oblique", 9)
+    c.drawString(55, y, f"Fourchette ajustee par l'indice: -{int(low_pct*100)}% / +{int(high_pct*100)}%")
+    y -= 18
+    if bande is not None:
+        c.setFont("Helvetica", 10)
+        c.drawString(55, y, f"Bande d'incertitude: P10 {euro(bande.p10)}  |  P50 {euro(bande.p50)}  |  P90 {euro(bande.p90)}")
+        y -= 13
+        c.setFont("Helvetica-Oblique", 8)
+        tirages = f"{bande.tirages:,}".replace(",", " ")
+        c.drawString(55, y, f"Simulation Monte Carlo ({tirages} tirages, graine {bande.graine}): surface, prix EUR/m2 et etats techniques.")
+        y -= 18
+
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(40, y, f"Coefficient d'appreciation experte: {coef_expert_pct:+.1f}%")
+    y -= 14
+    c.setFont("Helvetica", 10)
+    c.drawString(55, y, f"Justification: {safe_text(bien['justif_coef'], 95) or '-'}")
+    y -= 18
+
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawString(40, 40, "Document indicatif - base sur un referentiel interne et une analyse technique (outil interne).")
+    c.showPage()
+
+    # PAGE 2 - Détail
+    draw_header(c, "Detail des calculs", "Marche + impacts (page 2/3)")
+    y = h - 165
+
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(40, y, "Marche (referentiel)")
+    y -= 18
+    c.setFont("Helvetica", 10)
+    c.drawString(55, y, f"Base zone/type: {euro(marche['base_eur_m2'])} par m2"); y -= 14
+    c.drawString(55, y, f"Valeur batie: {euro(marche['valeur_batie'])}"); y -= 14
+    if bien["type"] == "Maison":
+        c.drawString(55, y, f"Valeur terrain: {euro(marche['valeur_terrain'])}"); y -= 14
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(55, y, f"Valeur marche theorique: {euro(marche['valeur_marche'])}")
+    y -= 22
+
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(40, y, "Impacts appliques automatiquement")
+    y -= 18
+    c.setFont("Helvetica", 10)
+
+    lines = [
+        (f"Toiture ({bien['toiture_etat']})", impacts["toiture"]),
+        (f"Chauffage ({bien['chauffage_type']})", impacts["chauffage"]),
+        (f"Chassis/Vitrage ({bien['vitrage_type']})", impacts["vitrage"]),
+        (f"PEB ({bien['peb_lettre']})", impacts["peb"]),
+        (f"Cuisine ({bien['cuisine_etat']})", impacts["cuisine"]),
+        (f"Salle de bain - etat ({bien['sdb_etat']})", impacts["sdb_etat"]),
+        (f"Chambres (nb={int(bien.get('nb_chambres', 0))})", impacts["chambres"]),
+        (f"Nb salles de bain (nb={int(bien.get('nb_sdb', 0))})", impacts["sdb_count"]),
+        (f"Etage/Ascenseur (etage={int(bien.get('etage', 0))}, asc={'Oui' if bien.get('ascenseur') else 'Non'})", impacts["etage_appart"]),
+        ("Parking/Garage", impacts["parking_garage"]),
+        ("Balcon/Terrasse", impacts["balcon_terrasse"]),
+        ("Jardin/Cave/Grenier amenageable", impacts["jardin_cave_grenier"]),
+    ]
+
+    for label, val in lines:
+        if bien["type"] != "Appartement" and label.startswith("Etage/Ascenseur"):
+            continue
+        c.drawString(55, y, f"{label}: {euro(val)}")
+        y -= 14
+
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(55, y, f"Total impacts: {euro(impacts['total'])}")
+    y -= 18
+
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(40, y, "Synthese calcul")
+    y -= 18
+    c.setFont("Helvetica", 10)
+    c.drawString(55, y, f"Valeur technique = Valeur marche + impacts = {euro(valeur_tech)}"); y -= 14
+    c.drawString(55, y, f"Valeur finale = Valeur technique x (1 + coef expert) = {euro(valeur_finale)}"); y -= 18
+
+    c.setFont("Helvetica-Oblique", 8)
+    c.drawString(40, 40, "Les impacts et coefficients sont parametrables dans l'outil interne.")
+    c.showPage()
+
+    # PAGE 3 - Méthodologie (statique)
+    draw_header(c, "Methodologie", "Explications (page 3/3)")
+    c.doForm(_gabarit_methodologie(c))
+    c.save()
+
+    buf.seek(0)
+    return buf.getvalue()
+
+
+def _bande(zone_row: dict, bien: dict, params: dict):
+    from incertitude import simuler  # NumPy : seulement pour les rapports Monte Carlo
+
+    return simuler(zone_row, bien, params)
+
+
+def generer_rapport(bien: dict, zone_row: dict, params: dict, montecarlo: bool = False) -> bytes:
+    """Valorise le dossier et produit son rapport 3 pages (sans cache).
+
+    ``montecarlo`` ajoute la bande P10/P50/P90 (tirages graines : reproductible).
+    """
+    valo = valoriser(zone_row, bien, params)
+    return build_pdf_3pages(
+        bien=bien,
+        zone_row=zone_row,
+        marche=valo.marche,
+        impacts=valo.impacts,
+        indice=valo.indice,
+        coef_expert_pct=float(bien["coef_expert_pct"]),
+        valeur_tech=valo.valeur_tech,
+        valeur_finale=valo.valeur_finale,
+        low=valo.low,
+        high=valo.high,
+        low_pct=valo.low_pct,
+        high_pct=valo.high_pct,
+        bande=_bande(zone_row, bien, params) if montecarlo else None,
+    )
+
+
+# -----------------------------
+# Cache des rapports
+# -----------------------------
+RAPPORTS_MAX = 32
+_rapports = OrderedDict()
+_rapports_lock = threading.Lock()
+
+
+def empreinte_rapport(bien: dict, zone_row: dict, params: dict, montecarlo: bool = False) -> str:
+    """Hash des entrees du rapport : bien complet, ligne referentiel, parametres, option Monte Carlo et date du jour."""
+    contenu = json.dumps(
+        [bien, zone_row, compile_params(params).empreinte, bool(montecarlo), date.today().isoformat()],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha1(contenu.encode("utf-8")).hexdigest()
+
+
+def rapport_pdf(bien: dict, zone_row: dict, params: dict, montecarlo: bool = False) -> bytes:
+    """Rapport 3 pages pour ce dossier, genere a la premiere demande puis servi depuis un cache LRU."""
+    cle = empreinte_rapport(bien, zone_row, params, montecarlo)
+    with _rapports_lock:
+        if cle in _rapports:
+            _rapports.move_to_end(cle)
+            return _rapports[cle]
+
+    pdf = generer_rapport(bien, zone_row, params, montecarlo)
+
+    with _rapports_lock:
+        _rapports[cle] = pdf
+        _rapports.move_to_end(cle)
+        while len(_rapports) > RAPPORTS_MAX:
+            _rapports.popitem(last=False)
+    return pdf
@@ -0,0 +1,204 @@
+"""Generation en masse des rapports vendeur (PDF 3 pages) sur plusieurs processus.
+
+Les dossiers sont lus par blocs dans un fichier CSV/Parquet (memes colonnes
+que ``estimer_lot.py``), rendus en parallele dans un pool de processus et
+ecrits au fil de l'eau sur disque ; seuls les dossiers en cours de rendu sont
+gardes en memoire :
+
+- sortie ``.zip`` : une entree PDF par dossier (+ ``erreurs.txt`` si besoin) ;
+- sortie ``.pdf`` : un seul PDF fusionne, dans l'ordre du fichier (necessite pypdf).
+
+Un dossier en erreur (ligne referentiel absente, donnee invalide, ...) est
+consigne sans interrompre les autres.
+
+Usage :
+    python rapports_lot.py dossiers.csv rapports.zip --workers 8
+    python rapports_lot.py dossiers.csv portefeuille.pdf
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from calculs import DEFAULT_PARAMS, DEFAULT_ZONES
+from estimer_lot import bien_depuis_ligne, charger_params, charger_referentiel, lire_blocs
+from rapport import generer_rapport
+from referentiel import Referentiel
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except Exception:
+    PdfReader = None
+    PdfWriter = None
+
+
+# Taches soumises en avance par processus (borne la memoire des resultats en attente)
+AVANCE_PAR_WORKER = 4
+
+_params_worker = None
+
+
+def _init_worker(params: dict):
+    global _params_worker
+    _params_worker = params
+
+
+def _rendre(index: int, bien: dict, zone_row: dict):
+    """Execute dans un processus du pool : (index, pdf, None) ou (index, None, erreur)."""
+    try:
+        return index, generer_rapport(bien, zone_row, _params_worker), None
+    except Exception as e:
+        return index, None, f"{type(e).__name__}: {e}"
+
+
+def nom_rapport(index: int, bien: dict) -> str:
+    client = re.sub(r"[^A-Za-z0-9_-]+", "_", (bien.get("client") or "").strip())[:40].strip("_")
+    return f"Rapport_{index + 1:05d}{'_' + client if client else ''}.pdf"
+
+
+def _progression_console(fait: int, total, erreurs: int):
+    """``total`` : None tant que le fichier n'est pas lu jusqu'au bout."""
+    if total is None:
+        if fait % 100 == 0:
+            print(f"\r{fait} rapports ({erreurs} erreur(s))", end="", file=sys.stderr)
+    elif fait == total or fait % max(1, total // 100) == 0:
+        print(f"\r{fait}/{total} rapports ({erreurs} erreur(s))", end="" if fait < total else "\n", file=sys.stderr)
+
+
+def charger_dossiers(entree: str, zones: list):
+    """Genere les (bien, ligne referentiel, erreur) dans l'ordre du fichier, lu par blocs.
+
+    Une ligne illisible ou sans ligne referentiel porte son message d'erreur
+    et ne sera pas rendue.
+    """
+    ref = Referentiel(zones)
+    for bloc in lire_blocs(entree):
+        for ligne in bloc:
+            try:
+                bien = bien_depuis_ligne(ligne)
+            except (TypeError, ValueError) as e:
+                yield dict(ligne), None, f"Ligne invalide: {e}"
+                continue
+            zone_row = ref.trouver(bien.get("zone"), bien.get("type"))
+            yield bien, zone_row, None if zone_row else "Aucune ligne referentiel pour cette zone + ce type."
+
+
+def rendre_dossiers(dossiers, params: dict, workers: int = None, progression=None):
+    """Rend les rapports en parallele ; genere (index, bien, pdf, erreur) au fil de l'eau (ordre d'achevement).
+
+    ``dossiers`` est consomme au fur et a mesure : seuls les dossiers soumis et
+    non termines (``AVANCE_PAR_WORKER`` par processus) sont en memoire.
+    ``progression(fait, total, erreurs)`` recoit ``total=None`` jusqu'au dernier appel.
+    """
+    fait = erreurs = 0
+    workers = workers or os.cpu_count() or 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(params,)) as pool:
+        a_soumettre = enumerate(dossiers)
+        en_cours = {}
+        while True:
+            while len(en_cours) < workers * AVANCE_PAR_WORKER:
+                suivant = next(a_soumettre, None)
+                if suivant is None:
+                    break
+                index, (bien, zone_row, erreur) = suivant
+                if erreur is None:
+                    en_cours[pool.submit(_rendre, index, bien, zone_row)] = bien
+                    continue
+                fait += 1
+                erreurs += 1
+                if progression:
+                    progression(fait, None, erreurs)
+                yield index, bien, None, erreur
+
+            if not en_cours:
+                break
+            termines, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for fut in termines:
+                bien = en_cours.pop(fut)
+                index, pdf, erreur = fut.result()
+                fait += 1
+                erreurs += erreur is not None
+                if progression:
+                    progression(fait, None, erreurs)
+                yield index, bien, pdf, erreur
+    if progression:
+        progression(fait, fait, erreurs)
+
+
+def generer_zip(dossiers, sortie: str, params: dict, workers: int = None, progression=None) -> tuple:
+    """Ecrit un ZIP (un PDF par dossier) ; retourne (nb rapports ecrits, [(index, bien, erreur)])."""
+    ecrits, erreurs = 0, []
+    with zipfile.ZipFile(sortie, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for index, bien, pdf, erreur in rendre_dossiers(dossiers, params, workers, progression):
+            if erreur:
+                erreurs.append((index, bien, erreur))
+                continue
+            zf.writestr(nom_rapport(index, bien), pdf)
+            ecrits += 1
+        if erreurs:
+            zf.writestr("erreurs.txt", _texte_erreurs(erreurs))
+    return ecrits, erreurs
+
+
+def generer_pdf_fusionne(dossiers, sortie: str, params: dict, workers: int = None, progression=None) -> tuple:
+    """Ecrit un seul PDF (rapports dans l'ordre du fichier) ; retourne (nb rapports ecrits, [(index, bien, erreur)]).
+
+    Les rapports sont d'abord ecrits un par un dans un dossier temporaire, puis
+    assembles : aucun rapport n'est conserve en memoire pendant le rendu.
+    """
+    if PdfWriter is None:
+        raise RuntimeError("La sortie PDF fusionnee necessite pypdf (pip install pypdf).")
+
+    ecrits, erreurs = 0, []
+    with tempfile.TemporaryDirectory(prefix="rapports_") as tmp:
+        for index, bien, pdf, erreur in rendre_dossiers(dossiers, params, workers, progression):
+            if erreur:
+                erreurs.append((index, bien, erreur))
+                continue
+            with open(os.path.join(tmp, f"{index:08d}.pdf"), "wb") as f:
+                f.write(pdf)
+            ecrits += 1
+
+        writer = PdfWriter()
+        for nom in sorted(os.listdir(tmp)):
+            writer.append(PdfReader(os.path.join(tmp, nom)))
+        with open(sortie, "wb") as f:
+            writer.write(f)
+    return ecrits, erreurs
+
+
+def _texte_erreurs(erreurs: list) -> str:
+    lignes = []
+    for index, bien, erreur in sorted(erreurs, key=lambda e: e[0]):
+        lignes.append(f"ligne {index + 1} - {bien.get('client') or '-'} ({bien.get('zone')}, {bien.get('type')}): {erreur}")
+    return "\n".join(lignes) + "\n"
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Generation en masse des rapports vendeur (ZIP ou PDF fusionne).")
+    ap.add_argument("entree", help="Fichier de dossiers (.csv ou .parquet)")
+    ap.add_argument("sortie", help="Archive .zip (un PDF par dossier) ou .pdf (rapports fusionnes)")
+    ap.add_argument("--referentiel", help="Referentiel zones (.json ou .csv), defaut: DEFAULT_ZONES")
+    ap.add_argument("--params", help="Parametres (.json), defaut: DEFAULT_PARAMS")
+    ap.add_argument("--workers", type=int, default=None, help="Nombre de processus (defaut: nb de coeurs)")
+    args = ap.parse_args(argv)
+
+    zones = charger_referentiel(args.referentiel) if args.referentiel else DEFAULT_ZONES
+    params = charger_params(args.params) if args.params else dict(DEFAULT_PARAMS)
+    dossiers = charger_dossiers(args.entree, zones)
+
+    generer = generer_pdf_fusionne if args.sortie.lower().endswith(".pdf") else generer_zip
+    ecrits, erreurs = generer(dossiers, args.sortie, params, args.workers, _progression_console)
+
+    if erreurs:
+        print(_texte_erreurs(erreurs), end="", file=sys.stderr)
+    print(f"{ecrits} rapport(s) ecrit(s) dans {args.sortie}, {len(erreurs)} erreur(s).", file=sys.stderr)
+    return 1 if erreurs and not ecrits else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
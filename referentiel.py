@@ -0,0 +1,291 @@
+"""Referentiel zone/type indexe (recherche O(1) et liste des zones triee en cache).
+
+``DepotReferentiel`` : referentiel et parametres publies, partages par tout le
+processus (une seule copie en memoire), relus automatiquement quand le fichier
+JSON change. Format du fichier :
+
+    {"version": 3, "zones": [{"zone": ..., "type": ..., "base_eur_m2": ...}, ...], "params": {...}}
+
+``zones`` et ``params`` sont optionnels (defauts : DEFAULT_ZONES, DEFAULT_PARAMS).
+Le numero de version est celui du fichier (``publier`` l'incremente) : tous les
+processus donnent le meme numero au meme contenu. Les publications de processus
+differents sont serialisees par un verrou de fichier (``<chemin>.lock``, POSIX).
+"""
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from bisect import insort
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+try:
+    import fcntl
+except ImportError:
+    # Windows : publications serialisees dans le processus seulement
+    fcntl = None
+
+from calculs import DEFAULT_PARAMS, DEFAULT_ZONES, ParamsCompiles
+
+CHEMIN_DEPOT = os.environ.get("ESTIMATEUR_REFERENTIEL", "referentiel.json")
+# Secondes entre deux verifications (stat) du fichier
+INTERVALLE_VERIFICATION = 1.0
+# Jeux de surcharges privees compiles gardes par version
+COMPILES_MAX = 64
+# Vues (lignes privees d'une session) gardees par version
+VUES_MAX = 64
+
+
+class Referentiel:
+    """Grille de prix zone/type avec index (zone, type) et liste triee des zones.
+
+    L'index et la liste des zones sont mis a jour a chaque ``ajouter`` : aucun
+    rebalayage de la grille lors d'une recherche. En cas de doublon (zone, type),
+    la premiere ligne reste celle retournee par ``trouver``.
+    """
+
+    def __init__(self, lignes=()):
+        self.lignes = []
+        self._index = {}
+        self._zones = []
+        self._zones_connues = set()
+        for ligne in lignes:
+            self.ajouter(ligne)
+
+    def ajouter(self, ligne: dict) -> dict:
+        ligne = dict(ligne)
+        self.lignes.append(ligne)
+        self._index.setdefault((ligne["zone"], ligne["type"]), ligne)
+        if ligne["zone"] not in self._zones_connues:
+            self._zones_connues.add(ligne["zone"])
+            insort(self._zones, ligne["zone"])
+        return ligne
+
+    def trouver(self, zone: str, type_bien: str):
+        """Ligne du referentiel pour (zone, type), ou None."""
+        return self._index.get((zone, type_bien))
+
+    @property
+    def zones(self) -> list:
+        """Noms de zones distincts, tries."""
+        return self._zones
+
+    def __iter__(self):
+        return iter(self.lignes)
+
+    def __len__(self) -> int:
+        return len(self.lignes)
+
+
+class ReferentielPrive:
+    """Referentiel partage + quelques lignes privees d'une session, sans copier la grille.
+
+    ``trouver`` cherche d'abord dans les lignes privees (premiere gagnante),
+    puis dans l'index du referentiel partage ; la grille fusionnee (``lignes``)
+    n'est construite que si elle est lue.
+    """
+
+    def __init__(self, base: Referentiel, lignes_privees):
+        self.base = base
+        self.privees = [dict(l) for l in lignes_privees]
+        self._index = {}
+        for ligne in self.privees:
+            self._index.setdefault((ligne["zone"], ligne["type"]), ligne)
+        nouvelles = {l["zone"] for l in self.privees} - base._zones_connues
+        self._zones = sorted(base.zones + list(nouvelles)) if nouvelles else base.zones
+        self._lignes = None
+
+    def trouver(self, zone: str, type_bien: str):
+        """Ligne du referentiel pour (zone, type), ou None."""
+        ligne = self._index.get((zone, type_bien))
+        return ligne if ligne is not None else self.base.trouver(zone, type_bien)
+
+    @property
+    def zones(self) -> list:
+        return self._zones
+
+    @property
+    def lignes(self) -> list:
+        if self._lignes is None:
+            self._lignes = fusionner(self.base.lignes, self.privees)
+        return self._lignes
+
+    def __iter__(self):
+        return iter(self.lignes)
+
+    def __len__(self) -> int:
+        return len(self.lignes)
+
+
+def fusionner(lignes, surcharges) -> list:
+    """Lignes de ``lignes`` dont le (zone, type) n'est pas redefini, puis ``surcharges``."""
+    cles = {(l["zone"], l["type"]) for l in surcharges}
+    return [l for l in lignes if (l["zone"], l["type"]) not in cles] + list(surcharges)
+
+
+def surcharges(params, base) -> dict:
+    """Cles de ``params`` dont la valeur differe de ``base`` (aux arrondis de saisie pres)."""
+    return {
+        k: v for k, v in params.items()
+        if k not in base or not math.isclose(float(v), float(base[k]), rel_tol=1e-9, abs_tol=1e-12)
+    }
+
+
+# -----------------------------
+# Depot partage
+# -----------------------------
+@contextmanager
+def _verrou_fichier(chemin: str):
+    """Verrou exclusif entre processus sur ``<chemin>.lock`` (sans effet si fcntl est absent)."""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{chemin}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@dataclass(frozen=True)
+class VersionReferentiel:
+    """Etat publie, partage par toutes les sessions : ne jamais le modifier en place."""
+
+    numero: int
+    referentiel: Referentiel
+    params: ParamsCompiles
+    # Surcharges privees (figees) -> parametres compiles, partage par les sessions
+    _compiles: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    # Lignes privees (figees) -> ReferentielPrive, partage par les sessions
+    _vues: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+
+    def params_avec(self, prives: dict) -> dict:
+        """Parametres de la version + surcharges privees d'une session (dict neuf, modifiable par les widgets)."""
+        return {**self.params, **prives}
+
+    def params_compiles(self, prives: dict) -> ParamsCompiles:
+        """Parametres compiles de la version + surcharges privees : compiles une fois par jeu de surcharges.
+
+        Sans surcharge, ``params`` de la version (aucun calcul) ; sinon le cout
+        est celui du hash des seules surcharges.
+        """
+        if not prives:
+            return self.params
+        cle = frozenset(prives.items())
+        compiles = self._compiles.get(cle)
+        if compiles is None:
+            if len(self._compiles) >= COMPILES_MAX:
+                self._compiles.clear()
+            compiles = self._compiles[cle] = ParamsCompiles({**self.params, **prives})
+        return compiles
+
+    def referentiel_avec(self, lignes_privees):
+        """Referentiel de la version, ou vue avec les lignes privees d'une session (grille partagee non copiee).
+
+        Une vue par jeu de lignes privees : un rerun sans changement ne retrie
+        pas les zones et ne refusionne pas la grille.
+        """
+        if not lignes_privees:
+            return self.referentiel
+        cle = tuple(tuple(sorted(l.items())) for l in lignes_privees)
+        vue = self._vues.get(cle)
+        if vue is None:
+            if len(self._vues) >= VUES_MAX:
+                self._vues.clear()
+            vue = self._vues[cle] = ReferentielPrive(self.referentiel, lignes_privees)
+        return vue
+
+
+class DepotReferentiel:
+    """Referentiel + parametres du processus, versionnes et recharges quand le fichier change."""
+
+    def __init__(self, chemin: str = CHEMIN_DEPOT, intervalle: float = INTERVALLE_VERIFICATION):
+        self.chemin = chemin
+        self.intervalle = intervalle
+        self.erreur = None
+        self._lock = threading.Lock()
+        self._signature = None
+        self._verifie = 0.0
+        self._version = VersionReferentiel(0, Referentiel(DEFAULT_ZONES), ParamsCompiles(DEFAULT_PARAMS))
+        with self._lock:
+            self._recharger()
+
+    def actuelle(self) -> VersionReferentiel:
+        """Derniere version ; le fichier est re-verifie au plus une fois par ``intervalle``."""
+        if time.monotonic() - self._verifie >= self.intervalle:
+            with self._lock:
+                if time.monotonic() - self._verifie >= self.intervalle:
+                    self._recharger()
+        return self._version
+
+    def publier(self, params: dict = None, lignes=()) -> VersionReferentiel:
+        """Nouvelle version = derniere version + ``params`` (surcharges) + ``lignes`` (ajouts / remplacements).
+
+        Le fichier est remplace de facon atomique ; les autres processus le
+        relisent a leur prochaine verification. La base est relue sous le verrou
+        de fichier : deux processus qui publient en meme temps ne partent pas de
+        la meme version.
+        """
+        with self._lock, _verrou_fichier(self.chemin):
+            # Relecture forcee (une signature identique ne garantit pas le meme contenu)
+            self._signature = None
+            self._recharger()
+            base = self._version
+            contenu = {
+                "version": base.numero + 1,
+                "zones": fusionner(base.referentiel.lignes, lignes),
+                "params": {**base.params, **(params or {})},
+            }
+            version = self._version_depuis(contenu)
+            fd, temporaire = tempfile.mkstemp(
+                prefix=f"{os.path.basename(self.chemin)}.", suffix=".tmp",
+                dir=os.path.dirname(os.path.abspath(self.chemin)),
+            )
+            try:
+                # mkstemp cree le fichier en 0600 : le depot doit rester lisible par les autres comptes
+                os.fchmod(fd, 0o644)
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(contenu, f, indent=2, ensure_ascii=False)
+                os.replace(temporaire, self.chemin)
+            except BaseException:
+                os.unlink(temporaire)
+                raise
+            self._version = version
+            self._signature = self._signature_fichier()
+            self.erreur = None
+            return version
+
+    def _signature_fichier(self):
+        try:
+            st = os.stat(self.chemin)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _recharger(self):
+        self._verifie = time.monotonic()
+        signature = self._signature_fichier()
+        if signature == self._signature:
+            return
+        self._signature = signature
+        if signature is None:
+            return  # fichier absent : la version courante reste active
+        try:
+            with open(self.chemin, encoding="utf-8") as f:
+                version = self._version_depuis(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # Fichier en cours d'ecriture ou invalide : version precedente conservee
+            self.erreur = f"{self.chemin}: {e}"
+            return
+        self.erreur = None
+        self._version = version
+
+    def _version_depuis(self, contenu: dict) -> VersionReferentiel:
+        return VersionReferentiel(
+            int(contenu.get("version", 0)),
+            Referentiel(contenu.get("zones", DEFAULT_ZONES)),
+            ParamsCompiles({**DEFAULT_PARAMS, **contenu.get("params", {})}),
+        )
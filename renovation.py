@@ -0,0 +1,172 @@
+"""Scenarios de travaux avant vente : toutes les combinaisons d'ameliorations, front de Pareto.
+
+Pour chaque poste (toiture, chauffage, vitrage, PEB, cuisine, salle de bain),
+les options sont l'etat actuel et chaque etat mieux note (``NOTES_*`` de
+``calculs``). Toutes les combinaisons (jusqu'a 3 x 5 x 4 x 7 x 3 x 3 = 3 780)
+sont valorisees en une passe ``batch.valoriser_lot``, colonnes d'etats
+passees en codes entiers (sauf le PEB, voir ``_colonne_peb``) : chaque scenario
+est identique a ``calculs.valoriser`` du dossier modifie.
+
+Le cout d'un scenario est la somme des couts des postes modifies ; ``couts``
+donne, par poste, le cout pour amener le bien a chaque etat cible (montants
+indicatifs par defaut, a ajuster dossier par dossier). Le front de Pareto
+retient les scenarios qu'aucun autre ne bat a la fois en plus-value (valeur
+finale) et en cout.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+
+from batch import COLONNES_REFERENTIEL, encoder, valoriser_lot
+from calculs import (
+    CHAMPS_CALCUL,
+    CHAUFFAGE_TYPES,
+    ETATS_PIECE,
+    NOTES_CHAUFFAGE,
+    NOTES_CUISINE,
+    NOTES_PEB,
+    NOTES_SDB,
+    NOTES_TOITURE,
+    NOTES_VITRAGE,
+    PEB_LETTRES,
+    TOITURE_ETATS,
+    VITRAGE_TYPES,
+)
+
+
+def _peb(v) -> str:
+    # Meme normalisation que calc_peb_impact (vide = "C")
+    return (v or "C").strip().upper()
+
+
+# Poste -> (libelles, notes, normalisation du libelle saisi)
+POSTES = {
+    "toiture_etat": (TOITURE_ETATS, NOTES_TOITURE, None),
+    "chauffage_type": (CHAUFFAGE_TYPES, NOTES_CHAUFFAGE, None),
+    "vitrage_type": (VITRAGE_TYPES, NOTES_VITRAGE, None),
+    "peb_lettre": (PEB_LETTRES, NOTES_PEB, _peb),
+    "cuisine_etat": (ETATS_PIECE, NOTES_CUISINE, None),
+    "sdb_etat": (ETATS_PIECE, NOTES_SDB, None),
+}
+
+# Cout (EUR) pour amener le poste a l'etat cible, depuis un etat moins bon (indicatif)
+COUTS_DEFAUT = {
+    "toiture_etat": {"Parfaite": 25000, "Moyenne": 10000},
+    "chauffage_type": {"Pompe a chaleur": 15000, "Gaz condensation": 7000, "Mazout": 6000, "Electrique": 3000},
+    "vitrage_type": {"Triple": 20000, "Double recent": 14000, "Double ancien": 8000},
+    "peb_lettre": {"A": 60000, "B": 45000, "C": 30000, "D": 18000, "E": 10000, "F": 5000},
+    "cuisine_etat": {"Bonne": 12000, "A moderniser": 5000},
+    "sdb_etat": {"Bonne": 10000, "A moderniser": 4000},
+}
+
+
+@dataclass(frozen=True)
+class Scenarios:
+    """Toutes les combinaisons evaluees (une ligne par scenario ; ``codes`` : poste -> codes d'etat)."""
+
+    codes: dict
+    cout: np.ndarray
+    plus_value: np.ndarray
+    valeur_finale: np.ndarray
+    indice: np.ndarray
+    valeur_actuelle: float
+
+    def __len__(self) -> int:
+        return len(self.cout)
+
+
+def options(bien: dict, poste: str) -> list:
+    """Codes possibles du poste : etat actuel (en tete) puis chaque etat mieux note.
+
+    Etat actuel inconnu (code -1) : tous les etats sont proposes.
+    """
+    libelles, notes, normaliser = POSTES[poste]
+    actuel = int(encoder(np.array([bien.get(poste)], dtype=object), libelles, normaliser)[0])
+    if actuel < 0:
+        return [-1] + list(range(len(libelles)))
+    note = notes[libelles[actuel]]
+    return [actuel] + [i for i, l in enumerate(libelles) if notes[l] > note]
+
+
+def _table_couts(poste: str, couts: dict) -> np.ndarray:
+    libelles = POSTES[poste][0]
+    par_etat = {**COUTS_DEFAUT.get(poste, {}), **(couts or {}).get(poste, {})}
+    # Derniere case : code -1 (etat inconnu, jamais une cible)
+    return np.array([float(par_etat.get(l, 0.0)) for l in libelles] + [0.0])
+
+
+def _colonne_peb(bien: dict, codes: np.ndarray, actuel: int) -> np.ndarray:
+    # Impact et indice ne normalisent pas la lettre saisie de la meme facon (" e" :
+    # impact de E, note par defaut) : lettre d'origine tant que le PEB est inchange
+    lettres = np.array(PEB_LETTRES, dtype=object)
+    return np.where(codes == actuel, bien.get("peb_lettre"), lettres[codes])
+
+
+def evaluer(zone_row: dict, bien: dict, params, couts: dict = None) -> Scenarios:
+    """Valorise toutes les combinaisons d'ameliorations du dossier en une passe."""
+    choix = {poste: options(bien, poste) for poste in POSTES}
+    grilles = np.meshgrid(*(np.array(c, dtype=np.intp) for c in choix.values()), indexing="ij")
+    codes = {poste: g.ravel() for poste, g in zip(choix, grilles)}
+
+    col = {k: np.array([bien[k]]) for k in CHAMPS_CALCUL if k in bien}
+    for k in COLONNES_REFERENTIEL:
+        col[k] = np.array([float(zone_row.get(k, 0))])
+    col.update(codes)
+    col["peb_lettre"] = _colonne_peb(bien, codes["peb_lettre"], choix["peb_lettre"][0])
+    res = valoriser_lot(col, params)
+
+    cout = np.zeros(len(res["valeur_finale"]))
+    for poste, c in codes.items():
+        modifie = c != choix[poste][0]
+        cout += np.where(modifie, _table_couts(poste, couts)[c], 0.0)
+
+    # Premiere combinaison = dossier inchange
+    actuelle = float(res["valeur_finale"][0])
+    return Scenarios(
+        codes=codes,
+        cout=cout,
+        plus_value=res["valeur_finale"] - actuelle,
+        valeur_finale=res["valeur_finale"],
+        indice=res["indice"],
+        valeur_actuelle=actuelle,
+    )
+
+
+def front_pareto(cout: np.ndarray, gain: np.ndarray) -> np.ndarray:
+    """Indices des points non domines (cout minimal, gain maximal), tries par cout croissant."""
+    ordre = np.lexsort((-gain, cout))
+    g = gain[ordre]
+    meilleur_avant = np.concatenate(([-np.inf], np.maximum.accumulate(g)[:-1]))
+    return ordre[g > meilleur_avant]
+
+
+def travaux(s: Scenarios, i: int) -> dict:
+    """Postes modifies par le scenario ``i`` : poste -> etat cible."""
+    return {
+        poste: POSTES[poste][0][int(c[i])]
+        for poste, c in s.codes.items()
+        if c[i] != c[0] and c[i] >= 0
+    }
+
+
+def optimiser(zone_row: dict, bien: dict, params, couts: dict = None) -> tuple:
+    """(scenarios, front) : front de Pareto plus-value / cout, hors scenarios sans plus-value.
+
+    Chaque ligne du front : ``{"travaux", "cout", "plus_value", "valeur_finale", "indice", "rendement"}``
+    (rendement = plus-value / cout, None pour un scenario gratuit), par cout croissant.
+    """
+    s = evaluer(zone_row, bien, params, couts)
+    front = []
+    for i in front_pareto(s.cout, s.plus_value):
+        if s.plus_value[i] <= 0:
+            continue
+        cout = float(s.cout[i])
+        front.append({
+            "travaux": travaux(s, i),
+            "cout": cout,
+            "plus_value": float(s.plus_value[i]),
+            "valeur_finale": float(s.valeur_finale[i]),
+            "indice": float(s.indice[i]),
+            "rendement": float(s.plus_value[i]) / cout if cout else None,
+        })
+    return s, front
@@ -0,0 +1,99 @@
+"""Revalorisation incrementale de l'historique apres un changement de referentiel ou de parametres.
+
+Le changement est ramene a un ensemble de cles (``calculs.cle_param`` pour un
+parametre, ``calculs.cle_ligne`` pour une ligne zone + type du referentiel).
+Seules les estimations dont les dependances contiennent une de ces cles sont
+relues (en colonnes, ``HistoriqueSQLite.colonnes``) et valorisees en une
+passe ``batch.valoriser_lot`` ; celles dont les valeurs changent sont mises a
+jour, anciennes valeurs conservees (``HistoriqueSQLite.revaloriser``).
+Les estimations calculees avec des surcharges privees d'une session
+(``calculs.CLE_PRIVEE``) ne sont jamais revalorisees : leurs valeurs ne
+viennent pas de la version publiee.
+
+``synchroniser`` compare la version publiee (``referentiel.DepotReferentiel``)
+au dernier etat applique a la base, memorise dans la base elle-meme. L'etat est
+remplace dans la transaction des revalorisations, a condition de valoir encore
+l'etat lu : chaque changement n'est applique qu'une fois, quel que soit le
+processus ou la session.
+"""
+import numpy as np
+
+from batch import valoriser_lot
+from calculs import CLE_PRIVEE, cle_ligne, cle_param
+from historique import COLONNES_VALEURS
+
+ETAT_APPLIQUE = "referentiel_applique"
+
+# Colonnes de valoriser_lot -> colonnes de l'historique
+SORTIES = {
+    "valeur_marche": "valeur_marche",
+    "total": "impact_total",
+    "valeur_finale": "valeur_finale",
+    "fourchette_basse": "fourchette_basse",
+    "fourchette_haute": "fourchette_haute",
+}
+
+
+def _lignes(zones) -> dict:
+    # Premiere ligne gagnante, comme Referentiel.trouver
+    index = {}
+    for z in zones:
+        index.setdefault((z["zone"], z["type"]), z)
+    return index
+
+
+def cles_modifiees(params_avant, zones_avant, params_apres, zones_apres) -> set:
+    """Cles des parametres et lignes referentiel ajoutes, supprimes ou modifies."""
+    cles = {
+        cle_param(k) for k in set(params_avant) | set(params_apres)
+        if params_avant.get(k) != params_apres.get(k)
+    }
+    avant, apres = _lignes(zones_avant), _lignes(zones_apres)
+    cles.update(cle_ligne(*k) for k in set(avant) | set(apres) if avant.get(k) != apres.get(k))
+    return cles
+
+
+def nouvelles_valeurs(historique, cles, params, zones) -> dict:
+    """{id: {colonne: valeur}} des estimations qui dependent des ``cles`` et dont les valeurs changent.
+
+    Estimations sans ligne referentiel (zone + type supprimes) ou calculees avec
+    des surcharges privees : omises.
+    """
+    touchees = historique.colonnes(ids=historique.ids_dependants(cles, exclure=(CLE_PRIVEE,)))
+    if not len(touchees):
+        return {}
+    res = valoriser_lot(touchees.colonnes_calcul(), params, zones)
+    # Arrondis de build_record
+    nouvelles = {col: np.round(res[k], 0) for k, col in SORTIES.items()}
+    change = np.zeros(len(touchees), dtype=bool)
+    for col in COLONNES_VALEURS:
+        change |= ~np.isclose(np.nan_to_num(touchees.valeurs(col)), nouvelles[col], rtol=1e-9, atol=0.0)
+    lignes = np.flatnonzero(change & res["trouve"])
+    return {
+        int(touchees.ids[i]): {col: float(v[i]) for col, v in nouvelles.items()}
+        for i in lignes
+    }
+
+
+def revaloriser(historique, cles, params, zones, motif: str = "") -> int:
+    """Revalorise les estimations qui dependent des ``cles`` ; retourne le nombre de lignes modifiees."""
+    return historique.revaloriser(nouvelles_valeurs(historique, cles, params, zones), motif)
+
+
+def synchroniser(historique, version) -> int:
+    """Applique a l'historique les changements depuis le dernier etat memorise (premier appel : reference).
+
+    Retourne 0 si l'etat a ete applique entre-temps par un autre processus ou une autre session.
+    """
+    apres = {"params": dict(version.params), "zones": list(version.referentiel.lignes)}
+    avant = historique.lire_etat(ETAT_APPLIQUE)
+    if avant == apres:
+        return 0
+    valeurs = {}
+    if avant is not None:
+        cles = cles_modifiees(avant["params"], avant["zones"], apres["params"], apres["zones"])
+        if cles:
+            valeurs = nouvelles_valeurs(historique, cles, version.params, apres["zones"])
+    return historique.revaloriser(
+        valeurs, motif=f"referentiel version {version.numero}", etat=(ETAT_APPLIQUE, avant, apres)
+    )
@@ -0,0 +1,90 @@
+"""Analyse de sensibilite d'un dossier aux parametres (balayages "what-if").
+
+Toutes les combinaisons de parametres sont evaluees en une seule passe
+``batch.valoriser_lot`` : le bien est une ligne, les parametres balayes sont
+des tableaux NumPy et le resultat est obtenu par broadcasting. Chaque point
+est identique a ``calculs.valoriser`` avec les parametres correspondants.
+"""
+import numpy as np
+
+from batch import COLONNES_REFERENTIEL, valoriser_lot
+from calculs import CHAMPS_CALCUL
+
+VARIATION_DEFAUT = 0.20
+# Ecart (+/-) d'un parametre nul, pour lequel une variation relative ne change rien
+ECART_ABSOLU = 1000.0
+
+
+def _colonnes(zone_row: dict, bien: dict) -> dict:
+    col = {k: np.array([bien[k]]) for k in CHAMPS_CALCUL if k in bien}
+    for k in COLONNES_REFERENTIEL:
+        col[k] = np.array([float(zone_row.get(k, 0))])
+    return col
+
+
+def _params(params, **balayes) -> dict:
+    p = dict(params)
+    for cle, valeurs in balayes.items():
+        if cle not in p:
+            raise KeyError(f"Parametre inconnu: {cle}")
+        p[cle] = valeurs
+    return p
+
+
+def balayer(zone_row: dict, bien: dict, params, cle: str, valeurs, sortie: str = "valeur_finale") -> np.ndarray:
+    """``sortie`` (valeur finale par defaut) pour chaque valeur du parametre ``cle``."""
+    valeurs = np.asarray(valeurs, dtype=float).ravel()
+    res = valoriser_lot(_colonnes(zone_row, bien), _params(params, **{cle: valeurs}))
+    return res[sortie]
+
+
+def grille(zone_row: dict, bien: dict, params, cle_x: str, valeurs_x, cle_y: str, valeurs_y,
+           sortie: str = "valeur_finale") -> np.ndarray:
+    """Tableau (len(valeurs_y), len(valeurs_x)) de ``sortie`` pour toutes les paires de valeurs."""
+    if cle_x == cle_y:
+        raise ValueError("Choisir deux parametres differents.")
+    vx = np.asarray(valeurs_x, dtype=float).ravel()[np.newaxis, :]
+    vy = np.asarray(valeurs_y, dtype=float).ravel()[:, np.newaxis]
+    res = valoriser_lot(_colonnes(zone_row, bien), _params(params, **{cle_x: vx, cle_y: vy}))
+    return res[sortie]
+
+
+def tornado(zone_row: dict, bien: dict, params, variation: float = VARIATION_DEFAUT, cles=None,
+            sortie: str = "valeur_finale", absolu: float = ECART_ABSOLU) -> list:
+    """Effet d'une variation de +/- ``variation`` (relative) de chaque parametre, pris un a un.
+
+    Un parametre nul (ex. ``peb_C``, ``cuisine_bonne``) varie de +/- ``absolu``,
+    comme dans ``plage``. Retourne une liste de dicts ``{"parametre", "bas",
+    "haut", "base", "ecart"}`` triee par ecart decroissant ; les parametres que
+    ce dossier n'utilise pas sont omis. Une seule passe vectorisee : la colonne
+    2*i (resp. 2*i+1) porte le parametre i a la valeur basse (resp. haute).
+    """
+    cles = list(params) if cles is None else list(cles)
+    n = len(cles)
+    p = dict(params)
+    for i, cle in enumerate(cles):
+        valeur = float(params[cle])
+        v = np.full(2 * n + 1, valeur)
+        if valeur:
+            v[2 * i] *= 1.0 - variation
+            v[2 * i + 1] *= 1.0 + variation
+        else:
+            v[2 * i], v[2 * i + 1] = -absolu, absolu
+        p[cle] = v
+    res = valoriser_lot(_colonnes(zone_row, bien), p)[sortie]
+    base = float(res[-1])
+
+    lignes = []
+    for i, cle in enumerate(cles):
+        bas, haut = float(res[2 * i]), float(res[2 * i + 1])
+        ecart = abs(haut - bas)
+        if ecart > 0:
+            lignes.append({"parametre": cle, "bas": bas, "haut": haut, "base": base, "ecart": ecart})
+    lignes.sort(key=lambda l: l["ecart"], reverse=True)
+    return lignes
+
+
+def plage(valeur: float, variation: float = VARIATION_DEFAUT, n: int = 41, absolu: float = ECART_ABSOLU) -> np.ndarray:
+    """Valeurs de balayage autour de ``valeur`` (+/- ``absolu`` si la valeur est nulle)."""
+    ecart = abs(valeur) * variation if valeur else absolu
+    return np.linspace(valeur - ecart, valeur + ecart, n)
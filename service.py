@@ -0,0 +1,298 @@
+"""Service HTTP local de valorisation (sans Streamlit), pour le CRM.
+
+Endpoints (JSON en entree et en sortie, sauf le PDF) :
+
+- ``GET  /sante``        : etat du service ;
+- ``POST /estimation``   : ``{"bien": {...}, "params": {...}?, "montecarlo": false?}`` -> une valorisation ;
+- ``POST /estimations``  : ``{"biens": [...], "params": {...}?}`` -> une valorisation par bien
+  (passe vectorisee ``batch.valoriser_lot``) ; un bien illisible ou sans ligne
+  referentiel donne ``{"erreur": ...}`` a sa place, sans rejeter le lot ;
+- ``POST /rapport``      : ``{"bien": {...}, "params": {...}?, "montecarlo": false?}`` -> PDF 3 pages.
+
+Les biens reprennent les cles du formulaire (``type``, ``zone``, ``surface``, ...)
+avec les memes defauts et alias que ``estimer_lot.py`` ; ``params`` remplace
+une partie de ``DEFAULT_PARAMS`` pour la requete.
+
+Le serveur est asynchrone (tornado, deja installe avec Streamlit) : les
+estimations (unitaires avec Monte Carlo, ou par lot) sont calculees dans un
+thread hors de la boucle, les rapports PDF dans un pool de processus borne. Au-dela de ``RAPPORTS_EN_ATTENTE_MAX``
+rapports en attente, le service repond 503.
+
+Usage :
+    python service.py --port 8600 --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import tornado.web
+
+from batch import colonnes_depuis_biens, valoriser_lot
+from calculs import DEFAULT_PARAMS, DEFAULT_ZONES, IMPACT_KEYS, compile_params, valoriser
+from estimer_lot import bien_depuis_ligne, charger_params, charger_referentiel
+from incertitude import simuler
+from rapport import generer_rapport
+from referentiel import Referentiel
+
+PORT_DEFAUT = 8600
+LOT_MAX = 100_000
+# Rapports soumis au pool en meme temps, par processus
+AVANCE_PAR_WORKER = 2
+RAPPORTS_EN_ATTENTE_MAX = 64
+
+
+class ErreurRequete(tornado.web.HTTPError):
+    """Erreur renvoyee au client : ``{"erreur": message}`` avec le statut donne."""
+
+    def __init__(self, statut: int, message: str):
+        super().__init__(statut, reason=message)
+
+
+class Service:
+    """Etat partage du service : referentiel, parametres de base, pool PDF."""
+
+    def __init__(self, zones=None, params=None, workers: int = None):
+        self.referentiel = Referentiel(DEFAULT_ZONES if zones is None else zones)
+        self.params = compile_params(DEFAULT_PARAMS if params is None else params)
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.slots = asyncio.Semaphore(self.workers * AVANCE_PAR_WORKER)
+        self.en_attente = 0
+
+    def fermer(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    # -- decodage des requetes --
+    def params_requete(self, corps: dict):
+        surcharge = corps.get("params") or {}
+        if not isinstance(surcharge, dict):
+            raise ErreurRequete(400, "params doit etre un objet JSON")
+        if not surcharge:
+            return self.params
+        try:
+            return compile_params({**self.params, **surcharge})
+        except ValueError as e:
+            raise ErreurRequete(400, str(e))
+
+    def bien_requete(self, brut):
+        if not isinstance(brut, dict):
+            raise ErreurRequete(400, "bien doit etre un objet JSON")
+        try:
+            bien = bien_depuis_ligne(brut)
+        except (TypeError, ValueError, OverflowError) as e:
+            raise ErreurRequete(400, f"bien invalide: {e}")
+        zone_row = self.referentiel.trouver(bien.get("zone"), bien.get("type"))
+        if zone_row is None:
+            raise ErreurRequete(422, "Aucune ligne referentiel pour cette zone + ce type.")
+        return bien, zone_row
+
+
+def valorisation_json(valo, zone_row: dict) -> dict:
+    return {
+        "zone": zone_row["zone"],
+        "type": zone_row["type"],
+        "marche": dict(valo.marche),
+        "impacts": dict(valo.impacts),
+        "indice": valo.indice,
+        "valeur_tech": valo.valeur_tech,
+        "valeur_finale": valo.valeur_finale,
+        "fourchette_basse": valo.low,
+        "fourchette_haute": valo.high,
+        "low_pct": valo.low_pct,
+        "high_pct": valo.high_pct,
+    }
+
+
+def estimer_bien(bien: dict, zone_row: dict, params, montecarlo: bool = False) -> dict:
+    """Valorisation d'un bien (``valorisation_json``), avec la bande Monte Carlo si demandee."""
+    sortie = valorisation_json(valoriser(zone_row, bien, params), zone_row)
+    if montecarlo:
+        bande = simuler(zone_row, bien, params)
+        sortie["montecarlo"] = {"p10": bande.p10, "p50": bande.p50, "p90": bande.p90,
+                                "tirages": bande.tirages, "graine": bande.graine}
+    return sortie
+
+
+def estimer_biens(bruts: list, zones: list, params) -> list:
+    """Une sortie par element de ``bruts`` : ``valoriser_biens`` pour les biens lisibles, ``erreur`` pour les autres."""
+    sorties = [None] * len(bruts)
+    biens, positions = [], []
+    for i, brut in enumerate(bruts):
+        if not isinstance(brut, dict):
+            sorties[i] = {"erreur": "bien doit etre un objet JSON"}
+            continue
+        try:
+            biens.append(bien_depuis_ligne(brut))
+        except (TypeError, ValueError, OverflowError) as e:
+            sorties[i] = {"erreur": f"bien invalide: {e}"}
+            continue
+        positions.append(i)
+    if biens:
+        for i, sortie in zip(positions, valoriser_biens(biens, zones, params)):
+            sorties[i] = sortie
+    return sorties
+
+
+def valoriser_biens(biens: list, zones: list, params) -> list:
+    """Valorisation vectorisee d'un lot ; meme format que ``valorisation_json`` (ou ``erreur``)."""
+    res = valoriser_lot(colonnes_depuis_biens(biens), params, zones)
+    cols = {k: v.tolist() for k, v in res.items()}
+    sorties = []
+    for i, bien in enumerate(biens):
+        if not cols["trouve"][i]:
+            sorties.append({"erreur": "Aucune ligne referentiel pour cette zone + ce type."})
+            continue
+        impacts = {k: cols[k][i] for k in IMPACT_KEYS}
+        impacts["total"] = cols["total"][i]
+        sorties.append({
+            "zone": bien["zone"],
+            "type": bien["type"],
+            "marche": {k: cols[k][i] for k in ("base_eur_m2", "valeur_batie", "valeur_terrain", "valeur_marche")},
+            "impacts": impacts,
+            "indice": cols["indice"][i],
+            "valeur_tech": cols["valeur_tech"][i],
+            "valeur_finale": cols["valeur_finale"][i],
+            "fourchette_basse": cols["fourchette_basse"][i],
+            "fourchette_haute": cols["fourchette_haute"][i],
+            "low_pct": cols["low_pct"][i],
+            "high_pct": cols["high_pct"][i],
+        })
+    return sorties
+
+
+# -----------------------------
+# Handlers
+# -----------------------------
+class _Base(tornado.web.RequestHandler):
+    def initialize(self, service: Service):
+        self.service = service
+
+    def corps(self) -> dict:
+        try:
+            corps = json.loads(self.request.body or b"{}")
+        except ValueError:
+            raise ErreurRequete(400, "JSON invalide")
+        if not isinstance(corps, dict):
+            raise ErreurRequete(400, "Le corps doit etre un objet JSON")
+        return corps
+
+    def repondre(self, donnees, statut: int = 200):
+        self.set_status(statut)
+        self.set_header("Content-Type", "application/json; charset=utf-8")
+        self.finish(json.dumps(donnees))
+
+    def write_error(self, status_code: int, **kwargs):
+        self.repondre({"erreur": self._reason}, status_code)
+
+
+class SanteHandler(_Base):
+    def get(self):
+        self.repondre({
+            "statut": "ok",
+            "zones": len(self.service.referentiel),
+            "workers": self.service.workers,
+            "rapports_en_attente": self.service.en_attente,
+        })
+
+
+class EstimationHandler(_Base):
+    async def post(self):
+        corps = self.corps()
+        params = self.service.params_requete(corps)
+        bien, zone_row = self.service.bien_requete(corps.get("bien"))
+        # Hors boucle d'evenements : le Monte Carlo (100k tirages) bloquerait les autres connexions
+        sortie = await asyncio.get_running_loop().run_in_executor(
+            None, estimer_bien, bien, zone_row, params, bool(corps.get("montecarlo"))
+        )
+        self.repondre(sortie)
+
+
+class EstimationsHandler(_Base):
+    async def post(self):
+        corps = self.corps()
+        params = self.service.params_requete(corps)
+        bruts = corps.get("biens")
+        if not isinstance(bruts, list):
+            raise ErreurRequete(400, "biens doit etre une liste d'objets JSON")
+        if len(bruts) > LOT_MAX:
+            raise ErreurRequete(413, f"Lot limite a {LOT_MAX} biens")
+        zones = self.service.referentiel.lignes
+        sorties = await asyncio.get_running_loop().run_in_executor(None, estimer_biens, bruts, zones, params)
+        self.repondre({"estimations": sorties})
+
+
+class RapportHandler(_Base):
+    async def post(self):
+        corps = self.corps()
+        params = dict(self.service.params_requete(corps))
+        bien, zone_row = self.service.bien_requete(corps.get("bien"))
+
+        service = self.service
+        if service.en_attente >= RAPPORTS_EN_ATTENTE_MAX:
+            raise ErreurRequete(503, "Service sature, reessayer plus tard")
+        service.en_attente += 1
+        try:
+            async with service.slots:
+                pdf = await asyncio.wrap_future(
+                    service.pool.submit(generer_rapport, bien, zone_row, params, bool(corps.get("montecarlo")))
+                )
+        finally:
+            service.en_attente -= 1
+
+        self.set_header("Content-Type", "application/pdf")
+        self.set_header("Content-Disposition", 'attachment; filename="rapport.pdf"')
+        self.finish(pdf)
+
+
+def creer_application(service: Service) -> tornado.web.Application:
+    args = {"service": service}
+    return tornado.web.Application([
+        (r"/sante", SanteHandler, args),
+        (r"/estimation", EstimationHandler, args),
+        (r"/estimations", EstimationsHandler, args),
+        (r"/rapport", RapportHandler, args),
+    ])
+
+
+async def servir(hote: str, port: int, service: Service):
+    serveur = creer_application(service).listen(port, address=hote)
+    print(f"Service de valorisation sur http://{hote}:{port} ({service.workers} processus PDF)", file=sys.stderr)
+    arret = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, arret.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    try:
+        await arret.wait()
+    finally:
+        serveur.stop()
+        service.fermer()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Service HTTP local de valorisation (estimations + rapports PDF).")
+    ap.add_argument("--hote", default="127.0.0.1", help="Adresse d'ecoute (defaut: 127.0.0.1)")
+    ap.add_argument("--port", type=int, default=PORT_DEFAUT, help=f"Port (defaut {PORT_DEFAUT})")
+    ap.add_argument("--referentiel", help="Referentiel zones (.json ou .csv), defaut: DEFAULT_ZONES")
+    ap.add_argument("--params", help="Parametres (.json), defaut: DEFAULT_PARAMS")
+    ap.add_argument("--workers", type=int, default=None, help="Processus de rendu PDF (defaut: nb de coeurs)")
+    args = ap.parse_args(argv)
+
+    zones = charger_referentiel(args.referentiel) if args.referentiel else None
+    params = charger_params(args.params) if args.params else None
+
+    async def lancer():
+        await servir(args.hote, args.port, Service(zones, params, args.workers))
+
+    asyncio.run(lancer())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
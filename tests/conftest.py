@@ -0,0 +1,128 @@
+"""Fixtures partagees : biens aleatoires, parametres par defaut, historique SQLite temporaire."""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from calculs import (  # noqa: E402
+    CHAUFFAGE_TYPES,
+    DEFAULT_PARAMS,
+    DEFAULT_ZONES,
+    ETATS_PIECE,
+    PEB_LETTRES,
+    TOITURE_ETATS,
+    VITRAGE_TYPES,
+    build_record,
+    compile_params,
+    valoriser,
+)
+from historique import HistoriqueSQLite  # noqa: E402
+
+GRAINE = 20240501
+
+# Libelles hors listes (saisie libre, anciens fichiers) et lettres PEB mal formees
+INCONNU = "Inconnu"
+PEB_SAISIES = (*PEB_LETTRES, " d ", "b ", " G", "a", "", None, "Z")
+
+
+def ligne_referentiel(bien: dict) -> dict:
+    return next(z for z in DEFAULT_ZONES if z["zone"] == bien["zone"] and z["type"] == bien["type"])
+
+
+def bien_aleatoire(rng: random.Random, inconnus: bool = True) -> dict:
+    """Bien complet (champs de ``build_record``) sur une ligne de ``DEFAULT_ZONES``."""
+    z = rng.choice(DEFAULT_ZONES)
+
+    def libelle(libelles):
+        return INCONNU if inconnus and rng.random() < 0.1 else rng.choice(libelles)
+
+    grenier = rng.random() < 0.4
+    return {
+        "client": f"Client {rng.randint(1, 999)}",
+        "adresse": "Rue du Test 1",
+        "commune": "Namur",
+        "zone": z["zone"],
+        "type": z["type"],
+        "surface": round(rng.uniform(30, 400), 1),
+        "terrain": round(rng.uniform(0, 1500), 1),
+        "nb_chambres": rng.randint(0, 6),
+        "nb_sdb": rng.randint(1, 3),
+        "etage": rng.randint(0, 6),
+        "ascenseur": rng.random() < 0.5,
+        "nb_places_parking": rng.randint(0, 2),
+        "garage": rng.random() < 0.3,
+        "balcon": rng.random() < 0.4,
+        "terrasse": rng.random() < 0.4,
+        "jardin": rng.random() < 0.5,
+        "cave": rng.random() < 0.5,
+        "grenier_amenageable": grenier,
+        "grenier_amenageable_surface_m2": round(rng.uniform(5, 60), 1) if grenier else 0.0,
+        "nb_etages": 1,
+        "surfaces_etages": [],
+        "coef_expert_pct": round(rng.uniform(-5, 5), 1),
+        "justif_coef": "",
+        "toiture_grenier": rng.random() < 0.5,
+        "toiture_surface_grenier": round(rng.uniform(0, 80), 1),
+        "toiture_etat": libelle(TOITURE_ETATS),
+        "chauffage_type": libelle(CHAUFFAGE_TYPES),
+        "cuisine_etat": libelle(ETATS_PIECE),
+        "sdb_etat": libelle(ETATS_PIECE),
+        "vitrage_type": libelle(VITRAGE_TYPES),
+        "peb_lettre": rng.choice(PEB_SAISIES) if inconnus else rng.choice(PEB_LETTRES),
+        "peb_kwh": round(rng.uniform(50, 600), 0),
+    }
+
+
+def record(bien: dict, params) -> dict:
+    """Enregistrement d'historique du bien, comme le bouton "Enregistrer" de l'app."""
+    valo = valoriser(ligne_referentiel(bien), bien, params)
+    return build_record(
+        bien, bien["zone"], valo.indice, valo.marche["valeur_marche"], valo.impacts["total"],
+        valo.valeur_finale, valo.low, valo.high,
+    )
+
+
+def modifier_ventes(historique, rng, params) -> set:
+    """Une vente nouvelle, une corrigee et une effacee ; retourne les ids touches."""
+    vendues = [r["id"] for r in historique.lister(vendu=True)]
+    non_vendue = next(r for r in historique.lister(vendu=False))
+    corrigee, effacee = vendues[0], vendues[1]
+    historique.mettre_a_jour_vente(non_vendue["id"], round(non_vendue["valeur_finale"] * 1.07), "2024-07-01")
+    historique.mettre_a_jour_vente(corrigee, historique.obtenir(corrigee)["prix_vendu"] + 12_345, "2024-07-02")
+    historique.mettre_a_jour_vente(effacee, "", "")
+    # Et une estimation enregistree puis vendue
+    nouvelle = record(bien_aleatoire(rng, inconnus=False), params)
+    id_ = historique.ajouter(nouvelle)
+    historique.mettre_a_jour_vente(id_, round(nouvelle["valeur_finale"] * 0.95), "2024-07-03")
+    return {non_vendue["id"], corrigee, effacee, id_}
+
+
+@pytest.fixture
+def rng():
+    return random.Random(GRAINE)
+
+
+@pytest.fixture
+def params():
+    return compile_params(DEFAULT_PARAMS)
+
+
+@pytest.fixture
+def historique(tmp_path):
+    h = HistoriqueSQLite(str(tmp_path / "historique.sqlite3"))
+    yield h
+    h.fermer()
+
+
+@pytest.fixture
+def historique_rempli(historique, rng, params):
+    """Historique de 200 estimations (libelles connus), un tiers vendues a +/- 15 % de l'estimation."""
+    records = [record(bien_aleatoire(rng, inconnus=False), params) for _ in range(200)]
+    ids = historique.ajouter_lot(records)
+    for id_, r in zip(ids, records):
+        if rng.random() < 1 / 3:
+            historique.mettre_a_jour_vente(id_, round(r["valeur_finale"] * rng.uniform(0.85, 1.15)), "2024-06-01")
+    return historique
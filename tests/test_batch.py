@@ -0,0 +1,103 @@
+"""valoriser_lot contre les fonctions scalaires (calc_marche, calc_impacts, calc_indice, fourchette_from_indice)."""
+import numpy as np
+import pytest
+
+from batch import colonnes_depuis_biens, valoriser_lot
+from calculs import (
+    DEFAULT_ZONES,
+    IMPACT_KEYS,
+    calc_impacts,
+    calc_indice,
+    calc_marche,
+    fourchette_from_indice,
+)
+from conftest import bien_aleatoire, ligne_referentiel
+
+
+def reference_scalaire(biens: list, params) -> dict:
+    """Memes sorties que valoriser_lot, bien par bien avec les fonctions scalaires."""
+    res = {}
+    for bien in biens:
+        marche = calc_marche(ligne_referentiel(bien), bien, params)
+        impacts = calc_impacts(bien, params)
+        indice = calc_indice(bien)
+        valeur_tech = marche["valeur_marche"] + impacts["total"]
+        valeur_finale = valeur_tech * (1.0 + float(bien["coef_expert_pct"]) / 100.0)
+        low, high, low_pct, high_pct = fourchette_from_indice(valeur_finale, indice, params)
+        ligne = {
+            **marche,
+            **impacts,
+            "indice": indice,
+            "valeur_tech": valeur_tech,
+            "valeur_finale": valeur_finale,
+            "fourchette_basse": low,
+            "fourchette_haute": high,
+            "low_pct": low_pct,
+            "high_pct": high_pct,
+        }
+        for k, v in ligne.items():
+            res.setdefault(k, []).append(v)
+    return {k: np.array(v, dtype=float) for k, v in res.items()}
+
+
+def comparer(biens: list, lot: dict, params):
+    attendu = reference_scalaire(biens, params)
+    for k, v in attendu.items():
+        np.testing.assert_allclose(lot[k], v, rtol=1e-12, atol=1e-9, err_msg=k)
+
+
+@pytest.mark.parametrize("inconnus", [False, True])
+def test_lot_egal_scalaire(rng, params, inconnus):
+    biens = [bien_aleatoire(rng, inconnus) for _ in range(500)]
+    lot = valoriser_lot(colonnes_depuis_biens(biens), params, DEFAULT_ZONES)
+    assert lot["trouve"].all()
+    comparer(biens, lot, params)
+
+
+def test_lettres_peb_mal_formees(rng, params):
+    biens = []
+    for lettre in (" d ", "b ", " G", "a", "e", "", None, "Z", "CC"):
+        bien = bien_aleatoire(rng, inconnus=False)
+        bien["peb_lettre"] = lettre
+        biens.append(bien)
+    lot = valoriser_lot(colonnes_depuis_biens(biens), params, DEFAULT_ZONES)
+    comparer(biens, lot, params)
+    # " d " : impact de D (espaces retires), note par defaut dans l'indice (comme calc_indice)
+    assert lot["peb"][0] == params["peb_D"]
+
+
+def test_lettre_peb_nan(rng, params):
+    # Cellule vide d'un CSV / Parquet : NaN dans le lot, None (lettre absente) en scalaire
+    biens = [bien_aleatoire(rng, inconnus=False) for _ in range(20)]
+    for bien in biens[::2]:
+        bien["peb_lettre"] = None
+    colonnes = colonnes_depuis_biens(biens)
+    colonnes["peb_lettre"] = np.array([np.nan if b["peb_lettre"] is None else b["peb_lettre"] for b in biens], dtype=object)
+    comparer(biens, valoriser_lot(colonnes, params, DEFAULT_ZONES), params)
+
+
+def test_nb_chambres_absent(rng, params):
+    # Cle absente d'un dict : reference du type (calc_chambres_impact), pas zero chambre
+    biens = [bien_aleatoire(rng, inconnus=False) for _ in range(50)]
+    for bien in biens[::3]:
+        del bien["nb_chambres"]
+    lot = valoriser_lot(colonnes_depuis_biens(biens), params, DEFAULT_ZONES)
+    comparer(biens, lot, params)
+    assert (lot["chambres"][::3] == 0.0).all()
+
+
+def test_total_dans_l_ordre_des_impacts(rng, params):
+    biens = [bien_aleatoire(rng) for _ in range(100)]
+    lot = valoriser_lot(colonnes_depuis_biens(biens), params, DEFAULT_ZONES)
+    total = lot[IMPACT_KEYS[0]]
+    for k in IMPACT_KEYS[1:]:
+        total = total + lot[k]
+    np.testing.assert_array_equal(lot["total"], total)
+
+
+def test_ligne_introuvable(rng, params):
+    biens = [bien_aleatoire(rng, inconnus=False) for _ in range(3)]
+    biens[1]["zone"] = "Zone absente"
+    lot = valoriser_lot(colonnes_depuis_biens(biens), params, DEFAULT_ZONES)
+    assert lot["trouve"].tolist() == [True, False, True]
+    assert np.isnan(lot["valeur_finale"][1])
@@ -0,0 +1,75 @@
+"""Calibrateur : statistiques suffisantes incrementales contre une reconstruction complete."""
+import numpy as np
+import pytest
+
+from calculs import DEFAULT_ZONES
+from calibration import PARAMS_CALIBRABLES, Calibrateur
+from conftest import modifier_ventes
+
+
+def statistiques(cal: Calibrateur, cles_groupes: list) -> tuple:
+    """(Z'Z, Z'y) avec les colonnes de groupe dans l'ordre ``cles_groupes`` (groupes absents : zero)."""
+    k = len(PARAMS_CALIBRABLES)
+    colonnes = list(range(k)) + [
+        k + cal.cles_groupes.index(g) if g in cal.cles_groupes else -1 for g in cles_groupes
+    ]
+    ztz = np.pad(cal.ztz, ((0, 1), (0, 1)))
+    zty = np.pad(cal.zty, (0, 1))
+    return ztz[np.ix_(colonnes, colonnes)], zty[colonnes]
+
+
+def assert_memes_statistiques(cal: Calibrateur, reconstruit: Calibrateur):
+    assert cal.n == reconstruit.n
+    assert cal.ids == reconstruit.ids
+    assert cal.yty == pytest.approx(reconstruit.yty, rel=1e-9)
+    ztz, zty = statistiques(cal, cal.cles_groupes)
+    ztz_r, zty_r = statistiques(reconstruit, cal.cles_groupes)
+    echelle = np.abs(ztz_r).max()
+    np.testing.assert_allclose(ztz, ztz_r, rtol=1e-9, atol=1e-9 * echelle)
+    np.testing.assert_allclose(zty, zty_r, rtol=1e-9, atol=1e-9 * np.abs(zty_r).max())
+
+
+@pytest.mark.parametrize("groupes", ["zone", "global", None])
+def test_calibrateur_incremental(historique_rempli, rng, params, groupes):
+    cal = Calibrateur(params, DEFAULT_ZONES, groupes)
+    cal.ajouter_ventes(historique_rempli.lister(vendu=True))
+
+    modifier_ventes(historique_rempli, rng, params)
+    ventes = historique_rempli.lister(vendu=True)
+    retirees = cal.ids - {r["id"] for r in ventes}
+    assert len(retirees) == 1
+    cal.ajouter_ventes(ventes + historique_rempli.obtenir_lot(retirees))
+
+    reconstruit = Calibrateur(params, DEFAULT_ZONES, groupes)
+    reconstruit.ajouter_ventes(historique_rempli.lister(vendu=True))
+    assert_memes_statistiques(cal, reconstruit)
+
+    a, b = cal.ajuster(), reconstruit.ajuster()
+    assert a.params == pytest.approx(b.params, rel=1e-6, abs=1e-3)
+    assert a.facteurs_marche == pytest.approx(b.facteurs_marche, rel=1e-6)
+    assert a.rmse_apres == pytest.approx(b.rmse_apres, rel=1e-6)
+
+
+def test_calibrateur_groupe_vide(historique_rempli, params):
+    # Toutes les ventes d'un groupe effacees : l'ajustement est celui des ventes restantes
+    cal = Calibrateur(params, DEFAULT_ZONES, "zone")
+    cal.ajouter_ventes(historique_rempli.lister(vendu=True))
+    groupe = cal.cles_groupes[0]
+    effacees = [
+        r["id"] for r in historique_rempli.lister(vendu=True) if (r["zone"], r["type_bien"]) == groupe
+    ]
+    # En deux fois : les sommes retranchees ne reviennent pas exactement a zero
+    for lot in (effacees[::2], effacees[1::2]):
+        for id_ in lot:
+            historique_rempli.mettre_a_jour_vente(id_, "", "")
+        cal.ajouter_ventes(historique_rempli.obtenir_lot(lot))
+    assert cal.n_colonnes[len(PARAMS_CALIBRABLES)] == 0
+
+    reconstruit = Calibrateur(params, DEFAULT_ZONES, "zone")
+    reconstruit.ajouter_ventes(historique_rempli.lister(vendu=True))
+    assert groupe not in reconstruit.cles_groupes
+    assert_memes_statistiques(cal, reconstruit)
+
+    a, b = cal.ajuster(), reconstruit.ajuster()
+    assert a.facteurs_marche[groupe] == 1.0
+    assert a.params == pytest.approx(b.params, rel=1e-6, abs=1e-3)
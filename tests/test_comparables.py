@@ -0,0 +1,70 @@
+"""Index des ventes comparables : recherche exacte, reponderation, ajouts et retraits."""
+import numpy as np
+import pytest
+
+import comparables
+from comparables import CARACTERISTIQUES, ECHELLES, POIDS_DEFAUT, IndexComparables
+from conftest import bien_aleatoire, record
+
+
+@pytest.fixture
+def ventes(rng, params):
+    ventes = []
+    for i in range(400):
+        r = record(bien_aleatoire(rng, inconnus=False), params)
+        r["id"] = i + 1
+        r["prix_vendu"] = round(r["valeur_finale"] * rng.uniform(0.9, 1.1))
+        ventes.append(r)
+    return ventes
+
+
+def force_brute(ventes: list, q: dict, poids: dict, k: int) -> list:
+    poids = {**POIDS_DEFAUT, **poids}
+    d = []
+    for v in ventes:
+        d2 = sum((poids[f] * (float(v[f]) - float(q[f])) / ECHELLES[f]) ** 2 for f in CARACTERISTIQUES)
+        d2 += (poids["zone"] if v["zone"] != q["zone"] else 0.0) ** 2
+        d2 += (poids["type"] if v["type_bien"] != q["type_bien"] else 0.0) ** 2
+        d.append((np.sqrt(d2), v["id"]))
+    return sorted(d)[:k]
+
+
+def ids_distances(resultats: list) -> list:
+    return [(r["distance"], r["id"]) for r in resultats]
+
+
+@pytest.mark.parametrize("arbre", [True, False])
+def test_egal_force_brute(ventes, monkeypatch, arbre):
+    if arbre:
+        pytest.importorskip("scipy")
+    else:
+        monkeypatch.setattr(comparables, "cKDTree", None)
+    index = IndexComparables(ventes)
+    for q in ventes[:20]:
+        attendu = force_brute(ventes, q, {}, 5)
+        trouve = ids_distances(index.chercher(q, 5))
+        assert [d for d, _ in trouve] == pytest.approx([d for d, _ in attendu])
+
+
+def test_reponderer_egal_index_neuf(ventes):
+    poids = {"surface_m2": 3.0, "zone": 0.5, "type": 1.0}
+    index = IndexComparables(ventes)
+    index.reponderer(poids)
+    neuf = IndexComparables(ventes, poids)
+    for q in ventes[:20]:
+        assert ids_distances(index.chercher(q, 5)) == pytest.approx(ids_distances(neuf.chercher(q, 5)))
+        attendu = force_brute(ventes, q, poids, 5)
+        assert [r["distance"] for r in index.chercher(q, 5)] == pytest.approx([d for d, _ in attendu])
+
+
+def test_ajout_et_retrait(ventes):
+    index = IndexComparables(ventes[:300])
+    assert index.ajouter(ventes[300:]) == 100
+    retiree = dict(ventes[0], prix_vendu="")
+    index.ajouter([retiree])
+    assert len(index) == 399
+    restantes = ventes[1:]
+    for q in ventes[:10]:
+        attendu = force_brute(restantes, q, {}, 5)
+        assert [r["distance"] for r in index.chercher(q, 5)] == pytest.approx([d for d, _ in attendu])
+        assert ventes[0]["id"] not in [r["id"] for r in index.chercher(q, 5)]
@@ -0,0 +1,82 @@
+"""CLI d'estimation en masse : sortie par blocs, rejets par ligne."""
+import csv
+import json
+
+import pytest
+
+from calculs import valoriser
+from conftest import ligne_referentiel
+from estimer_lot import SANS_REFERENTIEL, bien_depuis_ligne, chemin_rejets, estimer_fichier, main
+
+ENTETE = ("client", "zone", "type", "surface", "terrain", "nb_chambres", "peb_lettre", "chauffage_type")
+LIGNES = [
+    ("A", "Namur - Centre", "Maison", "120", "300", "3", "C", "Mazout"),
+    ("B", "Namur - Centre", "Maison", "abc", "300", "3", "C", "Mazout"),
+    ("C", "Zone absente", "Maison", "100", "200", "2", "D", "Mazout"),
+    ("D", "Namur - Centre", "Appartement", "85,5", "", "2", " b ", "Gaz condensation"),
+    ("E", "Namur - Centre", "Maison", "90", "100", "deux", "C", "Mazout"),
+]
+
+
+@pytest.fixture
+def entree(tmp_path):
+    path = tmp_path / "biens.csv"
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, delimiter=";")
+        w.writerow(ENTETE)
+        w.writerows(LIGNES)
+    return str(path)
+
+
+def lire_csv(path) -> list:
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.mark.parametrize("bloc", [1, 2, 50])
+def test_rejets_par_ligne(entree, tmp_path, bloc):
+    sortie = str(tmp_path / "estimations.csv")
+    stats = estimer_fichier(entree, sortie, taille=bloc)
+
+    assert stats["lignes"] == 5
+    assert stats["estimees"] == 2
+    assert stats["invalides"] == 2
+    assert stats["sans_referentiel"] == 1
+    assert stats["rejets"] == chemin_rejets(sortie)
+    assert [r["client"] for r in lire_csv(sortie)] == ["A", "D"]
+
+    rejets = lire_csv(stats["rejets"])
+    assert [int(r["ligne"]) for r in rejets] == [2, 3, 5]
+    assert "abc" in rejets[0]["erreur"]
+    assert rejets[1]["erreur"] == SANS_REFERENTIEL
+    assert json.loads(rejets[2]["donnees"])["nb_chambres"] == "deux"
+
+
+def test_valeurs_egales_scalaire(entree, tmp_path, params):
+    sortie = str(tmp_path / "estimations.csv")
+    estimer_fichier(entree, sortie)
+    valides = [bien_depuis_ligne(dict(zip(ENTETE, l))) for l in (LIGNES[0], LIGNES[3])]
+    for r, bien in zip(lire_csv(sortie), valides):
+        valo = valoriser(ligne_referentiel(bien), bien, params)
+        assert float(r["valeur_finale"]) == round(valo.valeur_finale)
+        assert float(r["fourchette_basse"]) == round(valo.low)
+
+
+def test_sans_rejet_pas_de_fichier(tmp_path):
+    entree = tmp_path / "biens.csv"
+    entree.write_text("zone,type,surface\nNamur - Centre,Maison,100\n", encoding="utf-8")
+    sortie = str(tmp_path / "estimations.csv")
+    stats = estimer_fichier(str(entree), sortie)
+    assert stats["rejets"] is None
+    assert not (tmp_path / "estimations.rejets.csv").exists()
+
+
+def test_parquet(entree, tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    sortie = str(tmp_path / "estimations.parquet")
+    rejets = str(tmp_path / "a_corriger.csv")
+    assert main([entree, sortie, "--rejets", rejets, "--bloc", "2"]) == 0
+    assert pq.read_table(sortie).column("client").to_pylist() == ["A", "D"]
+    assert [int(r["ligne"]) for r in lire_csv(rejets)] == [2, 3, 5]
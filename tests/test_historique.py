@@ -0,0 +1,102 @@
+"""Historique : filtres, tri et pagination cote SQLite contre un filtrage Python de toutes les lignes."""
+import pytest
+
+from conftest import bien_aleatoire, record
+from historique import COLONNES_TRI
+
+DATES = ("2024-01-15", "2024-02-29", "2024-03-01", "2024-03-31", "2024-06-30")
+
+
+@pytest.fixture
+def tous(historique, rng, params):
+    """150 estimations sur plusieurs dates, la moitie vendues ; retourne toutes les lignes lues."""
+    records = []
+    for _ in range(150):
+        r = record(bien_aleatoire(rng, inconnus=False), params)
+        r["date_estimation"] = rng.choice(DATES)
+        records.append(r)
+    ids = historique.ajouter_lot(records)
+    for id_, r in zip(ids, records):
+        if rng.random() < 0.5:
+            historique.mettre_a_jour_vente(id_, round(r["valeur_finale"] * rng.uniform(0.9, 1.1)), "2024-07-01")
+    return historique.lister(limite=None)
+
+
+def attendus(tous, zone=None, type_bien=None, date_debut=None, date_fin=None, vendu=None) -> list:
+    return [
+        r for r in tous
+        if (not zone or r["zone"] == zone)
+        and (not type_bien or r["type_bien"] == type_bien)
+        and (not date_debut or r["date_estimation"] >= date_debut)
+        and (not date_fin or r["date_estimation"] <= date_fin)
+        and (vendu is None or (r["prix_vendu"] != "") == vendu)
+    ]
+
+
+def ids(records) -> list:
+    return [r["id"] for r in records]
+
+
+def test_par_defaut_plus_recente_d_abord(historique, tous):
+    assert len(tous) == 150
+    assert ids(tous) == sorted(ids(tous), reverse=True)
+
+
+def test_filtres(historique, tous, rng):
+    zones = historique.valeurs_distinctes("zone")
+    types = historique.valeurs_distinctes("type_bien")
+    assert zones == sorted({r["zone"] for r in tous})
+    assert types == sorted({r["type_bien"] for r in tous})
+
+    cas = [
+        {"zone": zones[0]},
+        {"type_bien": types[-1]},
+        {"date_debut": "2024-02-29", "date_fin": "2024-03-31"},
+        {"date_fin": "2024-01-15"},
+        {"vendu": True},
+        {"vendu": False},
+        {"zone": zones[0], "type_bien": types[0], "vendu": True, "date_debut": "2024-03-01"},
+        # Valeurs vides des selecteurs de l'UI : pas de filtre
+        {"zone": "", "type_bien": None},
+    ]
+    for filtres in cas:
+        attendu = attendus(tous, **filtres)
+        assert ids(historique.lister(**filtres)) == ids(attendu), filtres
+        assert historique.compter(**filtres) == len(attendu), filtres
+
+
+@pytest.mark.parametrize("tri", COLONNES_TRI)
+@pytest.mark.parametrize("descendant", [True, False])
+def test_tri(historique, tous, tri, descendant):
+    # Colonnes de vente : ventes seulement (pas de valeur vide a ordonner)
+    vendu = True if tri in ("prix_vendu", "date_vente") else None
+    lignes = attendus(tous, vendu=vendu)
+    cle = (lambda r: r[tri]) if tri == "id" else (lambda r: (r[tri], r["id"]))
+    attendu = sorted(lignes, key=cle, reverse=descendant)
+    assert ids(historique.lister(tri=tri, descendant=descendant, vendu=vendu)) == ids(attendu)
+
+
+def test_pagination(historique, tous):
+    filtres = {"vendu": False}
+    complet = ids(historique.lister(tri="valeur_finale", descendant=False, **filtres))
+    n = historique.compter(**filtres)
+    taille = 20
+    pages = [
+        ids(historique.lister(limite=taille, decalage=d, tri="valeur_finale", descendant=False, **filtres))
+        for d in range(0, n + taille, taille)
+    ]
+    assert all(len(p) == taille for p in pages[:n // taille])
+    assert pages[-1] == []
+    assert [i for p in pages for i in p] == complet
+
+
+@pytest.mark.parametrize("tri", ["valeur_finale; DROP TABLE estimations", "toiture_etat", ""])
+def test_tri_non_autorise(historique, tous, tri):
+    with pytest.raises(ValueError, match="Tri non autorise"):
+        historique.lister(tri=tri)
+    assert historique.compter() == len(tous)
+
+
+def test_valeurs_distinctes_colonne_non_indexee(historique):
+    with pytest.raises(ValueError, match="non indexee"):
+        historique.valeurs_distinctes("client; DROP TABLE estimations")
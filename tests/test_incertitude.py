@@ -0,0 +1,66 @@
+"""Bande Monte Carlo : reproductibilite a graine fixe, etats techniques perturbes."""
+import numpy as np
+import pytest
+
+import incertitude
+from calculs import VITRAGE_TYPES, valoriser
+from conftest import bien_aleatoire, ligne_referentiel
+from incertitude import ETATS_ORDONNES, simuler, tirer_colonnes
+
+TIRAGES = 20_000
+
+
+@pytest.fixture
+def dossier(rng):
+    bien = bien_aleatoire(rng, inconnus=False)
+    bien.update(vitrage_type="Double ancien", chauffage_type="Mazout", toiture_etat="Moyenne", peb_lettre="D")
+    return ligne_referentiel(bien), bien
+
+
+def test_graine_reproductible(dossier, params):
+    zone_row, bien = dossier
+    a = simuler(zone_row, bien, params, tirages=TIRAGES, graine=7)
+    incertitude._simuler_memo.cache_clear()
+    b = simuler(zone_row, bien, params, tirages=TIRAGES, graine=7)
+    assert a == b
+    c = simuler(zone_row, bien, params, tirages=TIRAGES, graine=8)
+    assert c != a
+    assert a.p10 <= a.p50 <= a.p90
+
+
+def test_tirages_reproductibles(dossier):
+    zone_row, bien = dossier
+    a, b = tirer_colonnes(zone_row, bien, 1000, 3), tirer_colonnes(zone_row, bien, 1000, 3)
+    for k in a:
+        np.testing.assert_array_equal(a[k], b[k])
+
+
+@pytest.mark.parametrize("cle", list(ETATS_ORDONNES))
+def test_etats_decales_d_un_cran(dossier, cle):
+    zone_row, bien = dossier
+    libelles, ordre = ETATS_ORDONNES[cle]
+    col = tirer_colonnes(zone_row, bien, TIRAGES, 1)
+    rang = ordre.index(bien[cle])
+    rangs = np.array([ordre.index(libelles[c]) for c in col[cle]])
+    assert set(np.unique(rangs - rang)) == {-1, 0, 1}
+    assert np.mean(rangs != rang) == pytest.approx(incertitude.INCERTITUDES_DEFAUT["etat_proba"], abs=0.02)
+
+
+def test_vitrage_du_meilleur_au_moins_bon():
+    _, ordre = ETATS_ORDONNES["vitrage_type"]
+    assert ordre[0] == "Triple" and ordre[-1] == "Simple"
+    assert sorted(ordre) == sorted(VITRAGE_TYPES)
+
+
+def test_libelle_inconnu_non_decale(dossier):
+    zone_row, bien = dossier
+    col = tirer_colonnes(zone_row, {**bien, "vitrage_type": "Inconnu"}, 500, 1)
+    assert (col["vitrage_type"] == -1).all()
+
+
+def test_sans_incertitude(dossier, params):
+    zone_row, bien = dossier
+    sans = {"surface_pct": 0.0, "eur_m2_pct": 0.0, "etat_proba": 0.0}
+    bande = simuler(zone_row, bien, params, tirages=1000, incertitudes=sans)
+    attendu = valoriser(zone_row, bien, params).valeur_finale
+    assert bande.p10 == pytest.approx(attendu) and bande.p90 == pytest.approx(attendu)
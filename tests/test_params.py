@@ -0,0 +1,71 @@
+"""ParamsCompiles / compile_params : validation, empreinte, cache et resultats identiques a un dict."""
+import pytest
+
+from calculs import DEFAULT_PARAMS, PARAMS_PEB, ParamsCompiles, calc_impacts, compile_params, valoriser
+from conftest import bien_aleatoire, ligne_referentiel
+
+
+def test_empreinte_du_contenu():
+    a = ParamsCompiles(DEFAULT_PARAMS)
+    # Meme contenu (ordre et types differents) : meme empreinte, egaux, meme hash
+    b = ParamsCompiles({k: str(v) for k, v in reversed(list(DEFAULT_PARAMS.items()))})
+    assert a.empreinte == b.empreinte
+    assert a == b and hash(a) == hash(b)
+    assert len({a, b}) == 1
+    assert a == {k: float(v) for k, v in DEFAULT_PARAMS.items()}
+
+    c = ParamsCompiles({**DEFAULT_PARAMS, "peb_G": DEFAULT_PARAMS["peb_G"] - 1})
+    assert c != a and c.empreinte != a.empreinte
+
+
+def test_tables_precalculees():
+    p = ParamsCompiles(DEFAULT_PARAMS)
+    assert dict(p.peb) == {l: float(DEFAULT_PARAMS[cle]) for l, cle in PARAMS_PEB.items()}
+    assert all(isinstance(v, float) for v in p.values())
+
+
+def test_immuable():
+    p = ParamsCompiles(DEFAULT_PARAMS)
+    with pytest.raises(AttributeError):
+        p.empreinte = "x"
+    with pytest.raises(TypeError):
+        p.peb["A"] = 0.0
+    with pytest.raises(TypeError):
+        p["peb_A"] = 0.0
+
+
+@pytest.mark.parametrize(
+    "modif, message",
+    [
+        ({"peb_A": "abc"}, "non numerique"),
+        ({"peb_A": None}, "non numerique"),
+        ({"peb_A": float("nan")}, "non fini"),
+        ({"peb_A": float("inf")}, "non fini"),
+    ],
+)
+def test_valeurs_invalides(modif, message):
+    with pytest.raises(ValueError, match=message):
+        ParamsCompiles({**DEFAULT_PARAMS, **modif})
+
+
+def test_parametre_manquant():
+    params = dict(DEFAULT_PARAMS)
+    del params["degressif_pct"]
+    with pytest.raises(ValueError, match="degressif_pct"):
+        compile_params(params)
+
+
+def test_compile_params_cache():
+    p = compile_params(DEFAULT_PARAMS)
+    assert compile_params(p) is p
+    assert compile_params(dict(DEFAULT_PARAMS)) is p
+    assert compile_params({**DEFAULT_PARAMS, "peb_G": 0.0}) is not p
+
+
+def test_dict_et_compiles_memes_resultats(rng, params):
+    for _ in range(200):
+        bien = bien_aleatoire(rng)
+        assert calc_impacts(bien, DEFAULT_PARAMS) == calc_impacts(bien, params)
+        a = valoriser(ligne_referentiel(bien), bien, DEFAULT_PARAMS)
+        b = valoriser(ligne_referentiel(bien), bien, params)
+        assert (a.valeur_finale, a.low, a.high) == (b.valeur_finale, b.low, b.high)
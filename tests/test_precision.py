@@ -0,0 +1,46 @@
+"""Agregats de precision : mise a jour incrementale contre une reconstruction complete."""
+import pytest
+
+from conftest import modifier_ventes
+from precision import DIMENSIONS, AgregatsPrecision
+
+
+def assert_memes_indicateurs(a: AgregatsPrecision, b: AgregatsPrecision):
+    assert a.resume() == pytest.approx(b.resume(), rel=1e-9)
+    for dimension in DIMENSIONS:
+        groupes_a = {l.pop("groupe"): l for l in a.par(dimension)}
+        groupes_b = {l.pop("groupe"): l for l in b.par(dimension)}
+        assert groupes_a.keys() == groupes_b.keys()
+        for groupe, ind in groupes_a.items():
+            assert ind == pytest.approx(groupes_b[groupe], rel=1e-9, abs=1e-9), (dimension, groupe)
+
+
+@pytest.mark.parametrize("par_colonnes", [False, True])
+def test_precision_incrementale(historique_rempli, rng, params, par_colonnes):
+    agregats = AgregatsPrecision()
+    agregats.ajouter_ventes(historique_rempli.colonnes(vendu=True))
+    n_avant = agregats.resume()["n"]
+
+    touches = modifier_ventes(historique_rempli, rng, params)
+    modifiees = historique_rempli.colonnes(ids=touches) if par_colonnes else historique_rempli.obtenir_lot(touches)
+    assert agregats.ajouter_ventes(modifiees) == 5  # nouvelle + vendue, ancien et nouveau prix, effacee
+    # Deja integrees : sans effet
+    assert agregats.ajouter_ventes(modifiees) == 0
+
+    reconstruit = AgregatsPrecision()
+    reconstruit.ajouter_ventes(historique_rempli.colonnes(vendu=True))
+    assert agregats.resume()["n"] == n_avant + 1
+    assert_memes_indicateurs(agregats, reconstruit)
+
+
+def test_precision_toutes_ventes_effacees(historique_rempli):
+    agregats = AgregatsPrecision()
+    agregats.ajouter_ventes(historique_rempli.colonnes(vendu=True))
+    ids = [r["id"] for r in historique_rempli.lister(vendu=True)]
+    for id_ in ids:
+        historique_rempli.mettre_a_jour_vente(id_, "", "")
+    agregats.ajouter_ventes(historique_rempli.obtenir_lot(ids))
+    assert agregats.resume() is None
+    assert all(agregats.par(d) == [] for d in DIMENSIONS)
+
+
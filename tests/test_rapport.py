@@ -0,0 +1,51 @@
+"""Rapport PDF : rendu, option ASCII85 limitee au rendu, rendus concurrents."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+
+import rapport
+from conftest import bien_aleatoire, ligne_referentiel
+
+
+@pytest.fixture
+def dossier(rng):
+    bien = bien_aleatoire(rng, inconnus=False)
+    return bien, ligne_referentiel(bien)
+
+
+def test_rendu(dossier, params):
+    bien, zone_row = dossier
+    pdf = rapport.generer_rapport(bien, zone_row, params)
+    assert pdf.startswith(b"%PDF")
+    pypdf = pytest.importorskip("pypdf")
+    assert len(pypdf.PdfReader(BytesIO(pdf)).pages) == 3
+
+
+def test_a85_restaure_et_rendus_serialises(dossier, params, monkeypatch):
+    rl_config = rapport._rl().rl_config
+    avant = rl_config.useA85
+    dessiner = rapport._dessiner_3pages
+    en_cours, vus = [], []
+    verrou = threading.Lock()
+
+    def espion(*args, **kwargs):
+        with verrou:
+            en_cours.append(1)
+            vus.append((len(en_cours), rl_config.useA85))
+        try:
+            return dessiner(*args, **kwargs)
+        finally:
+            with verrou:
+                en_cours.pop()
+
+    monkeypatch.setattr(rapport, "_dessiner_3pages", espion)
+    bien, zone_row = dossier
+    with ThreadPoolExecutor(4) as pool:
+        pdfs = list(pool.map(lambda _: rapport.generer_rapport(bien, zone_row, params), range(8)))
+
+    assert all(p.startswith(b"%PDF") for p in pdfs)
+    # Un seul rendu a la fois, toujours en flux binaires ; valeur globale restauree
+    assert vus == [(1, 0)] * 8
+    assert rl_config.useA85 == avant
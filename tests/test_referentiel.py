@@ -0,0 +1,75 @@
+"""Referentiel partage : versions publiees, vues avec lignes privees."""
+import pytest
+
+from calculs import DEFAULT_ZONES
+from referentiel import DepotReferentiel, Referentiel
+
+
+@pytest.fixture
+def depot(tmp_path):
+    return DepotReferentiel(str(tmp_path / "referentiel.json"), intervalle=0.0)
+
+
+LIGNE_PRIVEE = {"zone": "Zone Test", "type": "Maison", "base_eur_m2": 1000, "terrain_eur_m2": 50, "commerce_eur_m2": 0}
+
+
+def test_vue_privee(depot):
+    version = depot.actuelle()
+    remplacee = dict(DEFAULT_ZONES[0], base_eur_m2=1.0)
+    vue = version.referentiel_avec([LIGNE_PRIVEE, remplacee])
+
+    assert vue.trouver("Zone Test", "Maison")["base_eur_m2"] == 1000
+    assert vue.trouver(remplacee["zone"], remplacee["type"])["base_eur_m2"] == 1.0
+    assert vue.trouver(DEFAULT_ZONES[1]["zone"], DEFAULT_ZONES[1]["type"]) == DEFAULT_ZONES[1]
+    assert vue.zones == sorted({*version.referentiel.zones, "Zone Test"})
+    assert len(vue) == len(DEFAULT_ZONES) + 1
+    # Le referentiel partage n'est pas modifie
+    assert version.referentiel.trouver("Zone Test", "Maison") is None
+
+
+def test_vue_privee_en_cache(depot):
+    version = depot.actuelle()
+    assert version.referentiel_avec([]) is version.referentiel
+    vue = version.referentiel_avec([LIGNE_PRIVEE])
+    # Meme contenu (nouvelle liste de la session au rerun suivant) : meme vue, grille fusionnee une fois
+    assert version.referentiel_avec([dict(LIGNE_PRIVEE)]) is vue
+    assert vue.lignes is vue.lignes
+    assert version.referentiel_avec([dict(LIGNE_PRIVEE, base_eur_m2=1100)]) is not vue
+
+
+def test_referentiel_premiere_ligne_gagnante():
+    ref = Referentiel([*DEFAULT_ZONES, dict(DEFAULT_ZONES[0], base_eur_m2=1.0)])
+    assert ref.trouver(DEFAULT_ZONES[0]["zone"], DEFAULT_ZONES[0]["type"]) == DEFAULT_ZONES[0]
+    assert ref.zones == sorted({z["zone"] for z in DEFAULT_ZONES})
+
+
+def _publier(chemin: str, cle: str):
+    DepotReferentiel(chemin, intervalle=0.0).publier({cle: 1.0})
+
+
+def test_publications_concurrentes(tmp_path):
+    # Processus distincts : aucune publication perdue, un numero par publication
+    multiprocessing = pytest.importorskip("multiprocessing")
+    chemin = str(tmp_path / "referentiel.json")
+    cles = [f"impact_test_{i}" for i in range(8)]
+    ctx = multiprocessing.get_context("fork")
+    processus = [ctx.Process(target=_publier, args=(chemin, cle)) for cle in cles]
+    for p in processus:
+        p.start()
+    for p in processus:
+        p.join()
+        assert p.exitcode == 0
+
+    version = DepotReferentiel(chemin).actuelle()
+    assert version.numero == len(cles)
+    assert all(version.params[cle] == 1.0 for cle in cles)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_version_du_fichier(depot, tmp_path):
+    assert depot.publier({"impact_cave": 123.0}).numero == 1
+    autre = DepotReferentiel(depot.chemin, intervalle=0.0)
+    assert autre.actuelle().numero == 1
+    assert autre.publier().numero == 2
+    assert depot.actuelle().numero == 2
+    assert depot.actuelle().params["impact_cave"] == 123.0
@@ -0,0 +1,91 @@
+"""Scenarios de travaux : valeurs identiques a calculs.valoriser, front de Pareto contre une recherche exhaustive."""
+import numpy as np
+import pytest
+
+from calculs import valoriser
+from conftest import INCONNU, bien_aleatoire, ligne_referentiel
+from renovation import POSTES, _table_couts, evaluer, front_pareto, optimiser, options, travaux
+
+
+def non_domines(cout, gain) -> set:
+    """Points (cout, gain) qu'aucun autre ne bat ou n'egale partout en etant meilleur quelque part."""
+    points = set(zip(cout.tolist(), gain.tolist()))
+    return {
+        (c, g) for c, g in points
+        if not any(c2 <= c and g2 >= g and (c2, g2) != (c, g) for c2, g2 in points)
+    }
+
+
+@pytest.fixture
+def bien(rng):
+    b = bien_aleatoire(rng, inconnus=False)
+    b.update({
+        "toiture_etat": "Mauvaise", "chauffage_type": "Mazout", "vitrage_type": "Simple",
+        "peb_lettre": " e", "cuisine_etat": "A moderniser", "sdb_etat": "Bonne",
+    })
+    return b
+
+
+def test_options(bien):
+    assert options(bien, "toiture_etat")[0] == POSTES["toiture_etat"][0].index("Mauvaise")
+    assert {POSTES["toiture_etat"][0][c] for c in options(bien, "toiture_etat")[1:]} == {"Parfaite", "Moyenne"}
+    # Lettre normalisee comme calc_peb_impact ; seules les lettres mieux notees sont proposees
+    peb = POSTES["peb_lettre"][0]
+    assert [peb[c] for c in options(bien, "peb_lettre")] == ["E", "A", "B", "C", "D"]
+    # Deja au mieux : etat actuel seulement
+    assert len(options(bien, "sdb_etat")) == 1
+    # Etat inconnu : code -1 puis tous les etats
+    bien["cuisine_etat"] = INCONNU
+    assert options(bien, "cuisine_etat") == [-1] + list(range(len(POSTES["cuisine_etat"][0])))
+
+
+# Lettre mal formee, inconnue ou absente : meme normalisation que calc_peb_impact / calc_indice
+@pytest.mark.parametrize("lettre", [" e", "E", "Z", "", None])
+def test_scenarios_egaux_scalaire(bien, params, lettre):
+    bien["peb_lettre"] = lettre
+    zone_row = ligne_referentiel(bien)
+    s = evaluer(zone_row, bien, params)
+    assert len(s) == np.prod([len(options(bien, p)) for p in POSTES])
+    assert s.valeur_actuelle == pytest.approx(valoriser(zone_row, bien, params).valeur_finale, rel=1e-12)
+
+    for i in range(len(s)):
+        modifie = {**bien, **travaux(s, i)}
+        valo = valoriser(zone_row, modifie, params)
+        assert s.valeur_finale[i] == pytest.approx(valo.valeur_finale, rel=1e-12), i
+        assert s.indice[i] == pytest.approx(valo.indice, rel=1e-12), i
+        cout = sum(_table_couts(p, None)[POSTES[p][0].index(l)] for p, l in travaux(s, i).items())
+        assert s.cout[i] == cout, i
+
+
+def test_couts_personnalises(bien, params):
+    zone_row = ligne_referentiel(bien)
+    s = evaluer(zone_row, bien, params, couts={"toiture_etat": {"Parfaite": 1.0}})
+    seul = [i for i in range(len(s)) if travaux(s, i) == {"toiture_etat": "Parfaite"}]
+    assert len(seul) == 1 and s.cout[seul[0]] == 1.0
+
+
+def test_front_pareto_exhaustif(rng):
+    for _ in range(50):
+        n = rng.randint(1, 60)
+        # Valeurs entieres : egalites de cout et de gain frequentes
+        cout = np.array([float(rng.randint(0, 10)) for _ in range(n)])
+        gain = np.array([float(rng.randint(-5, 10)) for _ in range(n)])
+        front = front_pareto(cout, gain)
+        assert np.all(np.diff(cout[front]) > 0)
+        assert set(zip(cout[front].tolist(), gain[front].tolist())) == non_domines(cout, gain)
+
+
+def test_optimiser(bien, params):
+    s, front = optimiser(ligne_referentiel(bien), bien, params)
+    positifs = s.plus_value > 0
+    attendu = {p for p in non_domines(s.cout, s.plus_value) if p[1] > 0}
+    assert {(l["cout"], l["plus_value"]) for l in front} == attendu
+    assert front and [l["cout"] for l in front] == sorted(l["cout"] for l in front)
+    assert positifs.any()
+    for l in front:
+        assert l["valeur_finale"] == pytest.approx(s.valeur_actuelle + l["plus_value"])
+        assert l["rendement"] == pytest.approx(l["plus_value"] / l["cout"])
+        modifie = {**bien, **l["travaux"]}
+        assert valoriser(ligne_referentiel(bien), modifie, params).valeur_finale == pytest.approx(
+            l["valeur_finale"], rel=1e-12
+        )
@@ -0,0 +1,126 @@
+"""synchroniser : seules les estimations qui dependent d'un changement publie sont revalorisees."""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from calculs import DEFAULT_ZONES, cle_ligne, cle_param, dependances
+from conftest import bien_aleatoire, record
+from historique import HistoriqueSQLite
+from referentiel import DepotReferentiel
+from revalorisation import ETAT_APPLIQUE, cles_modifiees, nouvelles_valeurs, synchroniser
+
+
+@pytest.fixture
+def depot(tmp_path):
+    return DepotReferentiel(str(tmp_path / "referentiel.json"), intervalle=0.0)
+
+
+def valeurs(historique) -> dict:
+    return {r["id"]: r["valeur_finale"] for r in historique.lister()}
+
+
+def enregistrer(historique, rng, params, n=120) -> dict:
+    """n estimations ; retourne id -> dependances."""
+    biens = [bien_aleatoire(rng, inconnus=False) for _ in range(n)]
+    ids = historique.ajouter_lot([record(b, params) for b in biens])
+    return {id_: dependances(b["zone"], b) for id_, b in zip(ids, biens)}
+
+
+def test_cles_modifiees(params):
+    zones = [dict(z) for z in DEFAULT_ZONES]
+    modifiee, supprimee = dict(zones[0]), zones[1]
+    modifiee["base_eur_m2"] = float(modifiee["base_eur_m2"]) + 100.0
+    ajoutee = {**zones[2], "zone": "Zone nouvelle"}
+    apres_zones = [modifiee, *zones[2:], ajoutee]
+    apres_params = {**params, "peb_G": params["peb_G"] - 1000.0}
+
+    assert cles_modifiees(params, zones, params, zones) == set()
+    assert cles_modifiees(params, zones, apres_params, apres_zones) == {
+        cle_param("peb_G"),
+        cle_ligne(modifiee["zone"], modifiee["type"]),
+        cle_ligne(supprimee["zone"], supprimee["type"]),
+        cle_ligne(ajoutee["zone"], ajoutee["type"]),
+    }
+    # Doublon d'une ligne existante : seule la premiere compte, comme Referentiel.trouver
+    assert cles_modifiees(params, zones, params, zones + [modifiee]) == set()
+
+
+def test_premier_appel_reference(historique, rng, params, depot):
+    enregistrer(historique, rng, params, n=10)
+    avant = valeurs(historique)
+    assert synchroniser(historique, depot.actuelle()) == 0
+    assert valeurs(historique) == avant
+    # Meme version : rien a appliquer
+    assert synchroniser(historique, depot.actuelle()) == 0
+
+
+def test_ligne_referentiel(historique, rng, params, depot):
+    deps = enregistrer(historique, rng, params)
+    synchroniser(historique, depot.actuelle())
+    avant = valeurs(historique)
+
+    ligne = dict(DEFAULT_ZONES[0])
+    ligne["base_eur_m2"] = float(ligne["base_eur_m2"]) * 1.1
+    version = depot.publier(lignes=[ligne])
+    attendus = {id_ for id_, d in deps.items() if cle_ligne(ligne["zone"], ligne["type"]) in d}
+    assert attendus
+
+    assert synchroniser(historique, version) == len(attendus)
+    apres = valeurs(historique)
+    assert {id_ for id_ in avant if apres[id_] != avant[id_]} == attendus
+    assert {r["estimation_id"] for r in historique.revalorisations(limite=1000)} == attendus
+
+
+def test_parametre(historique, rng, params, depot):
+    deps = enregistrer(historique, rng, params)
+    synchroniser(historique, depot.actuelle())
+    avant = valeurs(historique)
+
+    version = depot.publier(params={"peb_G": params["peb_G"] - 5000.0})
+    attendus = {id_ for id_, d in deps.items() if cle_param("peb_G") in d}
+    assert attendus and len(attendus) < len(deps)
+
+    assert synchroniser(historique, version) == len(attendus)
+    apres = valeurs(historique)
+    assert {id_ for id_ in avant if apres[id_] != avant[id_]} == attendus
+    for id_ in attendus:
+        assert apres[id_] == pytest.approx(avant[id_] - 5000.0 * (1 + historique.obtenir(id_)["coef_expert_pct"] / 100), abs=1.0)
+
+
+def test_estimation_privee_non_revalorisee(historique, rng, params, depot):
+    synchroniser(historique, depot.actuelle())
+    bien = bien_aleatoire(rng, inconnus=False)
+    bien["peb_lettre"] = "G"
+    publique = historique.ajouter(record(bien, params))
+    privee = historique.ajouter(record(bien, params), prive=True)
+    avant = valeurs(historique)
+
+    assert synchroniser(historique, depot.publier(params={"peb_G": params["peb_G"] - 5000.0})) == 1
+    apres = valeurs(historique)
+    assert apres[publique] != avant[publique]
+    assert apres[privee] == avant[privee]
+
+
+def test_synchronisations_concurrentes(historique, rng, params, depot):
+    # Sessions / processus distincts (une connexion chacun) qui voient la meme nouvelle version
+    deps = enregistrer(historique, rng, params)
+    synchroniser(historique, depot.actuelle())
+    version = depot.publier(params={"peb_G": params["peb_G"] - 5000.0})
+    attendus = {id_ for id_, d in deps.items() if cle_param("peb_G") in d}
+
+    autres = [HistoriqueSQLite(historique.chemin) for _ in range(4)]
+    try:
+        avant = historique.lire_etat(ETAT_APPLIQUE)
+        cles = cles_modifiees(avant["params"], avant["zones"], dict(version.params), avant["zones"])
+        # Toutes lisent l'etat et calculent avant que la premiere n'ecrive
+        calculs = [nouvelles_valeurs(h, cles, version.params, avant["zones"]) for h in autres]
+        apres = {"params": dict(version.params), "zones": list(version.referentiel.lignes)}
+        n = [h.revaloriser(v, "test", etat=(ETAT_APPLIQUE, avant, apres)) for h, v in zip(autres, calculs)]
+        assert n == [len(attendus), 0, 0, 0]
+        with ThreadPoolExecutor(4) as pool:
+            assert list(pool.map(lambda h: synchroniser(h, version), autres)) == [0, 0, 0, 0]
+    finally:
+        for h in autres:
+            h.fermer()
+    traces = [r["estimation_id"] for r in historique.revalorisations(limite=1000)]
+    assert sorted(traces) == sorted(attendus)
@@ -0,0 +1,83 @@
+"""Balayages de sensibilite (balayer, grille, tornado) contre calculs.valoriser point par point."""
+import numpy as np
+import pytest
+
+from calculs import valoriser
+from conftest import bien_aleatoire, ligne_referentiel
+from sensibilite import ECART_ABSOLU, balayer, grille, plage, tornado
+
+
+@pytest.fixture
+def bien(rng):
+    b = bien_aleatoire(rng, inconnus=False)
+    b.update({"type": "Maison", "zone": "Namur - Centre", "peb_lettre": "C", "cuisine_etat": "Bonne"})
+    return b
+
+
+def scalaire(bien, params, **modifs) -> float:
+    return valoriser(ligne_referentiel(bien), bien, {**params, **modifs}).valeur_finale
+
+
+def test_balayer(bien, params):
+    valeurs = plage(params["degressif_pct"], n=7)
+    res = balayer(ligne_referentiel(bien), bien, params, "degressif_pct", valeurs)
+    attendu = [scalaire(bien, params, degressif_pct=v) for v in valeurs]
+    np.testing.assert_allclose(res, attendu, rtol=1e-12)
+
+
+def test_grille(bien, params):
+    vx = plage(params["peb_C"], n=5)
+    vy = plage(params["cuisine_bonne"], n=3)
+    res = grille(ligne_referentiel(bien), bien, params, "peb_C", vx, "cuisine_bonne", vy)
+    assert res.shape == (3, 5)
+    for j, y in enumerate(vy):
+        for i, x in enumerate(vx):
+            assert res[j, i] == pytest.approx(scalaire(bien, params, peb_C=x, cuisine_bonne=y), rel=1e-12)
+
+
+def test_grille_erreurs(bien, params):
+    zone_row = ligne_referentiel(bien)
+    with pytest.raises(ValueError):
+        grille(zone_row, bien, params, "peb_C", [0.0], "peb_C", [1.0])
+    with pytest.raises(KeyError, match="inconnu"):
+        grille(zone_row, bien, params, "peb_C", [0.0], "absent", [1.0])
+
+
+def test_tornado(bien, params):
+    variation = 0.2
+    lignes = tornado(ligne_referentiel(bien), bien, params, variation)
+    base = scalaire(bien, params)
+
+    ecarts = [l["ecart"] for l in lignes]
+    assert ecarts == sorted(ecarts, reverse=True)
+    par_cle = {l["parametre"]: l for l in lignes}
+    # Dossier C, cuisine bonne : parametres nuls, balayes de +/- ECART_ABSOLU
+    assert {"peb_C", "cuisine_bonne"} <= par_cle.keys()
+    # Autres lettres PEB : sans effet sur ce dossier, omises
+    assert "peb_G" not in par_cle
+
+    for cle in params:
+        valeur = params[cle]
+        bas, haut = (valeur * (1 - variation), valeur * (1 + variation)) if valeur else (-ECART_ABSOLU, ECART_ABSOLU)
+        attendu_bas, attendu_haut = scalaire(bien, params, **{cle: bas}), scalaire(bien, params, **{cle: haut})
+        if cle not in par_cle:
+            assert attendu_bas == pytest.approx(attendu_haut, rel=1e-12), cle
+            continue
+        l = par_cle[cle]
+        assert l["base"] == pytest.approx(base, rel=1e-12)
+        assert l["bas"] == pytest.approx(attendu_bas, rel=1e-12), cle
+        assert l["haut"] == pytest.approx(attendu_haut, rel=1e-12), cle
+
+
+def test_tornado_parametres_choisis(bien, params):
+    lignes = tornado(ligne_referentiel(bien), bien, params, cles=["peb_C", "peb_G"])
+    assert [l["parametre"] for l in lignes] == ["peb_C"]
+    assert lignes[0]["haut"] - lignes[0]["bas"] == pytest.approx(
+        scalaire(bien, params, peb_C=ECART_ABSOLU) - scalaire(bien, params, peb_C=-ECART_ABSOLU), rel=1e-12
+    )
+
+
+def test_plage():
+    np.testing.assert_allclose(plage(100.0, 0.2, n=3), [80.0, 100.0, 120.0])
+    np.testing.assert_allclose(plage(-100.0, 0.2, n=3), [-120.0, -100.0, -80.0])
+    np.testing.assert_allclose(plage(0.0, n=3), [-ECART_ABSOLU, 0.0, ECART_ABSOLU])
@@ -0,0 +1,76 @@
+"""Service HTTP : endpoints, erreurs par element d'un lot."""
+import json
+
+import pytest
+from tornado.testing import AsyncHTTPTestCase
+
+from calculs import DEFAULT_PARAMS, valoriser
+from conftest import ligne_referentiel
+from estimer_lot import bien_depuis_ligne
+from service import Service, creer_application
+
+BIEN = {"zone": "Namur - Centre", "type": "Maison", "surface": 120, "terrain": 300, "peb_lettre": "D"}
+
+
+class TestService(AsyncHTTPTestCase):
+    def get_app(self):
+        self.service = Service(workers=1)
+        return creer_application(self.service)
+
+    def tearDown(self):
+        super().tearDown()
+        self.service.fermer()
+
+    def post(self, chemin: str, corps) -> tuple:
+        r = self.fetch(chemin, method="POST", body=json.dumps(corps), raise_error=False)
+        type_ = r.headers.get("Content-Type", "")
+        return r.code, (json.loads(r.body) if type_.startswith("application/json") else r.body)
+
+    def test_sante(self):
+        r = self.fetch("/sante")
+        assert r.code == 200
+        assert json.loads(r.body)["statut"] == "ok"
+
+    def test_estimation(self):
+        code, sortie = self.post("/estimation", {"bien": BIEN})
+        assert code == 200
+        bien = bien_depuis_ligne(BIEN)
+        attendu = valoriser(ligne_referentiel(bien), bien, DEFAULT_PARAMS)
+        assert sortie["valeur_finale"] == pytest.approx(attendu.valeur_finale)
+        assert sortie["fourchette_basse"] == pytest.approx(attendu.low)
+        assert "montecarlo" not in sortie
+
+    def test_estimation_montecarlo_et_params(self):
+        code, sortie = self.post("/estimation", {"bien": BIEN, "montecarlo": True, "params": {"peb_D": 0.0}})
+        assert code == 200
+        assert sortie["impacts"]["peb"] == 0.0
+        mc = sortie["montecarlo"]
+        assert mc["p10"] <= mc["p50"] <= mc["p90"]
+
+    def test_estimation_erreurs(self):
+        assert self.post("/estimation", {"bien": {**BIEN, "surface": "abc"}})[0] == 400
+        assert self.post("/estimation", {"bien": {**BIEN, "zone": "Zone absente"}})[0] == 422
+        assert self.post("/estimation", {"bien": BIEN, "params": {"peb_D": "x"}})[0] == 400
+        r = self.fetch("/estimation", method="POST", body=b"{pas du json", raise_error=False)
+        assert r.code == 400 and "erreur" in json.loads(r.body)
+
+    def test_estimations_erreur_par_element(self):
+        biens = [BIEN, {**BIEN, "surface": "abc"}, {**BIEN, "zone": "Zone absente"}, "pas un objet", {**BIEN, "type": "Appartement"}]
+        code, sortie = self.post("/estimations", {"biens": biens})
+        assert code == 200
+        estimations = sortie["estimations"]
+        assert len(estimations) == len(biens)
+        assert "abc" in estimations[1]["erreur"]
+        assert estimations[2]["erreur"].startswith("Aucune ligne referentiel")
+        assert "erreur" in estimations[3]
+        code, seul = self.post("/estimation", {"bien": BIEN})
+        assert estimations[0]["valeur_finale"] == pytest.approx(seul["valeur_finale"])
+        assert estimations[4]["type"] == "Appartement"
+
+    def test_estimations_corps_invalide(self):
+        assert self.post("/estimations", {"biens": {"a": 1}})[0] == 400
+
+    def test_rapport(self):
+        code, pdf = self.post("/rapport", {"bien": BIEN})
+        assert code == 200
+        assert pdf.startswith(b"%PDF")